@@ -0,0 +1,224 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Iterator, Optional, Set, Tuple
+
+from loguru import logger
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Scope
+
+try:
+    import brotli
+except ImportError:
+    try:
+        # The same API, for the platforms without the brotli wheels
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+STATIC_DIRECTORY = "app/static"
+STATIC_URL = "/static"
+
+# Cache-Control of the fingerprinted URLs, whose content never changes, and of the
+# plain ones, revalidated with their ETag
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+# Files worth compressing, the images are compressed already
+COMPRESSIBLE_EXTENSIONS = (".css", ".html", ".js", ".json", ".map", ".svg", ".txt")
+
+# Content encodings in order of preference, with the extension of their files
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _compress(encoding: str, content: bytes) -> bytes:
+    # At build time, the slowest levels cost little for the few assets
+    if encoding == "br":
+        return brotli.compress(content, quality=11)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+
+def accepted_encodings(accept_encoding: str) -> Set[str]:
+    """The content codings of an Accept-Encoding header not refused with q=0."""
+    accepted = set()
+    for coding in accept_encoding.lower().split(","):
+        name, _, parameters = coding.partition(";")
+        quality = parameters.strip().removeprefix("q=")
+        try:
+            refused = bool(parameters) and float(quality) == 0
+        except ValueError:
+            refused = False
+        if name.strip() and not refused:
+            accepted.add(name.strip())
+    return accepted
+
+
+class AssetFiles(StaticFiles):
+    """
+    StaticFiles serving each file under a fingerprinted URL too, e.g.
+    `js/htmx.min.3f2a9c1b0d4e.js`, whose name hashes its content so that browsers can
+    keep it for good: `asset_url` returns those URLs for the templates.
+
+    Text files are sent precompressed, from the `.br` and `.gz` files written next to
+    them by `compress`, when the request accepts their encoding and they are not
+    older than the file.
+
+    Parameters:
+        directory (str): The directory of the files.
+        url (str): The path the files are mounted at.
+        reload (bool): Whether changed files get a new fingerprint while running.
+    """
+
+    def __init__(
+        self,
+        directory: str = STATIC_DIRECTORY,
+        url: str = STATIC_URL,
+        reload: bool = False,
+    ):
+        super().__init__(directory=directory)
+        self.url = url
+        self.reload = reload
+        # The fingerprinted path of each file by its path, and the other way round
+        self._fingerprints: Dict[str, Tuple[int, str]] = {}
+        self._originals: Dict[str, str] = {}
+        for path in self.files():
+            self._fingerprint(path)
+
+    def files(self) -> Iterator[str]:
+        """The paths of the files, relative to the directory, with / separators."""
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.endswith(tuple(extension for _, extension in ENCODINGS)):
+                    path = os.path.join(root, name)
+                    yield os.path.relpath(path, self.directory).replace(os.sep, "/")
+
+    def _fingerprint(self, path: str) -> Optional[str]:
+        full_path = os.path.join(self.directory, path)
+        try:
+            modified = os.stat(full_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        known = self._fingerprints.get(path)
+        if known is not None and known[0] == modified:
+            return known[1]
+
+        with open(full_path, "rb") as file:
+            digest = hashlib.blake2b(file.read(), digest_size=6).hexdigest()
+        stem, extension = os.path.splitext(path)
+        fingerprinted = f"{stem}.{digest}{extension}"
+        if known is not None:
+            self._originals.pop(known[1], None)
+        self._fingerprints[path] = (modified, fingerprinted)
+        self._originals[fingerprinted] = path
+        return fingerprinted
+
+    def asset_url(self, path: str) -> str:
+        """
+        The fingerprinted URL of the file at `path`, relative to the directory, or its
+        plain URL if there is no such file.
+
+            <script src="{{ asset_url('js/htmx.min.js') }}"></script>
+        """
+        if self.reload:
+            fingerprinted = self._fingerprint(path)
+        else:
+            known = self._fingerprints.get(path)
+            fingerprinted = known[1] if known is not None else None
+        return f"{self.url}/{fingerprinted or path}"
+
+    def compress(self) -> int:
+        """
+        Writes the `.br` and `.gz` files of the compressible files that lack an up to
+        date one, brotli only when the brotli or brotlicffi package is installed.
+        Returns the number of files written.
+        """
+        encodings = [
+            (encoding, extension)
+            for encoding, extension in ENCODINGS
+            if encoding != "br" or brotli is not None
+        ]
+        written = 0
+        for path in self.files():
+            if not path.endswith(COMPRESSIBLE_EXTENSIONS):
+                continue
+            full_path = os.path.join(self.directory, path)
+            with open(full_path, "rb") as file:
+                content = file.read()
+            for encoding, extension in encodings:
+                if self._compressed(full_path, extension) is not None:
+                    continue
+                compressed = _compress(encoding, content)
+                if len(compressed) >= len(content):
+                    continue
+                try:
+                    with open(full_path + extension, "wb") as file:
+                        file.write(compressed)
+                except OSError as e:
+                    # A read-only deployment, the files are then sent uncompressed
+                    logger.warning(f"Cannot write {full_path + extension}: {e}")
+                    return written
+                written += 1
+        return written
+
+    @staticmethod
+    def _compressed(
+        full_path: str, extension: str
+    ) -> Optional[Tuple[str, os.stat_result]]:
+        # The compressed file, unless it misses or was written before the file changed
+        try:
+            compressed = os.stat(full_path + extension)
+            if compressed.st_mtime_ns < os.stat(full_path).st_mtime_ns:
+                return None
+        except FileNotFoundError:
+            return None
+        return full_path + extension, compressed
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        original = self._originals.get(path.replace(os.sep, "/"))
+        response = await super().get_response(original or path, scope)
+        if original is not None:
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+
+    def file_response(
+        self,
+        full_path: str,
+        stat_result: os.stat_result,
+        scope: Scope,
+        status_code: int = 200,
+    ) -> Response:
+        request_headers = Headers(scope=scope)
+        headers = {"Cache-Control": REVALIDATE}
+        media_type = None
+        if str(full_path).endswith(COMPRESSIBLE_EXTENSIONS):
+            headers["Vary"] = "Accept-Encoding"
+            accepted = accepted_encodings(request_headers.get("Accept-Encoding", ""))
+            for encoding, extension in ENCODINGS:
+                compressed = encoding in accepted and self._compressed(
+                    str(full_path), extension
+                )
+                if compressed:
+                    media_type = mimetypes.guess_type(str(full_path))[0]
+                    full_path, stat_result = compressed
+                    headers["Content-Encoding"] = encoding
+                    break
+
+        response = FileResponse(
+            full_path,
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+            stat_result=stat_result,
+        )
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response
+
+
+if __name__ == "__main__":
+    # Compresses the assets at build time, e.g. for a read-only deployment
+    files = AssetFiles()
+    logger.info(f"{files.compress()} compressed assets written")
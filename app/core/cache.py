@@ -0,0 +1,127 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Iterable, Optional, Set, Tuple, TypeVar
+
+ValueType = TypeVar("ValueType")
+
+
+class TTLCache(Generic[ValueType]):
+    """
+    In-process cache whose entries expire after a time to live, evicting the least
+    recently used ones once `maxsize` is reached.
+
+    The cache lives in the memory of one worker process: it is not shared between
+    workers, so every entry must be safe to serve stale until it expires.
+
+    Parameters:
+        maxsize (int): The maximum number of entries kept.
+        ttl (float): The default time to live of an entry, in seconds.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Tuple[float, ValueType]] = OrderedDict()
+
+    def get(
+        self, key: Hashable, default: Optional[ValueType] = None
+    ) -> Optional[ValueType]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: Hashable, value: ValueType, ttl: Optional[float] = None):
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._entries[key] = (expires, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> Optional[ValueType]:
+        entry = self._entries.pop(key, None)
+        return entry[1] if entry is not None else None
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FragmentCache:
+    """
+    In-process cache of rendered fragments, evicting the least recently used ones once
+    they take more than `max_bytes`. Each entry is registered under the entities it
+    was rendered from, so that `forget` drops it when one of them changes.
+
+    Like TTLCache, the cache is not shared between workers. Its keys carry the
+    version of what they render, a stale entry is only kept until evicted.
+
+    Parameters:
+        max_bytes (int): The memory the fragments may take, as sys.getsizeof counts it.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, Tuple[bytes, Tuple[Hashable, ...]]] = (
+            OrderedDict()
+        )
+        self._keys_by_entity: Dict[Hashable, Set[Hashable]] = {}
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def set(self, key: Hashable, fragment: bytes, entities: Iterable[Hashable] = ()):
+        self._remove(key)
+        entities = tuple(entities)
+        self._entries[key] = (fragment, entities)
+        self.size += sys.getsizeof(fragment)
+        for entity in entities:
+            self._keys_by_entity.setdefault(entity, set()).add(key)
+        while self.size > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def forget(self, entity: Hashable):
+        """Drops the fragments rendered from `entity`."""
+        for key in self._keys_by_entity.pop(entity, ()):
+            self._remove(key)
+
+    def clear(self):
+        self._entries.clear()
+        self._keys_by_entity.clear()
+        self.size = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        fragment, entities = entry
+        self.size -= sys.getsizeof(fragment)
+        for entity in entities:
+            keys = self._keys_by_entity.get(entity)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_entity[entity]
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,179 @@
+import os
+import zlib
+from typing import Optional, Union
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.assets import accepted_encodings, brotli
+
+# Responses smaller than this many bytes are sent as they are, compressing them saves
+# less than it costs. Streamed responses are compressed whatever their size.
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "1024"))
+# The zlib level of gzip, 1 to 9, and the quality of brotli, 0 to 11. Past these, the
+# pages barely get smaller for a lot more CPU (benchmarks/compression.py).
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# Content types worth compressing. The others, e.g. the application/octet-stream of
+# download_file or the images, are mostly compressed already.
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/javascript",
+    "application/json",
+    "application/xml",
+    "image/svg+xml",
+)
+
+
+class GzipCompressor:
+    def __init__(self, level: int = COMPRESSION_GZIP_LEVEL):
+        # 16 + MAX_WBITS writes the gzip header and trailer around the deflate data
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes, finish: bool) -> bytes:
+        """
+        Compresses a chunk of the body, flushed so that the client can decompress all
+        of it at once, or the last one when `finish` is set.
+        """
+        return self._compressor.compress(data) + self._compressor.flush(
+            zlib.Z_FINISH if finish else zlib.Z_SYNC_FLUSH
+        )
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = COMPRESSION_BROTLI_QUALITY):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, finish: bool) -> bytes:
+        """See GzipCompressor.compress."""
+        compressed = self._compressor.process(data)
+        if finish:
+            return compressed + self._compressor.finish()
+        return compressed + self._compressor.flush()
+
+
+def add_vary(headers: MutableHeaders, name: str) -> None:
+    """Adds `name` to the Vary header, unless it is already there."""
+    vary = headers.get("Vary")
+    if vary is None:
+        headers["Vary"] = name
+    elif name.lower() not in [value.strip().lower() for value in vary.split(",")]:
+        headers["Vary"] = f"{vary}, {name}"
+
+
+def is_compressible(headers: Headers) -> bool:
+    """Whether a response with these headers is worth compressing."""
+    content_type = headers.get("Content-Type", "").lower()
+    return (
+        content_type.startswith(COMPRESSIBLE_TYPES)
+        and "Content-Encoding" not in headers
+        and "Content-Range" not in headers
+    )
+
+
+class CompressionMiddleware:
+    """
+    Compresses the responses of the compressible content types with brotli, when the
+    brotli or brotlicffi package is installed, or gzip, as Accept-Encoding allows.
+
+    Each chunk of a streamed response is compressed and flushed as it is sent, so that
+    the browser renders the streamed pages as they arrive; whole responses are
+    compressed once, unless they are smaller than `minimum_size`.
+
+    Parameters:
+        app (ASGIApp): The application.
+        minimum_size (int): The size under which whole responses are not compressed.
+        gzip_level (int): The zlib level of gzip, 1 to 9.
+        brotli_quality (int): The quality of brotli, 0 to 11.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = COMPRESSION_MINIMUM_SIZE,
+        gzip_level: int = COMPRESSION_GZIP_LEVEL,
+        brotli_quality: int = COMPRESSION_BROTLI_QUALITY,
+    ):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            encoding = "br"
+        elif "gzip" in accepted:
+            encoding = "gzip"
+        else:
+            encoding = None
+        responder = _CompressionResponder(self, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    """Compresses the body of one response, or passes it through."""
+
+    def __init__(
+        self, middleware: CompressionMiddleware, encoding: Optional[str], send: Send
+    ):
+        self.middleware = middleware
+        self.encoding = encoding
+        self._send = send
+        # The start of the response, held until its first chunk tells whether it is
+        # compressed, then None
+        self.start: Optional[Message] = None
+        self.compressor: Optional[Union[GzipCompressor, BrotliCompressor]] = None
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(raw=message["headers"])
+            if is_compressible(headers):
+                # Whether this response is compressed or not, others may be
+                add_vary(headers, "Accept-Encoding")
+                if self.encoding is not None:
+                    self.start = message
+                    return
+            await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or (
+            self.start is None and self.compressor is None
+        ):
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if self.start is not None:
+            start, self.start = self.start, None
+            if not more_body and len(body) < self.middleware.minimum_size:
+                await self._send(start)
+                await self._send(message)
+                return
+            self.compressor = (
+                BrotliCompressor(self.middleware.brotli_quality)
+                if self.encoding == "br"
+                else GzipCompressor(self.middleware.gzip_level)
+            )
+            headers = MutableHeaders(raw=start["headers"])
+            headers["Content-Encoding"] = self.encoding
+            etag = headers.get("ETag")
+            if etag is not None and not etag.startswith("W/"):
+                # The compressed body differs from the one the ETag was computed from
+                headers["ETag"] = f"W/{etag}"
+            body = self.compressor.compress(body, finish=not more_body)
+            if more_body:
+                del headers["Content-Length"]
+            else:
+                headers["Content-Length"] = str(len(body))
+            await self._send(start)
+        else:
+            body = self.compressor.compress(body, finish=not more_body)
+        await self._send(
+            {"type": "http.response.body", "body": body, "more_body": more_body}
+        )
@@ -0,0 +1,78 @@
+import os
+import time
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi_csrf_protect import CsrfProtect
+from fastapi_csrf_protect.exceptions import TokenValidationError
+from itsdangerous import BadData, SignatureExpired, URLSafeTimedSerializer
+
+from app.core.cache import TTLCache
+
+# Seconds a CSRF token is handed out again before a new one is generated, 0 generates
+# one per page as CsrfProtect does. Keep it below the max age of the tokens, so that
+# a page rendered with a reused token stays usable long enough.
+CSRF_TOKEN_ROTATION_SECONDS = int(os.getenv("CSRF_TOKEN_ROTATION_SECONDS", "1800"))
+
+# Signed tokens of the cookies already checked, with the token they sign and when they
+# were signed. An entry lives until the signed token expires.
+_unsigned_tokens = TTLCache[Tuple[str, float]](maxsize=4096)
+
+
+class SessionCsrfProtect(CsrfProtect):
+    """
+    CsrfProtect keeping the token of a client for CSRF_TOKEN_ROTATION_SECONDS: pages
+    rendered in the meantime get the token of the cookie again, and no Set-Cookie, so
+    their responses can be cached. The signature of a cookie is checked once to
+    decide whether its token can be reused; validate_csrf is the one of CsrfProtect.
+
+    The routes get it with `csrf_protect: SessionCsrfProtect = Depends()`.
+    """
+
+    def __init__(self, request: Request):
+        self._request = request
+        # The signed token of the cookie, when it is the one handed out again
+        self._reused_signed_token: Optional[str] = None
+
+    def _unsign(self, signed_token: str) -> Tuple[str, float]:
+        """Returns the token signed by `signed_token` and when it was signed."""
+        unsigned = _unsigned_tokens.get(signed_token)
+        if unsigned is not None:
+            return unsigned
+        serializer = URLSafeTimedSerializer(self._secret_key, salt="fastapi-csrf-token")
+        try:
+            token, signed_at = serializer.loads(
+                signed_token, max_age=self._max_age, return_timestamp=True
+            )
+        except SignatureExpired:
+            raise TokenValidationError("The CSRF token has expired.")
+        except BadData:
+            raise TokenValidationError("The CSRF token is invalid.")
+        unsigned = (token, signed_at.timestamp())
+        _unsigned_tokens.set(
+            signed_token, unsigned, ttl=unsigned[1] + self._max_age - time.time()
+        )
+        return unsigned
+
+    def generate_csrf_tokens(self, secret_key: Optional[str] = None) -> Tuple[str, str]:
+        signed_token = self._request.cookies.get(self._cookie_key)
+        if signed_token and secret_key is None:
+            try:
+                token, signed_at = self._unsign(signed_token)
+            except TokenValidationError:
+                pass
+            else:
+                if time.time() - signed_at < CSRF_TOKEN_ROTATION_SECONDS:
+                    self._reused_signed_token = signed_token
+                    return token, signed_token
+        return super().generate_csrf_tokens(secret_key)
+
+    def set_csrf_cookie(self, csrf_signed_token: str, response: Response) -> None:
+        # The client already has this cookie
+        if csrf_signed_token != self._reused_signed_token:
+            super().set_csrf_cookie(csrf_signed_token, response)
+
+    def unset_csrf_cookie(self, response: Response) -> None:
+        # Keeps the cookie of the reused token, which is set again right after
+        if self._reused_signed_token is None:
+            super().unset_csrf_cookie(response)
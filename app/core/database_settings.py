@@ -0,0 +1,108 @@
+from typing import Any, Dict, List, Literal
+
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+class DatabaseSettings(BaseSettings):
+    """
+    Engine and connection pool tuning, the PRAGMA profile applied to every new SQLite
+    connection and the optional read replicas. The defaults of the pool are the ones
+    of SQLAlchemy.
+    """
+
+    echo: bool = Field(validation_alias="DATABASE_ECHO", default=False)
+    pool_size: int = Field(validation_alias="DATABASE_POOL_SIZE", default=5)
+    max_overflow: int = Field(validation_alias="DATABASE_MAX_OVERFLOW", default=10)
+    # Seconds to wait for a connection before giving up
+    pool_timeout: float = Field(validation_alias="DATABASE_POOL_TIMEOUT", default=30)
+    # Seconds after which a connection is replaced, -1 keeps it forever
+    pool_recycle: int = Field(validation_alias="DATABASE_POOL_RECYCLE", default=-1)
+    # Tests each connection with a round trip on checkout, surviving server restarts
+    pool_pre_ping: bool = Field(
+        validation_alias="DATABASE_POOL_PRE_PING", default=False
+    )
+    # Connections opened at startup, at most pool_size
+    pool_warmup: int = Field(validation_alias="DATABASE_POOL_WARMUP", default=5)
+    # Size of the cache of compiled SQL statements, 0 disables it
+    query_cache_size: int = Field(
+        validation_alias="DATABASE_QUERY_CACHE_SIZE", default=500
+    )
+
+    sqlite_journal_mode: Literal["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL"] = (
+        Field(validation_alias="SQLITE_JOURNAL_MODE", default="WAL")
+    )
+    # NORMAL is durable in WAL mode except for the last commits on power loss
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = Field(
+        validation_alias="SQLITE_SYNCHRONOUS", default="NORMAL"
+    )
+    sqlite_mmap_size: int = Field(
+        validation_alias="SQLITE_MMAP_SIZE", default=268435456
+    )
+    # Negative values are in KiB, i.e. 64 MiB of page cache per connection
+    sqlite_cache_size: int = Field(validation_alias="SQLITE_CACHE_SIZE", default=-64000)
+    # Milliseconds a writer waits for the database lock instead of failing
+    sqlite_busy_timeout: int = Field(
+        validation_alias="SQLITE_BUSY_TIMEOUT", default=5000
+    )
+    sqlite_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = Field(
+        validation_alias="SQLITE_TEMP_STORE", default="MEMORY"
+    )
+
+    # Optional read replicas, a comma separated list of database URLs
+    replica_database_urls: str = Field(
+        validation_alias="REPLICA_DATABASE_URLS", default=""
+    )
+    # Seconds a client keeps reading from the primary after its own writes
+    replica_sticky_seconds: float = Field(
+        validation_alias="REPLICA_STICKY_SECONDS", default=5
+    )
+
+    model_config = SettingsConfigDict(
+        env_file=".env", env_file_encoding="utf-8", extra="ignore"
+    )
+
+    def engine_options(self, url: str) -> Dict[str, Any]:
+        """Keyword arguments of create_async_engine for the database at `url`."""
+        options: Dict[str, Any] = {
+            "echo": self.echo,
+            "pool_pre_ping": self.pool_pre_ping,
+            "query_cache_size": self.query_cache_size,
+        }
+        parsed_url = make_url(url)
+        # In-memory SQLite databases live in a single connection (StaticPool)
+        if parsed_url.get_backend_name() == "sqlite" and (
+            parsed_url.database in (None, "", ":memory:") or "mode=memory" in url
+        ):
+            return options
+        if parsed_url.get_backend_name() == "sqlite":
+            # aiosqlite opens a new connection per checkout (NullPool) by default,
+            # which would repeat the PRAGMA profile on every request
+            options["poolclass"] = AsyncAdaptedQueuePool
+        options.update(
+            pool_size=self.pool_size,
+            max_overflow=self.max_overflow,
+            pool_timeout=self.pool_timeout,
+            pool_recycle=self.pool_recycle,
+        )
+        return options
+
+    def replica_urls(self) -> List[str]:
+        return [
+            url.strip() for url in self.replica_database_urls.split(",") if url.strip()
+        ]
+
+    def sqlite_pragmas(self) -> Dict[str, Any]:
+        return {
+            "journal_mode": self.sqlite_journal_mode,
+            "synchronous": self.sqlite_synchronous,
+            "mmap_size": self.sqlite_mmap_size,
+            "cache_size": self.sqlite_cache_size,
+            "busy_timeout": self.sqlite_busy_timeout,
+            "temp_store": self.sqlite_temp_store,
+        }
+
+
+database_settings = DatabaseSettings()
@@ -0,0 +1,65 @@
+import os
+import typing
+
+from jinja2 import pass_context
+from jinja2.runtime import Context
+from markupsafe import Markup
+
+from app.core.cache import FragmentCache
+
+# Memory the cached row fragments may take, see cached_fragment. 0 disables the cache.
+FRAGMENT_CACHE_BYTES = int(os.getenv("FRAGMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+
+# Row fragments rendered by cached_fragment, dropped by app/routes/view/caching.py
+# when the entities they were rendered from are committed
+fragment_cache = FragmentCache(max_bytes=FRAGMENT_CACHE_BYTES)
+
+
+def entity_key(entity: typing.Any) -> typing.Tuple[str, typing.Any]:
+    """Identifies a record in fragment_cache, across the sessions loading it."""
+    return type(entity).__name__, entity.id
+
+
+@pass_context
+def cached_fragment(
+    context: Context,
+    name: str,
+    entities: typing.Sequence[typing.Any],
+    **values: typing.Any,
+):
+    """
+    Renders the template `name` with `values` and the request only, e.g. a table row,
+    or returns it from fragment_cache. The fragment is keyed by the id and the updated
+    time of `entities`, the records it shows, so it is rendered again once one of them
+    changed. It must not show anything else of the request than the URLs of url_for:
+    tokens and other values of the page belong on the elements around it.
+
+        {{ cached_fragment("partials/group/group_row.html", [group], group=group) }}
+    """
+    environment = context.environment
+    template = environment.get_template(name)
+    request = context.get("request")
+    entities = [entity for entity in entities if entity is not None]
+    key = (
+        template,
+        str(request.base_url) if request is not None else None,
+        tuple((*entity_key(entity), entity.updated) for entity in entities),
+    )
+    encoded = fragment_cache.get(key)
+    if encoded is not None:
+        return Markup(encoded.decode())
+
+    def store(fragment: str) -> Markup:
+        # Kept encoded: a single Cyrillic letter makes Python store a whole row with
+        # two bytes per character, UTF-8 takes about half of that
+        fragment_cache.set(key, fragment.encode(), map(entity_key, entities))
+        return Markup(fragment)
+
+    values["request"] = request
+    if environment.is_async:
+        # Awaited by the calling template, as async templates await what they call
+        async def render() -> Markup:
+            return store(await template.render_async(values))
+
+        return render()
+    return store(template.render(values))
@@ -0,0 +1,138 @@
+import asyncio
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple, TypeVar, Union
+
+from fastapi_users.password import PasswordHelper
+
+ResultType = TypeVar("ResultType")
+
+# Size of the pool hashing and verifying passwords. Argon2 and bcrypt release the GIL,
+# so threads hash in parallel; processes also spread the work over the CPUs.
+PASSWORD_HASHING_WORKERS = int(
+    os.getenv("PASSWORD_HASHING_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+PASSWORD_HASHING_EXECUTOR = os.getenv("PASSWORD_HASHING_EXECUTOR", "thread")
+
+# The hashing functions run by the workers, importable so that processes can run them
+_password_helper = PasswordHelper()
+
+
+def _hash(password: str) -> str:
+    return _password_helper.hash(password)
+
+
+def _verify_and_update(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Union[str, None]]:
+    return _password_helper.verify_and_update(plain_password, hashed_password)
+
+
+class AsyncPasswordHelper(PasswordHelper):
+    """
+    PasswordHelper whose awaitable methods hash and verify in a bounded pool of
+    workers, instead of blocking the event loop for the duration of the hash. The
+    synchronous methods of PasswordHelper are kept for the callers outside the loop.
+
+    Parameters:
+        max_workers (int): The number of passwords hashed at the same time.
+        executor (str): "thread" or "process", the kind of workers.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PASSWORD_HASHING_WORKERS,
+        executor: str = PASSWORD_HASHING_EXECUTOR,
+    ):
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown password hashing executor {executor!r}")
+        super().__init__()
+        self.max_workers = max_workers
+        self.executor = executor
+        # Hashes submitted and not finished yet, running or waiting for a worker
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.completed = 0
+        self._pool: Optional[Executor] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """Hashes waiting for a free worker."""
+        return max(self.in_flight - self.max_workers, 0)
+
+    def _get_pool(self) -> Executor:
+        # Created on first use, so that no process is forked at import time
+        if self._pool is None:
+            pool_class = (
+                ProcessPoolExecutor
+                if self.executor == "process"
+                else ThreadPoolExecutor
+            )
+            self._pool = pool_class(max_workers=self.max_workers)
+        return self._pool
+
+    async def _run(self, function: Callable[..., ResultType], *args) -> ResultType:
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._get_pool(), function, *args
+            )
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    async def hash_async(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify_and_update_async(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Union[str, None]]:
+        return await self._run(_verify_and_update, plain_password, hashed_password)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+class PreparedPasswordHelper:
+    """
+    Password helper of the synchronous interface BaseUserManager calls, answering with
+    the hashes and verifications prepared beforehand in the pool of `helper`. The
+    user manager prepares them from the hooks run just before, see UserManager;
+    whatever was not prepared is computed on the spot, blocking the loop as before.
+    """
+
+    def __init__(self, helper: AsyncPasswordHelper):
+        self.helper = helper
+        self._hashes: Dict[str, str] = {}
+        self._verifications: Dict[Tuple[str, str], Tuple[bool, Union[str, None]]] = {}
+
+    async def prepare_hash(self, password: str):
+        self._hashes[password] = await self.helper.hash_async(password)
+
+    async def prepare_verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ):
+        self._verifications[(plain_password, hashed_password)] = (
+            await self.helper.verify_and_update_async(plain_password, hashed_password)
+        )
+
+    def hash(self, password: str) -> str:
+        prepared = self._hashes.pop(password, None)
+        return prepared if prepared is not None else self.helper.hash(password)
+
+    def verify_and_update(
+        self, plain_password: str, hashed_password: str
+    ) -> Tuple[bool, Union[str, None]]:
+        prepared = self._verifications.pop((plain_password, hashed_password), None)
+        if prepared is not None:
+            return prepared
+        return self.helper.verify_and_update(plain_password, hashed_password)
+
+    def generate(self) -> str:
+        return self.helper.generate()
+
+
+password_helper = AsyncPasswordHelper()
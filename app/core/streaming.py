@@ -0,0 +1,74 @@
+import asyncio
+import typing
+
+from starlette.background import BackgroundTask
+from starlette.responses import StreamingResponse
+
+
+class StreamingTemplateResponse(StreamingResponse):
+    """
+    Template response sent while the template renders, with generate_async: what is
+    rendered is sent whenever the template waits, e.g. for the next rows of a
+    StreamedPage, so the page head goes out before the rows are read. An error raised
+    once the response started can only close the connection, not render a page.
+    """
+
+    media_type = "text/html"
+
+    def __init__(
+        self,
+        template: typing.Any,
+        context: typing.Dict[str, typing.Any],
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ):
+        self.template = template
+        self.context = context
+        super().__init__(
+            _flush_when_waiting(template.generate_async(context)),
+            status_code,
+            headers,
+            media_type,
+            background,
+        )
+
+
+async def _flush_when_waiting(
+    chunks: typing.AsyncIterator[str], max_pending: int = 4096
+) -> typing.AsyncIterator[str]:
+    """
+    Joins the many small chunks generated by Jinja into the ones rendered until the
+    template waits, instead of sending each of them. The template renders in a task
+    ahead of the sends, by at most `max_pending` chunks.
+    """
+    pending: asyncio.Queue = asyncio.Queue(max_pending)
+    end = object()
+
+    async def render():
+        try:
+            async for chunk in chunks:
+                await pending.put(chunk)
+        except Exception as e:
+            await pending.put(e)
+        else:
+            await pending.put(end)
+
+    task = asyncio.create_task(render())
+    try:
+        while True:
+            parts = [await pending.get()]
+            while not pending.empty():
+                parts.append(pending.get_nowait())
+            finished = parts[-1] is end or isinstance(parts[-1], Exception)
+            if finished:
+                *parts, last = parts
+            if parts:
+                yield "".join(parts)
+            if finished:
+                if last is not end:
+                    raise last
+                return
+    finally:
+        task.cancel()
@@ -3,8 +3,11 @@ import sys
 
 import sqlalchemy
 from dotenv import load_dotenv
-from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import MANYTOONE, DeclarativeBase
+
+from app.core.database_settings import database_settings
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 load_dotenv(os.path.join(BASE_DIR, ".env"))
@@ -15,15 +18,48 @@ class Base(DeclarativeBase):
     metadata: sqlalchemy.MetaData = sqlalchemy.MetaData()  # type: ignore
 
 
+def has_no_dependents(model: type[Base]) -> bool:
+    """
+    Whether deleting a record of `model` leaves the ORM nothing to cascade, i.e. no
+    collections or association rows to clean up, so that a single DELETE will do.
+    """
+    return all(
+        relationship.direction is MANYTOONE and relationship.secondary is None
+        for relationship in sqlalchemy.inspect(model).relationships
+    )
+
+
 DATABASE_URL = os.environ["DATABASE_URL"]
 
 
-engine = create_async_engine(DATABASE_URL, echo=False)
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in database_settings.sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def create_engine(url: str) -> AsyncEngine:
+    """Creates an engine tuned by the database settings."""
+    new_engine = create_async_engine(url, **database_settings.engine_options(url))
+    if new_engine.dialect.name == "sqlite":
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    return new_engine
+
+
+engine = create_engine(DATABASE_URL)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+replica_engines = [create_engine(url) for url in database_settings.replica_urls()]
+replica_session_makers = [
+    async_sessionmaker(replica_engine, expire_on_commit=False)
+    for replica_engine in replica_engines
+]
+
 
 def init_models():
     from ..models.groups import Group, Permission, UserGroupLink  # noqa: F401
+    from ..models.search import SearchDocument  # noqa: F401
     from ..models.upload import Upload  # noqa: F401
     from ..models.users import Role, User, UserActivity  # noqa: F401
 
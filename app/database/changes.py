@@ -0,0 +1,92 @@
+"""
+The rows a bulk ORM statement changes, for the caches and the index derived from the
+tables: each of them listens to do_orm_execute and drops or rewrites only the rows
+of these keys, instead of everything the statement could have touched.
+"""
+
+from typing import Any, Mapping, Optional, Set
+
+from sqlalchemy import Column
+from sqlalchemy.orm import ORMExecuteState
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BindParameter, BinaryExpression, BooleanClauseList
+
+
+def changed_keys(
+    orm_execute_state: ORMExecuteState, column_name: str = "id"
+) -> Optional[Set[Any]]:
+    """
+    The values of the column `column_name` of the rows changed by the bulk INSERT,
+    UPDATE or DELETE of `orm_execute_state`, or None when the statement does not tell.
+
+    UPDATE and DELETE tell through their WHERE criteria, e.g. `id == ...` or
+    `id IN (...)`, alone or in a conjunction; INSERT through its values, when every
+    row sets the column. Statements without such a key may change any row.
+    """
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or orm_execute_state.is_select:
+        return None
+    column = mapper.local_table.c.get(column_name)
+    if column is None:
+        return None
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_insert:
+        return _inserted_values(orm_execute_state, column)
+    if statement.whereclause is None:
+        return None
+    return _criteria_values(statement.whereclause, column)
+
+
+def _criteria_values(clause, column: Column) -> Optional[Set[Any]]:
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        # Any restricted term bounds the rows of the whole conjunction
+        for term in clause.clauses:
+            values = _criteria_values(term, column)
+            if values is not None:
+                return values
+        return None
+    if not (
+        isinstance(clause, BinaryExpression)
+        and isinstance(clause.right, BindParameter)
+        and clause.left.compare(column)
+    ):
+        return None
+    if clause.operator is operators.eq:
+        return {clause.right.effective_value}
+    if clause.operator is operators.in_op and clause.right.expanding:
+        return set(clause.right.effective_value)
+    return None
+
+
+def _inserted_values(
+    orm_execute_state: ORMExecuteState, column: Column
+) -> Optional[Set[Any]]:
+    statement = orm_execute_state.statement
+    # The rows of insert().values(), which SQLAlchemy keeps by column, and the ones
+    # given to execute() as parameters, by column name
+    rows: list[Mapping] = []
+    if statement._values:
+        rows.append(statement._values)
+    for values in statement._multi_values:
+        rows.extend(values)
+    parameters = orm_execute_state.parameters
+    if isinstance(parameters, Mapping):
+        parameters = [parameters]
+    rows.extend(parameters or ())
+    if not rows:
+        return None
+
+    values = set()
+    for row in rows:
+        value = _value_of(row, column)
+        if value is None:
+            return None
+        values.add(value)
+    return values
+
+
+def _value_of(row: Mapping, column: Column) -> Any:
+    for key, value in row.items():
+        if (key if isinstance(key, str) else key.key) == column.key:
+            return value.effective_value if isinstance(value, BindParameter) else value
+    return None
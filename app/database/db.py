@@ -1,15 +1,30 @@
-from typing import Annotated, AsyncGenerator
+import asyncio
+import itertools
+from contextlib import AsyncExitStack
+from typing import Annotated, AsyncGenerator, Optional, Sequence
 
-from fastapi import Depends
-from fastapi_users.db import SQLAlchemyUserDatabase
-from fastapi_users.password import PasswordHelper
+from fastapi import Depends, Request
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from loguru import logger
-from sqlalchemy import select
-from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.pool import QueuePool
 
-from app.database.base import async_session_maker
+from app.core.cache import TTLCache
+from app.core.database_settings import database_settings
+from app.core.passwords import password_helper
+from app.database.base import (
+    async_session_maker,
+    engine,
+    replica_engines,
+    replica_session_makers,
+)
 from app.models.users import User
 
+# Name of the cookie carrying the JWT, used to recognise a client across requests
+AUTH_COOKIE_NAME = "fastapiusersauth"
+
 
 async def create_db_and_tables():
     # async with engine.begin() as conn:
@@ -17,19 +32,19 @@ async def create_db_and_tables():
     #     await conn.run_sync(Base.metadata.create_all)
 
     async with async_session_maker() as session:
-        password_helper = PasswordHelper()
         # Statement to check that user is created already for super user email
-        select_stmt = select(User).where(User.email == "superuser@admin.com")
+        select_stmt = select(User.id).where(User.email == "superuser@admin.com")
 
         # Query to database to execute the statement
         query = await session.execute(select_stmt)
-        user = User(
-            email="superuser@admin.com",
-            hashed_password=password_helper.hash("password123"),
-            is_superuser=True,
-            is_active=True,
-        )
         if not query.scalars().first():
+            # Hashed only when the superuser is missing, not on every start
+            user = User(
+                email="superuser@admin.com",
+                hashed_password=await password_helper.hash_async("password123"),
+                is_superuser=True,
+                is_active=True,
+            )
             logger.info(
                 f"Creating superuser... email: {user.email} | password: password123"
             )
@@ -37,12 +52,136 @@ async def create_db_and_tables():
             await session.commit()
         else:  # pragma: no cover
             logger.info(
-                f"Superuser already exists.... email: {user.email} | password: password123"
+                "Superuser already exists.... email: superuser@admin.com | password: password123"
             )
 
 
-async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
+async def warm_up_pools():
+    """
+    Opens `pool_warmup` connections of the primary and replica pools at startup, so
+    the first requests after a deploy do not pay for the connection setup.
+    """
+    for pool_engine in [engine, *replica_engines]:
+        await _warm_up_pool(pool_engine, database_settings.pool_warmup)
+
+
+async def _warm_up_pool(pool_engine: AsyncEngine, connections: int):
+    pool = pool_engine.pool
+    if not isinstance(pool, QueuePool):
+        return
+    # Overflow connections are closed once returned, keep to the pool size
+    connections = min(connections, pool.size())
+    async with AsyncExitStack() as stack:
+        opened = await asyncio.gather(
+            *(
+                stack.enter_async_context(pool_engine.connect())
+                for _ in range(connections)
+            )
+        )
+        await asyncio.gather(
+            *(connection.exec_driver_sql("SELECT 1") for connection in opened)
+        )
+    logger.info(f"Warmed up {connections} connections of {pool_engine.url!r}")
+
+
+class ReplicaRouter:
+    """
+    Picks the session maker of the read-only views: the replicas in turn, or the
+    primary when no replica is configured or the client wrote within the last
+    `sticky_seconds`, so that it reads its own writes despite the replication lag.
+
+    Clients are recognised by their auth cookie. The pinning is kept in the memory
+    of the worker process which served the write.
+    """
+
+    def __init__(
+        self,
+        primary: async_sessionmaker,
+        replicas: Sequence[async_sessionmaker],
+        sticky_seconds: float = 5.0,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self._next_replica = itertools.cycle(self.replicas)
+        self._pinned = TTLCache[bool](maxsize=10000, ttl=sticky_seconds)
+
+    def pin(self, client: Optional[str]):
+        if client:
+            self._pinned.set(client, True)
+
+    def is_pinned(self, client: Optional[str]) -> bool:
+        return bool(client and self._pinned.get(client, False))
+
+    def session_maker(self, client: Optional[str] = None) -> async_sessionmaker:
+        if not self.replicas or self.is_pinned(client):
+            return self.primary
+        return next(self._next_replica)
+
+
+replica_router = ReplicaRouter(
+    async_session_maker,
+    replica_session_makers,
+    database_settings.replica_sticky_seconds,
+)
+
+
+# A session records its writes, flushed or bulk ORM statements, and pins the client
+# it serves to the primary once they are committed.
+@event.listens_for(Session, "after_flush")
+def _record_flush(session: Session, flush_context):
+    session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _record_write_statement(orm_execute_state: ORMExecuteState):
+    if not orm_execute_state.is_select:
+        orm_execute_state.session.info["has_writes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _pin_writer(session: Session):
+    if session.info.pop("has_writes", False):
+        replica_router.pin(session.info.get("client"))
+
+
+async def get_async_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
+        session.info["client"] = request.cookies.get(AUTH_COOKIE_NAME)
+        yield session
+
+
+def in_unit_of_work(session: AsyncSession) -> bool:
+    return session.info.get("unit_of_work", False)
+
+
+async def get_unit_of_work(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session of the mutation views: the CRUD calls only flush, and the work is
+    committed once after the view returns, or rolled back if it raised. Views that
+    catch their errors to render them have to roll back themselves.
+    """
+    async with async_session_maker() as session:
+        session.info["client"] = request.cookies.get(AUTH_COOKIE_NAME)
+        session.info["unit_of_work"] = True
+        try:
+            yield session
+        except Exception:
+            await session.rollback()
+            raise
+        await session.commit()
+
+
+def read_session_maker(request: Request) -> async_sessionmaker:
+    """
+    Session maker of the read-only views, on a replica when one is configured. Also
+    used by the pages streamed with sessions of their own, see StreamedPage.
+    """
+    return replica_router.session_maker(request.cookies.get(AUTH_COOKIE_NAME))
+
+
+async def get_read_session(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """Session of the read-only views, on a replica when one is configured."""
+    async with read_session_maker(request)() as session:
         yield session
 
 
@@ -51,3 +190,5 @@ async def get_user_db(session: AsyncSession = Depends(get_async_session)):
 
 
 CurrentAsyncSession = Annotated[AsyncSession, Depends(get_async_session)]
+CurrentReadAsyncSession = Annotated[AsyncSession, Depends(get_read_session)]
+CurrentUnitOfWork = Annotated[AsyncSession, Depends(get_unit_of_work)]
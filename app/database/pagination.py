@@ -0,0 +1,326 @@
+import base64
+import binascii
+import json
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Generic,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+from fastapi import HTTPException
+from sqlalchemy import Row, Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import InstrumentedAttribute
+
+ItemType = TypeVar("ItemType")
+
+NEXT = "next"
+PREV = "prev"
+
+# The columns the records are paginated by, indexed together on the paginated tables
+KEYSET_COLUMNS = ("created", "id")
+
+# Strategies of counting the total of a paginated query, see SQLAlchemyCRUD
+COUNT_WINDOW = "window"
+COUNT_CACHED = "cached"
+COUNT_ESTIMATED = "estimated"
+
+
+@dataclass
+class Page(Generic[ItemType]):
+    """
+    One page of a keyset (cursor) paginated query.
+
+    Parameters:
+        items (list): The records of the current page, in ascending key order.
+        next_cursor (str, optional): Opaque cursor of the following page, None on the last page.
+        prev_cursor (str, optional): Opaque cursor of the previous page, None on the first page.
+        total (int, optional): The number of records across all pages, None when not counted.
+    """
+
+    items: List[ItemType]
+    next_cursor: Optional[str] = None
+    prev_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _python_type(column: InstrumentedAttribute) -> Optional[type]:
+    # Custom types such as the fastapi-users GUID do not declare a python_type
+    try:
+        return column.type.python_type
+    except NotImplementedError:
+        return None
+
+
+def _from_json(value: Any, python_type: Optional[type]) -> Any:
+    if value is None:
+        return None
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is uuid.UUID:
+        return uuid.UUID(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any], direction: str) -> str:
+    """Encodes the key values of a boundary record into an opaque, URL safe cursor."""
+    payload = json.dumps({"k": [_to_json(v) for v in values], "d": direction})
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(
+    cursor: str, columns: Sequence[InstrumentedAttribute]
+) -> Tuple[List[Any], str]:
+    """Decodes a cursor built by `encode_cursor` back into typed key values and direction."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        direction = payload["d"]
+        raw_values = payload["k"]
+        if direction not in (NEXT, PREV) or len(raw_values) != len(columns):
+            raise ValueError(cursor)
+        values = [
+            _from_json(value, _python_type(column))
+            for value, column in zip(raw_values, columns)
+        ]
+    except (binascii.Error, KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+    return values, direction
+
+
+def apply_keyset(
+    stmt: Select,
+    columns: Sequence[InstrumentedAttribute],
+    cursor: Optional[str],
+    limit: int,
+) -> Tuple[Select, str]:
+    """
+    Adds the seek predicate, ordering and limit of a keyset page to a select statement.
+
+    One extra row is requested so that `build_page` can tell whether another page exists.
+    Pages walked backwards are fetched in descending order and flipped by `build_page`.
+    """
+    direction = NEXT
+    if cursor:
+        values, direction = decode_cursor(cursor, columns)
+        key = tuple_(*columns)
+        stmt = stmt.where(
+            key > tuple_(*values) if direction == NEXT else key < tuple_(*values)
+        )
+    if direction == NEXT:
+        stmt = stmt.order_by(*[column.asc() for column in columns])
+    else:
+        stmt = stmt.order_by(*[column.desc() for column in columns])
+    return stmt.limit(limit + 1), direction
+
+
+async def read_keyset_page(
+    db: AsyncSession,
+    model: Any,
+    cursor: Optional[str],
+    limit: int,
+    key_names: Sequence[str] = KEYSET_COLUMNS,
+) -> Page:
+    """Reads a page of all the records of `model`, ordered by its `key_names` columns."""
+    columns = [getattr(model, name) for name in key_names]
+    stmt, direction = apply_keyset(select(model), columns, cursor, limit)
+    query = await db.execute(stmt)
+    return build_page(
+        query.scalars().all(), key_names, limit, direction, has_cursor=bool(cursor)
+    )
+
+
+def build_page(
+    records: Sequence[ItemType],
+    key_names: Sequence[str],
+    limit: int,
+    direction: str,
+    has_cursor: bool,
+) -> Page[ItemType]:
+    """Turns the rows fetched for a statement built by `apply_keyset` into a `Page`."""
+    has_more = len(records) > limit
+    items = list(records[:limit])
+    if direction == PREV:
+        items.reverse()
+    if not items:
+        return Page(items=items)
+    next_cursor, prev_cursor = page_cursors(
+        items[0], items[-1], key_names, direction, has_more, has_cursor
+    )
+    return Page(items=items, next_cursor=next_cursor, prev_cursor=prev_cursor)
+
+
+def page_cursors(
+    first: Any,
+    last: Any,
+    key_names: Sequence[str],
+    direction: str,
+    has_more: bool,
+    has_cursor: bool,
+) -> Tuple[Optional[str], Optional[str]]:
+    """The next and previous cursors of a non empty page, from its first and last items."""
+
+    def cursor_for(item: Any, page_direction: str) -> str:
+        return encode_cursor(
+            [getattr(item, name) for name in key_names], page_direction
+        )
+
+    if direction == NEXT:
+        next_cursor = cursor_for(last, NEXT) if has_more else None
+        prev_cursor = cursor_for(first, PREV) if has_cursor else None
+    else:
+        next_cursor = cursor_for(last, NEXT)
+        prev_cursor = cursor_for(first, PREV) if has_more else None
+    return next_cursor, prev_cursor
+
+
+class StreamedPage(Generic[ItemType]):
+    """
+    A keyset page read from a server side cursor while it is iterated, e.g. by a
+    streamed template, so that its records are not all held in memory. `next_cursor`,
+    `prev_cursor` and `total` are set once the records have been iterated.
+
+    The records are read with a session of their own: the session of the request is
+    closed before a streamed response is sent. The page can only be iterated once, a
+    template listing its records twice must read a `Page` instead. Pages walked
+    backwards first read the keys of their records, to stream the records in
+    ascending order from the first one.
+
+    Parameters:
+        session_maker (async_sessionmaker): Opens the session reading the records.
+        statement (Select): A statement built by `apply_keyset`, selecting the records
+            and, when `window_total` is set, their total as a second column.
+        columns (list): The key columns given to `apply_keyset`.
+        key_names (list): The attributes of the records the cursors are built from.
+        limit (int): The number of records of the page.
+        direction (str): The direction returned by `apply_keyset`.
+        has_cursor (bool): Whether the page was sought past a cursor.
+        window_total (bool): Whether the rows carry the total, see `statement`.
+        count (callable, optional): Counts the total with the session of the records,
+            used when the total is not in the rows.
+    """
+
+    # Rows fetched from the cursor at a time
+    batch_size = 100
+
+    def __init__(
+        self,
+        session_maker: async_sessionmaker,
+        statement: Select,
+        columns: Sequence[InstrumentedAttribute],
+        key_names: Sequence[str],
+        limit: int,
+        direction: str,
+        has_cursor: bool,
+        window_total: bool = False,
+        count: Optional[Callable[[AsyncSession], Awaitable[int]]] = None,
+    ):
+        self.session_maker = session_maker
+        self.statement = statement
+        self.columns = columns
+        self.key_names = key_names
+        self.limit = limit
+        self.direction = direction
+        self.has_cursor = has_cursor
+        self.window_total = window_total
+        self.count = count
+        self.next_cursor: Optional[str] = None
+        self.prev_cursor: Optional[str] = None
+        self.total: Optional[int] = None
+        self._iterated = False
+
+    @property
+    def items(self) -> "StreamedPage[ItemType]":
+        return self
+
+    async def __aiter__(self) -> AsyncIterator[ItemType]:
+        if self._iterated:
+            raise RuntimeError("A streamed page can only be iterated once")
+        self._iterated = True
+        async with self.session_maker() as session:
+            statement = self.statement
+            first = last = None
+            read = 0
+            has_more = False
+            if self.direction == PREV:
+                keys = (
+                    await session.execute(statement.with_only_columns(*self.columns))
+                ).all()
+                has_more = len(keys) > self.limit
+                statement = _ascending_from(statement, self.columns, keys[: self.limit])
+
+            if statement is not None:
+                # Without yield_per: the selectinload queries of the relationships
+                # inherit it and fail, as they unique their rows. The ORM still loads
+                # the rows of a server side cursor batch by batch when they are fetched
+                # by partitions.
+                result = await session.stream(statement)
+                try:
+                    async for row in _rows(result.partitions(self.batch_size)):
+                        if read == self.limit:
+                            has_more = True
+                            break
+                        if first is None:
+                            first = row[0]
+                            if self.window_total:
+                                self.total = row[1]
+                        last = row[0]
+                        read += 1
+                        yield last
+                finally:
+                    await result.close()
+
+            if first is not None:
+                self.next_cursor, self.prev_cursor = page_cursors(
+                    first,
+                    last,
+                    self.key_names,
+                    self.direction,
+                    has_more,
+                    self.has_cursor,
+                )
+            if self.total is None and self.count is not None:
+                self.total = await self.count(session)
+
+
+async def _rows(partitions: AsyncIterator[Sequence[Row]]) -> AsyncIterator[Row]:
+    async for partition in partitions:
+        for row in partition:
+            yield row
+
+
+def _ascending_from(
+    statement: Select,
+    columns: Sequence[InstrumentedAttribute],
+    keys: Sequence[Row],
+) -> Optional[Select]:
+    """
+    The records of a page walked backwards, `keys` being their keys in descending
+    order, read in ascending order from the lowest one. None for an empty page.
+    """
+    if not keys:
+        return None
+    return (
+        statement.order_by(None)
+        .limit(len(keys))
+        .where(tuple_(*columns) >= tuple_(*keys[-1]))
+        .order_by(*[column.asc() for column in columns])
+    )
@@ -0,0 +1,320 @@
+"""
+Full-text search over users, groups, roles and uploads.
+
+Every indexed record has a row in search_documents, rewritten from the database once
+per transaction, just before it is committed. The records to rewrite are collected
+from the flushes of the session and from the bulk ORM statements: the keys of their
+`id ==` or `id IN` criteria or inserted values, the rows of INSERT ... RETURNING, and
+only for an UPDATE or DELETE without such a key, the rows its criteria select.
+Inserts without a key nor RETURNING and raw SQL are not seen, rebuild_search_index
+recreates the whole index from the tables.
+"""
+
+import re
+import sqlite3
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+
+from fastapi import HTTPException
+
+from sqlalchemy import (
+    column,
+    delete,
+    event,
+    func,
+    insert,
+    literal_column,
+    select,
+    table,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Connection, CursorResult
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction
+
+from app.core.database_settings import database_settings
+from app.database.changes import changed_keys
+from app.models.groups import Group
+from app.models.search import (
+    SEARCH_CONFIG,
+    SQLITE_FTS_TABLE,
+    SearchDocument,
+    search_vector,
+)
+from app.models.upload import Upload
+from app.models.users import Role, User, UserProfile
+
+# Profiles are indexed as part of the document of their user
+INDEXED_MODELS = {
+    User: "user",
+    UserProfile: "profile",
+    Group: "group",
+    Role: "role",
+    Upload: "upload",
+}
+
+_TERM = re.compile(r"\w+")
+# SQLSTATE of a PostgreSQL statement cancelled by its statement_timeout
+_QUERY_CANCELED = "57014"
+# The FTS5 table, its hidden column of the same name is the left operand of MATCH
+_fts = table(SQLITE_FTS_TABLE, column("rowid"), column(SQLITE_FTS_TABLE))
+
+
+@dataclass
+class SearchHit:
+    entity: str
+    entity_id: str
+    title: str
+    body: str | None
+
+
+def _documents(connection: Connection, entity: str, ids=None) -> Iterable[dict]:
+    """Yields the documents of the records of `entity`, only `ids` if given."""
+    if entity == "user":
+        statement = select(
+            User.id,
+            User.email,
+            UserProfile.first_name,
+            UserProfile.last_name,
+            UserProfile.company,
+        ).outerjoin(UserProfile, User.profile_id == UserProfile.id)
+        key = User.id
+    else:
+        model, title, body = {
+            "group": (Group, Group.group_name, Group.group_desc),
+            "role": (Role, Role.role_name, Role.role_desc),
+            "upload": (Upload, Upload.name, Upload.source),
+        }[entity]
+        statement = select(model.id, title, body)
+        key = model.id
+    if ids is not None:
+        statement = statement.where(key.in_(ids))
+    for record_id, title, *body in connection.execute(statement):
+        yield {
+            "entity": entity,
+            "entity_id": str(record_id),
+            "title": title or "",
+            "body": " ".join(part for part in body if part) or None,
+        }
+
+
+def _write_documents(connection: Connection, documents: List[dict]):
+    dialect = connection.dialect.name
+    if dialect not in ("sqlite", "postgresql"):
+        connection.execute(
+            delete(SearchDocument).where(
+                SearchDocument.entity == documents[0]["entity"],
+                SearchDocument.entity_id.in_(
+                    [document["entity_id"] for document in documents]
+                ),
+            )
+        )
+        connection.execute(insert(SearchDocument), documents)
+        return
+    statement = (sqlite if dialect == "sqlite" else postgresql).insert(SearchDocument)
+    connection.execute(
+        statement.on_conflict_do_update(
+            index_elements=[SearchDocument.entity, SearchDocument.entity_id],
+            set_={
+                "title": statement.excluded.title,
+                "body": statement.excluded.body,
+            },
+        ),
+        documents,
+    )
+
+
+def reindex(connection: Connection, pending: Dict[str, Set[uuid.UUID]]):
+    """Rewrites the documents of the records in `pending`, by entity, or drops them."""
+    if profile_ids := pending.pop("profile", None):
+        pending.setdefault("user", set()).update(
+            connection.scalars(select(User.id).where(User.profile_id.in_(profile_ids)))
+        )
+    for entity, ids in pending.items():
+        if not ids:
+            continue
+        documents = list(_documents(connection, entity, ids))
+        if documents:
+            _write_documents(connection, documents)
+        # The records that are gone
+        missing = {str(record_id) for record_id in ids} - {
+            document["entity_id"] for document in documents
+        }
+        if missing:
+            connection.execute(
+                delete(SearchDocument).where(
+                    SearchDocument.entity == entity,
+                    SearchDocument.entity_id.in_(missing),
+                )
+            )
+
+
+def rebuild_search_index(connection: Connection):
+    """Recreates the whole index, run it with AsyncConnection.run_sync."""
+    connection.execute(delete(SearchDocument))
+    for entity in ("user", "group", "role", "upload"):
+        documents = list(_documents(connection, entity))
+        if documents:
+            connection.execute(insert(SearchDocument), documents)
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql(
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('optimize')"
+        )
+
+
+def _pending(session: Session) -> Dict[str, Set[uuid.UUID]]:
+    return session.info.setdefault("search_pending", {})
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_flushed(session: Session, flush_context):
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        entity = INDEXED_MODELS.get(type(instance))
+        if entity is not None:
+            _pending(session).setdefault(entity, set()).add(instance.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_statement(orm_execute_state: ORMExecuteState):
+    if orm_execute_state.is_select or orm_execute_state.bind_mapper is None:
+        return None
+    model = orm_execute_state.bind_mapper.class_
+    entity = INDEXED_MODELS.get(model)
+    if entity is None:
+        return None
+    session = orm_execute_state.session
+    pending = _pending(session).setdefault(entity, set())
+    ids = changed_keys(orm_execute_state)
+    if ids is not None:
+        pending.update(ids)
+        return None
+    if not orm_execute_state.is_insert:
+        # Without a key, the rows are the ones the criteria select before the change
+        affected = select(model.id)
+        if orm_execute_state.statement.whereclause is not None:
+            affected = affected.where(orm_execute_state.statement.whereclause)
+        pending.update(session.scalars(affected))
+        return None
+    result = orm_execute_state.invoke_statement()
+    if isinstance(result, CursorResult) and not result.returns_rows:
+        return result
+    # The rows of RETURNING are buffered to read the ids, the caller reads them again
+    frozen = result.freeze()
+    for row in frozen().all():
+        if isinstance(row[0], model):
+            pending.add(row[0].id)
+    return frozen()
+
+
+@event.listens_for(Session, "before_commit")
+def _reindex_committed(session: Session):
+    # The final flush of the commit runs after this event
+    session.flush()
+    pending = session.info.pop("search_pending", None)
+    if pending:
+        reindex(session.connection(), pending)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_pending(session: Session, transaction: SessionTransaction):
+    if transaction.parent is None:
+        session.info.pop("search_pending", None)
+
+
+def _match_terms(terms: List[str]) -> str:
+    # Every term has to match, the last one as a prefix as it is still being typed
+    return " ".join(
+        f'"{term}"' + ("*" if position == len(terms) - 1 else "")
+        for position, term in enumerate(terms)
+    )
+
+
+def _timed_out(error: DBAPIError) -> bool:
+    return (
+        getattr(error.orig, "pgcode", None) == _QUERY_CANCELED
+        or getattr(error.orig, "sqlite_errorcode", None) == sqlite3.SQLITE_BUSY
+    )
+
+
+@asynccontextmanager
+async def _statement_timeout(
+    db: AsyncSession, seconds: Optional[float]
+) -> AsyncIterator[None]:
+    """
+    Lets the database end the statements of the block after `seconds`, answered with
+    a 504. PostgreSQL cancels them on the server with a statement_timeout local to the
+    transaction. SQLite cannot stop a running statement, it bounds the wait for the
+    lock of a writer with busy_timeout, set back to its setting after the block.
+    """
+    if seconds is None:
+        yield
+        return
+    milliseconds = max(1, round(seconds * 1000))
+    connection = await db.connection()
+    dialect = connection.dialect.name
+    if dialect == "postgresql":
+        await connection.execute(
+            select(func.set_config("statement_timeout", f"{milliseconds}ms", True))
+        )
+    elif dialect == "sqlite":
+        await connection.exec_driver_sql(f"PRAGMA busy_timeout = {milliseconds}")
+    try:
+        yield
+    except DBAPIError as error:
+        if not _timed_out(error):
+            raise
+        raise HTTPException(
+            status_code=504,
+            detail="Поиск занял слишком много времени, уточните запрос",
+        )
+    finally:
+        if dialect == "sqlite":
+            await connection.exec_driver_sql(
+                f"PRAGMA busy_timeout = {database_settings.sqlite_busy_timeout}"
+            )
+
+
+async def search(
+    db: AsyncSession,
+    query: str,
+    limit: int = 20,
+    timeout_seconds: Optional[float] = None,
+) -> List[SearchHit]:
+    """
+    Returns the records matching every word of `query`, the best ranked first. A
+    search running longer than `timeout_seconds` is ended by the database, see
+    _statement_timeout.
+    """
+    terms = _TERM.findall(query.lower())
+    if not terms:
+        return []
+    columns = (
+        SearchDocument.entity,
+        SearchDocument.entity_id,
+        SearchDocument.title,
+        SearchDocument.body,
+    )
+    if db.get_bind().dialect.name == "postgresql":
+        ts_query = func.to_tsquery(
+            literal_column(f"'{SEARCH_CONFIG}'"),
+            " & ".join(terms[:-1] + [f"{terms[-1]}:*"]),
+        )
+        statement = (
+            select(*columns)
+            .where(search_vector.op("@@")(ts_query))
+            .order_by(func.ts_rank(search_vector, ts_query).desc())
+        )
+    else:
+        # bm25() is lower for better matches, title matches count ten times more
+        statement = (
+            select(*columns)
+            .join(_fts, _fts.c.rowid == SearchDocument.id)
+            .where(_fts.c[SQLITE_FTS_TABLE].op("MATCH")(_match_terms(terms)))
+            .order_by(func.bm25(literal_column(SQLITE_FTS_TABLE), 10.0, 1.0))
+        )
+    async with _statement_timeout(db, timeout_seconds):
+        rows = await db.execute(statement.limit(limit))
+    return [SearchHit(**row._mapping) for row in rows]
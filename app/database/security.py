@@ -1,22 +1,41 @@
+import hashlib
 import os
+import time
 import uuid
-from typing import Optional
+from typing import Optional, Union
 
+import jwt
 from dotenv import load_dotenv
 from fastapi import Depends, Request, Response
+from fastapi.security import OAuth2PasswordRequestForm
 from fastapi_csrf_protect import CsrfProtect
-from fastapi_users import BaseUserManager, FastAPIUsers, UUIDIDMixin
+from fastapi_users import (
+    BaseUserManager,
+    FastAPIUsers,
+    UUIDIDMixin,
+    exceptions,
+    schemas,
+)
 from fastapi_users.authentication import (
     AuthenticationBackend,
     CookieTransport,
     JWTStrategy,
 )
-from fastapi_users.db import SQLAlchemyUserDatabase
 from fastapi_users.jwt import decode_jwt
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
 from jwt.exceptions import InvalidTokenError
 from loguru import logger
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import ORMExecuteState, Session, make_transient_to_detached
 
-from app.database.db import User, get_user_db
+from app.core.cache import TTLCache
+from app.core.passwords import (
+    AsyncPasswordHelper,
+    PreparedPasswordHelper,
+    password_helper,
+)
+from app.database.changes import changed_keys
+from app.database.db import AUTH_COOKIE_NAME, User, get_user_db
 
 SECRET: str = os.getenv("AUTH_SECRET", "my_default_secret_key")
 
@@ -25,10 +44,28 @@ logger.critical(
 )
 logger.critical(SECRET)
 
+# Users resolved from the auth cookie are cached by id for a short time, sparing the
+# query of every request. Each worker has its own cache: a change made by another
+# worker is seen once the entry expires.
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "1024"))
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+
+user_cache = TTLCache[User](maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL_SECONDS)
+
 
 class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
     reset_password_token_secret = SECRET
     verification_token_secret = SECRET
+    password_helper: PreparedPasswordHelper
+    # The password authenticate verifies once get_by_email has read the user
+    _password_to_verify: Optional[str] = None
+
+    def __init__(
+        self,
+        user_db: SQLAlchemyUserDatabase,
+        password_helper: AsyncPasswordHelper = password_helper,
+    ):
+        super().__init__(user_db, PreparedPasswordHelper(password_helper))
 
     async def on_after_register(self, user: User, request: Optional[Request] = None):
         print(f"User {user.id} has registered.")
@@ -53,6 +90,39 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
         await csrf_protect.validate_csrf(request)
         print(f"User {user.id} logged in.")
 
+    # Passwords are hashed and verified by the worker pool of password_helper:
+    # BaseUserManager calls the helper synchronously, so the hooks it runs just before
+    # prepare the results the PreparedPasswordHelper then answers with
+    async def validate_password(
+        self, password: str, user: Union[schemas.UC, User]
+    ) -> None:
+        # Run by create, update and reset_password right before hashing the password
+        await self.password_helper.prepare_hash(password)
+
+    async def authenticate(
+        self, credentials: OAuth2PasswordRequestForm
+    ) -> Optional[User]:
+        self._password_to_verify = credentials.password
+        try:
+            return await super().authenticate(credentials)
+        finally:
+            self._password_to_verify = None
+
+    async def get_by_email(self, user_email: str) -> User:
+        password = self._password_to_verify
+        try:
+            user = await super().get_by_email(user_email)
+        except exceptions.UserNotExists:
+            if password is not None:
+                # authenticate still hashes it, against timing attacks
+                await self.password_helper.prepare_hash(password)
+            raise
+        if password is not None:
+            await self.password_helper.prepare_verify_and_update(
+                password, user.hashed_password
+            )
+        return user
+
     # Decoding the JWT token using the inheritance of the BaseUserManager
     async def on_decode_jwt(self, jwt_token: str):
 
@@ -64,14 +134,111 @@ class UserManager(UUIDIDMixin, BaseUserManager[User, uuid.UUID]):
 
 
 async def get_user_manager(user_db: SQLAlchemyUserDatabase = Depends(get_user_db)):
-    yield UserManager(user_db)
+    yield UserManager(user_db, password_helper)
+
+
+AUTH_TOKEN_LIFETIME_SECONDS = 3600
+AUTH_TOKEN_AUDIENCE = ["fastapi-users:auth"]
+AUTH_TOKEN_ALGORITHM = "HS256"
+
+cookie_transport = CookieTransport(
+    cookie_name=AUTH_COOKIE_NAME, cookie_max_age=AUTH_TOKEN_LIFETIME_SECONDS
+)
 
+# Digests of the auth tokens found valid by verify_jwt, kept until the tokens expire
+verified_tokens = TTLCache[bool](maxsize=4096, ttl=AUTH_TOKEN_LIFETIME_SECONDS)
 
-cookie_transport = CookieTransport(cookie_max_age=3600)
+
+def _snapshot(user: User) -> User:
+    """A detached copy of the columns of `user`, shared by the requests."""
+    snapshot = User(
+        **{
+            column.key: getattr(user, column.key)
+            for column in inspect(User).column_attrs
+        }
+    )
+    make_transient_to_detached(snapshot)
+    return snapshot
+
+
+class CachedJWTStrategy(JWTStrategy):
+    """
+    JWTStrategy resolving the user of a valid token from user_cache, the database
+    is only read on a miss. The token itself is still verified on every request.
+    """
+
+    async def read_token(
+        self, token: Optional[str], user_manager: BaseUserManager[User, uuid.UUID]
+    ) -> Optional[User]:
+        if token is None:
+            return None
+
+        try:
+            data = decode_jwt(
+                token, self.decode_key, self.token_audience, algorithms=[self.algorithm]
+            )
+            user_id = user_manager.parse_id(data.get("sub"))
+        except (jwt.PyJWTError, exceptions.InvalidID):
+            return None
+
+        snapshot = user_cache.get(user_id)
+        if snapshot is None:
+            try:
+                user = await user_manager.get(user_id)
+            except exceptions.UserNotExists:
+                return None
+            user_cache.set(user_id, _snapshot(user))
+            return user
+        # A copy attached to the session of the request, without a query, so that
+        # the user can be updated through it
+        return await user_manager.user_db.session.merge(snapshot, load=False)
 
 
 def get_jwt_strategy() -> JWTStrategy:
-    return JWTStrategy(secret=SECRET, lifetime_seconds=3600)
+    return CachedJWTStrategy(
+        secret=SECRET,
+        lifetime_seconds=AUTH_TOKEN_LIFETIME_SECONDS,
+        token_audience=AUTH_TOKEN_AUDIENCE,
+        algorithm=AUTH_TOKEN_ALGORITHM,
+    )
+
+
+# The cached user is dropped when the row changes, password changes and deactivation
+# included, and again once the change is committed, as a request reading the row in
+# between may have cached the old version.
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _forget_changed_user(mapper, connection, target: User):
+    user_cache.pop(target.id)
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).add(target.id)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _forget_bulk_changed_users(orm_execute_state: ORMExecuteState):
+    if not (
+        orm_execute_state.is_update or orm_execute_state.is_delete
+    ) or orm_execute_state.bind_mapper is not inspect(User):
+        return
+    session = orm_execute_state.session
+    user_ids = changed_keys(orm_execute_state)
+    if user_ids is None:
+        # Any user may have changed
+        user_cache.clear()
+        session.info["changed_all_users"] = True
+        return
+    for user_id in user_ids:
+        user_cache.pop(user_id)
+    session.info.setdefault("changed_users", set()).update(user_ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_committed_users(session: Session):
+    if session.info.pop("changed_all_users", False):
+        user_cache.clear()
+    for user_id in session.info.pop("changed_users", ()):
+        user_cache.pop(user_id)
 
 
 auth_backend = AuthenticationBackend(
@@ -81,21 +248,27 @@ auth_backend = AuthenticationBackend(
 )
 
 
-async def verify_jwt(
-    jwt_token: str, user_db: SQLAlchemyUserDatabase = Depends(get_user_db)
-) -> bool:
-
-    isTokenValid: bool = False
-    payload = None
+def verify_jwt(jwt_token: str) -> bool:
+    """
+    Whether `jwt_token` is an auth token signed with SECRET that has not expired,
+    without reading the user. The digests of the valid tokens are remembered until
+    the tokens expire, so that verifying them again is a dictionary lookup.
+    """
+    digest = hashlib.sha256(jwt_token.encode()).digest()
+    if verified_tokens.get(digest):
+        return True
     try:
-        async for user_manager in get_user_manager(user_db=user_db):
-            payload = user_manager.on_decode_jwt(jwt_token)
-            # Add your verification logic here
-    except InvalidTokenError:
-        logger.debug(payload)
-    if payload:
-        isTokenValid = True
-    return isTokenValid
+        payload = decode_jwt(
+            jwt_token, SECRET, AUTH_TOKEN_AUDIENCE, algorithms=[AUTH_TOKEN_ALGORITHM]
+        )
+    except InvalidTokenError as e:
+        logger.debug(f"Invalid auth token: {e}")
+        return False
+    if "exp" in payload:
+        verified_tokens.set(digest, True, ttl=payload["exp"] - time.time())
+    else:
+        verified_tokens.set(digest, True)
+    return True
 
 
 fastapi_users = FastAPIUsers[User, uuid.UUID](get_user_manager, [auth_backend])
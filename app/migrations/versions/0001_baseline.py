@@ -0,0 +1,274 @@
+"""baseline schema and lookup indexes
+
+Creates the schema of the models together with the indexes of the hot lookups:
+the keyset (created, id) indexes of the paginated lists, the unique group
+membership index, upload.user_id, user_activity.user_id and the lower()
+expression indexes used by the case insensitive lookups.
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 02:47:56.626829
+
+"""
+
+from typing import Sequence, Union
+
+import fastapi_users_db_sqlalchemy.generics
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001_baseline"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "group",
+        sa.Column("group_name", sa.String(length=200), nullable=False),
+        sa.Column("group_desc", sa.String(length=1024), nullable=True),
+        sa.Column("permission", sa.String(length=20), nullable=True),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("group_name"),
+    )
+    op.create_index("ix_group_created_id", "group", ["created", "id"], unique=False)
+    op.create_index(
+        "ix_group_group_name_lower",
+        "group",
+        [sa.text("lower(group_name)")],
+        unique=False,
+    )
+    op.create_table(
+        "roles",
+        sa.Column("role_name", sa.String(length=200), nullable=False),
+        sa.Column("role_desc", sa.String(length=1024), nullable=True),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("role_name"),
+    )
+    op.create_index(
+        "ix_roles_role_name_lower", "roles", [sa.text("lower(role_name)")], unique=False
+    )
+    op.create_table(
+        "user_profiles",
+        sa.Column("first_name", sa.String(length=120), nullable=False),
+        sa.Column("last_name", sa.String(length=120), nullable=False),
+        sa.Column("gender", sa.String(length=10), nullable=True),
+        sa.Column("date_of_birth", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("city", sa.String(length=50), nullable=True),
+        sa.Column("country", sa.String(length=50), nullable=True),
+        sa.Column("address", sa.String(length=255), nullable=True),
+        sa.Column("phone", sa.String(length=20), nullable=True),
+        sa.Column("company", sa.String(length=100), nullable=True),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_user_profiles_first_name"),
+        "user_profiles",
+        ["first_name"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_user_profiles_last_name"), "user_profiles", ["last_name"], unique=False
+    )
+    op.create_table(
+        "users",
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column("role_id", sa.Uuid(), nullable=True),
+        sa.Column("profile_id", sa.Uuid(), nullable=True),
+        sa.Column("id", fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False),
+        sa.Column("email", sa.String(length=320), nullable=False),
+        sa.Column("hashed_password", sa.String(length=1024), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False),
+        sa.Column("is_superuser", sa.Boolean(), nullable=False),
+        sa.Column("is_verified", sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["profile_id"],
+            ["user_profiles.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["role_id"],
+            ["roles.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_users_created_id", "users", ["created", "id"], unique=False)
+    op.create_index(op.f("ix_users_email"), "users", ["email"], unique=True)
+    op.create_index(
+        "ix_users_email_lower", "users", [sa.text("lower(email)")], unique=False
+    )
+    op.create_table(
+        "group_users",
+        sa.Column("group_id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "user_id", fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False
+        ),
+        sa.Column("user_status_in_group", sa.String(length=30), nullable=True),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["group_id"],
+            ["group.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_group_users_group_id_user_id",
+        "group_users",
+        ["group_id", "user_id"],
+        unique=True,
+    )
+    op.create_table(
+        "upload",
+        sa.Column("name", sa.String(length=250), nullable=False),
+        sa.Column("unique_name", sa.String(length=50), nullable=False),
+        sa.Column("file_type", sa.String(), nullable=False),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("file_size", sa.Integer(), nullable=True),
+        sa.Column(
+            "user_id", fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False
+        ),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("unique_name"),
+    )
+    op.create_index(
+        "ix_upload_user_id_created_id",
+        "upload",
+        ["user_id", "created", "id"],
+        unique=False,
+    )
+    op.create_table(
+        "user_activity",
+        sa.Column(
+            "user_id", fastapi_users_db_sqlalchemy.generics.GUID(), nullable=False
+        ),
+        sa.Column("activity_date", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("activity_type", sa.String(length=200), nullable=False),
+        sa.Column("activity_desc", sa.String(length=1024), nullable=True),
+        sa.Column("id", sa.Uuid(), nullable=False),
+        sa.Column(
+            "created",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("(CURRENT_TIMESTAMP)"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_user_activity_user_id"), "user_activity", ["user_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_user_activity_user_id"), table_name="user_activity")
+    op.drop_table("user_activity")
+    op.drop_index("ix_upload_user_id_created_id", table_name="upload")
+    op.drop_table("upload")
+    op.drop_index("ix_group_users_group_id_user_id", table_name="group_users")
+    op.drop_table("group_users")
+    op.drop_index("ix_users_email_lower", table_name="users")
+    op.drop_index(op.f("ix_users_email"), table_name="users")
+    op.drop_index("ix_users_created_id", table_name="users")
+    op.drop_table("users")
+    op.drop_index(op.f("ix_user_profiles_last_name"), table_name="user_profiles")
+    op.drop_index(op.f("ix_user_profiles_first_name"), table_name="user_profiles")
+    op.drop_table("user_profiles")
+    op.drop_index("ix_roles_role_name_lower", table_name="roles")
+    op.drop_table("roles")
+    op.drop_index("ix_group_group_name_lower", table_name="group")
+    op.drop_index("ix_group_created_id", table_name="group")
+    op.drop_table("group")
@@ -0,0 +1,136 @@
+"""full-text search index
+
+Adds search_documents, the searchable text of users, groups, roles and uploads, with
+its full-text index: an external content FTS5 table synced by triggers on SQLite, a
+GIN index of the weighted tsvector on PostgreSQL. The index is filled from the
+existing records.
+
+Revision ID: 0002_search_index
+Revises: 0001_baseline
+Create Date: 2026-10-18 09:12:31.402118
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0002_search_index"
+down_revision: Union[str, None] = "0001_baseline"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The schema and the documents as of this revision, copied rather than imported
+# from the application so that the migration keeps doing what it did
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple', coalesce(body, '')), 'B')"
+)
+SQLITE_FTS_TABLE = "search_documents_fts"
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, body, content='search_documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+]
+
+
+def _text_id(column: str, dialect: str, dashed: bool = False) -> str:
+    """The id of `column` as str(uuid) writes it, the documents refer to records so."""
+    if dialect != "sqlite":
+        return f"CAST({column} AS TEXT)"
+    if dashed:
+        # The GUID of fastapi-users, already stored so
+        return column
+    # Uuid, stored as 32 hex digits
+    return " || '-' || ".join(
+        f"substr({column}, {start}, {length})"
+        for start, length in ((1, 8), (9, 4), (13, 4), (17, 4), (21, 12))
+    )
+
+
+def _body(*columns: str) -> str:
+    """The non-empty columns joined by spaces, NULL when there are none."""
+    joined = " || ".join(
+        f"coalesce(' ' || nullif({column}, ''), '')" for column in columns
+    )
+    return f"nullif(substr({joined}, 2), '')"
+
+
+def _rebuild_documents(dialect: str) -> None:
+    profile = _body(
+        "user_profiles.first_name", "user_profiles.last_name", "user_profiles.company"
+    )
+    op.execute(
+        "INSERT INTO search_documents (entity, entity_id, title, body) "
+        f"SELECT 'user', {_text_id('users.id', dialect, dashed=True)}, users.email, "
+        f"{profile} FROM users LEFT OUTER JOIN user_profiles "
+        "ON users.profile_id = user_profiles.id"
+    )
+    for entity, table, title, body in (
+        ("group", '"group"', "group_name", "group_desc"),
+        ("role", "roles", "role_name", "role_desc"),
+        ("upload", "upload", "name", "source"),
+    ):
+        op.execute(
+            "INSERT INTO search_documents (entity, entity_id, title, body) "
+            f"SELECT '{entity}', {_text_id('id', dialect)}, coalesce({title}, ''), "
+            f"{_body(body)} FROM {table}"
+        )
+    if dialect == "sqlite":
+        op.execute(
+            f"INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}) VALUES ('optimize')"
+        )
+
+
+def upgrade() -> None:
+    op.create_table(
+        "search_documents",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("entity", sa.String(length=20), nullable=False),
+        sa.Column("entity_id", sa.String(length=36), nullable=False),
+        sa.Column("title", sa.Text(), nullable=False),
+        sa.Column("body", sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("entity", "entity_id"),
+    )
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.create_index(
+            "ix_search_documents_vector",
+            "search_documents",
+            [sa.text(f"({SEARCH_VECTOR_SQL})")],
+            postgresql_using="gin",
+        )
+    elif bind.dialect.name == "sqlite":
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+    _rebuild_documents(bind.dialect.name)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.drop_index("ix_search_documents_vector", table_name="search_documents")
+    elif bind.dialect.name == "sqlite":
+        op.execute(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}")
+    op.drop_table("search_documents")
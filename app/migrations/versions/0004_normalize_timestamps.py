@@ -0,0 +1,51 @@
+"""normalize timestamps
+
+On SQLite, gives the created and updated times stored by CURRENT_TIMESTAMP, e.g.
+'2026-10-18 09:12:31', the microseconds SQLAlchemy writes the times it binds with,
+'2026-10-18 09:12:31.000000'. SQLite compares the stored text, where the shorter
+form sorts first: the (created, id) keyset pagination, seeking past a bound time,
+skipped the records of the same second stored without microseconds. The records
+now get their times from Python, this converts the ones created before.
+
+Revision ID: 0004_normalize_timestamps
+Revises: 0002_search_index
+Create Date: 2026-10-18 14:05:52.318270
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0004_normalize_timestamps"
+down_revision: Union[str, None] = "0002_search_index"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = (
+    "group",
+    "roles",
+    "user_profiles",
+    "users",
+    "group_users",
+    "upload",
+    "user_activity",
+)
+
+
+def upgrade() -> None:
+    # The other databases store the times as timestamps
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        for column in ("created", "updated"):
+            op.execute(
+                f"UPDATE \"{table}\" SET {column} = {column} || '.000000' "
+                f"WHERE length({column}) = 19"
+            )
+
+
+def downgrade() -> None:
+    # Both forms are read back as the same times
+    pass
@@ -0,0 +1,53 @@
+"""dashed user ids
+
+On SQLite, rewrites the user ids of group_users, upload and user_activity stored as
+32 hex digits, e.g. '3f2b...', in the dashed form of users.id, '3f2b...-...'. The
+columns referencing users.id were mapped with the Uuid type, which writes the hex
+form, while users.id is a fastapi-users GUID; they now are GUIDs too, and the rows
+written before never matched their user.
+
+Revision ID: 0005_dashed_user_ids
+Revises: 0004_normalize_timestamps
+Create Date: 2026-10-18 14:31:08.902417
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "0005_dashed_user_ids"
+down_revision: Union[str, None] = "0004_normalize_timestamps"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+TABLES = ("group_users", "upload", "user_activity")
+
+
+def _dashed(column: str) -> str:
+    return " || '-' || ".join(
+        f"substr({column}, {start}, {length})"
+        for start, length in ((1, 8), (9, 4), (13, 4), (17, 4), (21, 12))
+    )
+
+
+def upgrade() -> None:
+    # The other databases store both types as native UUIDs
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        op.execute(
+            f"UPDATE {table} SET user_id = lower({_dashed('user_id')}) "
+            "WHERE length(user_id) = 32"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    for table in TABLES:
+        op.execute(
+            f"UPDATE {table} SET user_id = replace(user_id, '-', '') "
+            "WHERE length(user_id) = 36"
+        )
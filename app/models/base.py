@@ -1,9 +1,10 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 UUID = uuid.uuid4
 
 # from fastapi import Depends
+from fastapi_users_db_sqlalchemy import GUID  # noqa: F401
 from sqlalchemy import DateTime
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.sql.functions import func
@@ -11,14 +12,30 @@ from sqlalchemy.sql.functions import func
 from app.database.base import Base
 
 
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
 class BaseSQLModel(Base):
     # Abstract defined class that is meant to be subclassed
     __abstract__ = True
+    # Fetch server generated defaults with RETURNING on flush, so records created in
+    # a unit of work need no refresh
+    __mapper_args__ = {"eager_defaults": True}
     # id: Mapped[UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
     id: Mapped[uuid.UUID] = mapped_column(primary_key=True, default=uuid.uuid4)
+    # The Python side default keeps the stored format identical to bound parameters,
+    # which the (created, id) keyset pagination compares against on SQLite.
     created: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
     )
+    # Also set from Python: CURRENT_TIMESTAMP only has a one second resolution on
+    # SQLite, too coarse for the ETags of the list pages (routes/view/caching.py)
     updated: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+        DateTime(timezone=True),
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=func.now(),
     )
@@ -1,11 +1,13 @@
-from sqlalchemy import UUID, Enum, String
+import enum
+
+from sqlalchemy import UUID, Enum, Index, String, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.schema import ForeignKey
 
-from app.models.base import BaseSQLModel
+from app.models.base import GUID, BaseSQLModel
 
 
-class Permission(Enum):
+class Permission(enum.Enum):
     READ = "read"
     WRITE = "write"
     DELETE = "delete"
@@ -14,13 +16,23 @@ class Permission(Enum):
 
 class Group(BaseSQLModel):
     __tablename__ = "group"
+    # Keyset index of the paginated group list
+    __table_args__ = (Index("ix_group_created_id", "created", "id"),)
     group_name: Mapped[str] = mapped_column(
         String(length=200), nullable=False, unique=True
     )
     group_desc: Mapped[str | None] = mapped_column(String(length=1024), nullable=True)
 
-    # Creating enum for the permission to be given to the group
-    permission: Mapped[Permission] = mapped_column(Permission, nullable=True)
+    # Creating enum for the permission to be given to the group, stored by value
+    permission: Mapped[Permission | None] = mapped_column(
+        Enum(
+            Permission,
+            native_enum=False,
+            length=20,
+            values_callable=lambda permissions: [item.value for item in permissions],
+        ),
+        nullable=True,
+    )
 
     users: Mapped[list["User"]] = relationship(
         "User", secondary="group_users", back_populates="groups", uselist=True
@@ -30,7 +42,17 @@ class Group(BaseSQLModel):
 # Associated table for the group and user relationship
 class UserGroupLink(BaseSQLModel):
     __tablename__ = "group_users"
+    # A user is a member of a group once; also serves the lookups by group_id
+    __table_args__ = (
+        Index("ix_group_users_group_id_user_id", "group_id", "user_id", unique=True),
+    )
     group_id: Mapped[UUID] = mapped_column(ForeignKey("group.id"), default=None)
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), default=None)
+    user_id: Mapped[UUID] = mapped_column(GUID, ForeignKey("users.id"), default=None)
     # --------------------------------------------------------------------------
-    user_status_in_group: Mapped[str | None] = mapped_column(String(length=30), nullable=True)
+    user_status_in_group: Mapped[str | None] = mapped_column(
+        String(length=30), nullable=True
+    )
+
+
+# read_by_column compares lower() of string columns, which a plain index cannot serve
+Index("ix_group_group_name_lower", func.lower(Group.group_name))
@@ -0,0 +1,94 @@
+from sqlalchemy import (
+    DDL,
+    Index,
+    Integer,
+    String,
+    Text,
+    UniqueConstraint,
+    event,
+    literal_column,
+    text,
+)
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.base import Base
+
+
+# Language agnostic text search configuration, the records mix Russian and English
+SEARCH_CONFIG = "simple"
+# Titles weigh more than bodies in ts_rank. The GIN expression index is only used by
+# the queries repeating the expression, they share this one.
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(body, '')), 'B')"
+)
+
+
+class SearchDocument(Base):
+    """
+    One searchable record per user, group, role or upload, kept up to date by
+    app.database.search. The full-text index over title and body is an FTS5 table on
+    SQLite and a GIN index of the weighted tsvector on PostgreSQL.
+
+    Parameters:
+        entity (str): The kind of the record: "user", "group", "role" or "upload".
+        entity_id (str): The id of the record.
+        title (str): The heading of the record, ranked above the body.
+        body (str, optional): The remaining indexed text.
+    """
+
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        UniqueConstraint("entity", "entity_id"),
+        Index(
+            "ix_search_documents_vector",
+            text(f"({SEARCH_VECTOR_SQL})"),
+            postgresql_using="gin",
+        ).ddl_if(dialect="postgresql"),
+    )
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    entity: Mapped[str] = mapped_column(String(length=20), nullable=False)
+    entity_id: Mapped[str] = mapped_column(String(length=36), nullable=False)
+    title: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    body: Mapped[str | None] = mapped_column(Text, nullable=True)
+
+
+search_vector = literal_column(f"({SEARCH_VECTOR_SQL})")
+
+# The FTS5 table indexes the rows of search_documents (external content) and is kept
+# in sync by triggers
+SQLITE_FTS_TABLE = "search_documents_fts"
+SQLITE_FTS_DDL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_FTS_TABLE} USING fts5(
+        title, body, content='search_documents', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_ai AFTER INSERT ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_ad AFTER DELETE ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS search_documents_au AFTER UPDATE ON search_documents
+    BEGIN
+        INSERT INTO {SQLITE_FTS_TABLE}({SQLITE_FTS_TABLE}, rowid, title, body)
+        VALUES ('delete', old.id, old.title, old.body);
+        INSERT INTO {SQLITE_FTS_TABLE}(rowid, title, body)
+        VALUES (new.id, new.title, new.body);
+    END""",
+]
+for statement in SQLITE_FTS_DDL:
+    event.listen(
+        SearchDocument.__table__,
+        "after_create",
+        DDL(statement).execute_if(dialect="sqlite"),
+    )
+event.listen(
+    SearchDocument.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
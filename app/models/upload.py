@@ -1,13 +1,17 @@
-from sqlalchemy import UUID, Integer, String
+from sqlalchemy import UUID, Index, Integer, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.schema import ForeignKey
 
-from app.models.base import BaseSQLModel
+from app.models.base import GUID, BaseSQLModel
 
 
 # Creating a model for files uploaded by users
 class Upload(BaseSQLModel):
     __tablename__ = "upload"
+    # Serves the per user, keyset paginated file list
+    __table_args__ = (
+        Index("ix_upload_user_id_created_id", "user_id", "created", "id"),
+    )
     name: Mapped[str] = mapped_column(String(length=250), nullable=False)
     unique_name: Mapped[str] = mapped_column(
         String(length=50), unique=True, nullable=False
@@ -15,5 +19,5 @@ class Upload(BaseSQLModel):
     file_type: Mapped[str] = mapped_column(nullable=False)
     source: Mapped[str] = mapped_column(nullable=False)
     file_size: Mapped[int | None] = mapped_column(Integer, nullable=True)
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"))
+    user_id: Mapped[UUID] = mapped_column(GUID, ForeignKey("users.id"))
     user = relationship("User", back_populates="uploads")
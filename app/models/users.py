@@ -1,25 +1,33 @@
 from datetime import datetime
 
-from fastapi_users.db import SQLAlchemyBaseUserTableUUID
+from fastapi_users_db_sqlalchemy import SQLAlchemyBaseUserTableUUID
 
 # from fastapi_users_db_sqlalchemy import GUID
-from sqlalchemy import UUID, DateTime, String
+from sqlalchemy import UUID, DateTime, Index, String
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.sql.functions import func
 from sqlalchemy.sql.schema import ForeignKey
 
-from app.models.base import Base, BaseSQLModel
+from app.models.base import GUID, Base, BaseSQLModel, utcnow
 from app.models.groups import Group
 from app.models.upload import Upload
 
 
 class User(SQLAlchemyBaseUserTableUUID, Base):
     __tablename__ = "users"
+    # Keyset index of the paginated user list
+    __table_args__ = (Index("ix_users_created_id", "created", "id"),)
+    __mapper_args__ = {"eager_defaults": True}
     created: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now()
+        DateTime(timezone=True),
+        default=utcnow,
+        server_default=func.now(),
     )
     updated: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+        DateTime(timezone=True),
+        default=utcnow,
+        onupdate=utcnow,
+        server_default=func.now(),
     )
     # add 1 to 1 relationship with the role model keeping default as None
     # Default value on creating user is None and updated later
@@ -110,7 +118,9 @@ class UserActivity(BaseSQLModel):
     """
 
     __tablename__ = "user_activity"
-    user_id: Mapped[UUID] = mapped_column(ForeignKey("users.id"), default=None)
+    user_id: Mapped[UUID] = mapped_column(
+        GUID, ForeignKey("users.id"), default=None, index=True
+    )
     activity_date: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=func.now()
     )
@@ -120,3 +130,9 @@ class UserActivity(BaseSQLModel):
     )
     user: Mapped["User"] = relationship("User", back_populates="activity")
     user: Mapped["User"] = relationship("User", back_populates="activity")
+
+
+# Case insensitive lookups: fastapi-users finds users by lower(email) and
+# read_by_column compares lower() of string columns
+Index("ix_users_email_lower", func.lower(User.email))
+Index("ix_roles_role_name_lower", func.lower(Role.role_name))
@@ -1,13 +1,14 @@
 import uuid
-from typing import Generic, Type, TypeVar
+from typing import Generic, Optional, Type, TypeVar
 
 from fastapi import HTTPException
 from pydantic import BaseModel
-from sqlalchemy import select
+from sqlalchemy import delete, select, update
 
 # from sqlalchemy.orm import Session
-from app.database.base import Base
+from app.database.base import Base, has_no_dependents
 from app.database.db import CurrentAsyncSession
+from app.database.pagination import Page, read_keyset_page
 
 ModelType = TypeVar("ModelType", bound=Base)
 PydanticCreateModelType = TypeVar("PydanticCreateModelType", bound=BaseModel)
@@ -48,6 +49,12 @@ class BaseCRUD(Generic[ModelType, PydanticCreateModelType, PydanticUpdateModelTy
 
         # return db.query(self.db_model).offset(skip).limit(limit).all()
 
+    # Reading a page of records by seeking on (created, id) instead of OFFSET
+    async def read_page(
+        self, db: CurrentAsyncSession, cursor: Optional[str] = None, limit: int = 100
+    ) -> Page[ModelType]:
+        return await read_keyset_page(db, self.db_model, cursor, limit)
+
     # Reading the one record only from the database model
     async def read(self, db: CurrentAsyncSession, id: uuid.UUID) -> ModelType | None:
         stmt = select(self.db_model).where(self.db_model.id == id)
@@ -60,17 +67,33 @@ class BaseCRUD(Generic[ModelType, PydanticCreateModelType, PydanticUpdateModelTy
     async def update(
         self, db: CurrentAsyncSession, id: uuid.UUID, item: PydanticUpdateModelType
     ) -> ModelType | None:
+        # Single UPDATE ... RETURNING round trip where the dialect supports it
+        if db.get_bind().dialect.update_returning:
+            stmt = (
+                update(self.db_model)
+                .where(self.db_model.id == id)
+                .values(**item.dict())
+                .returning(self.db_model)
+                .execution_options(populate_existing=True)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await db.commit()
+            return db_item
+
         stmt = select(self.db_model).where(self.db_model.id == id)
         query = await db.execute(stmt)
-        if not query:
+        db_item = query.scalar_one_or_none()
+        if db_item is None:
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            for key, value in item.dict().items():
-                setattr(db_item, key, value)
-            await db.commit()
-            await db.refresh(db_item)
-            return db_item
+        for key, value in item.dict().items():
+            setattr(db_item, key, value)
+        await db.commit()
+        await db.refresh(db_item)
+        return db_item
 
     # Adding a database model to delete a record
     async def delete(
@@ -78,12 +101,26 @@ class BaseCRUD(Generic[ModelType, PydanticCreateModelType, PydanticUpdateModelTy
         db: CurrentAsyncSession,
         id: uuid.UUID,
     ):
+        # Single DELETE ... RETURNING round trip when the ORM has nothing to cascade
+        if db.get_bind().dialect.delete_returning and has_no_dependents(self.db_model):
+            stmt = (
+                delete(self.db_model)
+                .where(self.db_model.id == id)
+                .returning(self.db_model)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await db.commit()
+            return db_item
+
         stmt = select(self.db_model).where(self.db_model.id == id)
         query = await db.execute(stmt)
-        if not query:
+        db_item = query.scalar_one_or_none()
+        if db_item is None:
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            await db.delete(db_item)
-            await db.commit()
-            return db_item
+        await db.delete(db_item)
+        await db.commit()
+        return db_item
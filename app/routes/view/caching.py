@@ -0,0 +1,204 @@
+"""
+Conditional GET of the list pages: a page is sent with an ETag standing for what it
+was rendered from, and a request sending the ETag back in If-None-Match is answered
+304 Not Modified before the page is read or rendered.
+
+The ETag hashes the last update and the row count of the tables the page lists, read
+with a single query, and what the page shows of the request: the user, their auth
+cookie and CSRF token, the htmx headers and the templates. `Cache-Control: private,
+no-cache` lets the browser keep the page and revalidate it on every request, htmx
+included, as its requests go through the HTTP cache of the browser.
+"""
+
+import email.utils
+import hashlib
+import itertools
+import math
+import os
+from datetime import datetime, timezone
+from typing import List, Optional, Sequence
+
+from sqlalchemy import Select, event, func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import ORMExecuteState, Session
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.core.cache import TTLCache
+from app.core.fragments import entity_key, fragment_cache
+from app.database.changes import changed_keys
+from app.database.db import AUTH_COOKIE_NAME
+from app.models.groups import Group
+from app.models.upload import Upload
+from app.models.users import Role, User, UserProfile
+from app.templates import (
+    FRAGMENT_HEADERS,
+    TEMPLATE_DIRECTORY,
+    TEMPLATE_MODE,
+    jinja_env,
+    static_files,
+)
+
+
+def changes(model: type, *criteria) -> Select:
+    """
+    Selects the last update and the count of the rows of `model` matching `criteria`.
+    A deleted row lowers the count, an inserted or updated one moves the last update.
+    """
+    return (
+        select(func.max(model.updated), func.count())
+        .select_from(model)
+        .where(*criteria)
+    )
+
+
+# How long the modification time of the templates and static files is kept, outside
+# of production mode where they change: a page edited within it keeps its ETag
+SOURCE_CHECK_SECONDS = 2.0
+
+_newest_sources = TTLCache[float](
+    maxsize=1, ttl=math.inf if TEMPLATE_MODE == "production" else SOURCE_CHECK_SECONDS
+)
+
+
+def _newest_source() -> float:
+    """
+    The modification time of the most recently changed template or static file, the
+    latter moving the URLs of asset_url. In production mode, where neither is
+    reloaded, it is read once.
+    """
+    newest = _newest_sources.get(None)
+    if newest is None:
+        templates = [
+            os.path.join(TEMPLATE_DIRECTORY, name)
+            for name in jinja_env.list_templates()
+        ]
+        assets = [
+            os.path.join(static_files.directory, path) for path in static_files.files()
+        ]
+        newest = max(os.stat(path).st_mtime for path in templates + assets)
+        _newest_sources.set(None, newest)
+    return newest
+
+
+class PageValidator:
+    """
+    The ETag and Last-Modified of a page, see `page_validator`.
+
+    Last-Modified is only informative: If-Modified-Since alone is not trusted, as a
+    deleted row does not move the last update of its table.
+    """
+
+    def __init__(self, etag: str, last_modified: Optional[datetime] = None):
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def headers(self) -> dict:
+        headers = {
+            "ETag": self.etag,
+            "Cache-Control": "private, no-cache",
+            # As the pages themselves, see Templates.TemplateResponse and
+            # CompressionMiddleware
+            "Vary": ", ".join((*FRAGMENT_HEADERS, "Accept-Encoding")),
+        }
+        if self.last_modified is not None:
+            headers["Last-Modified"] = email.utils.format_datetime(
+                self.last_modified, usegmt=True
+            )
+        return headers
+
+    def matches(self, request: Request) -> bool:
+        """Whether the client already has the page, compared as weak ETags."""
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is None:
+            return False
+        etags = [etag.strip().removeprefix("W/") for etag in if_none_match.split(",")]
+        return "*" in etags or self.etag.removeprefix("W/") in etags
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers)
+
+    def apply(self, response: Response) -> Response:
+        response.headers.update(self.headers)
+        return response
+
+
+async def page_validator(
+    db: AsyncSession,
+    request: Request,
+    user: User,
+    csrf_token: Optional[str],
+    *sources: Select,
+) -> PageValidator:
+    """
+    Reads the validator of the page of `request` rendered for `user`, listing the
+    rows selected by `sources`, built with `changes`.
+    """
+    statement = sources[0] if len(sources) == 1 else union_all(*sources)
+    rows = (await db.execute(statement)).all()
+
+    updates: List[datetime] = [
+        _as_utc(last_update) for last_update, _ in rows if last_update is not None
+    ]
+    parts: Sequence = (
+        str(request.url),
+        [request.headers.get(header) for header in FRAGMENT_HEADERS],
+        user.id,
+        user.updated,
+        request.cookies.get(AUTH_COOKIE_NAME),
+        csrf_token,
+        _newest_source(),
+        [tuple(row) for row in rows],
+    )
+    digest = hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+    # Weak, as the compression of the responses changes their bytes
+    return PageValidator(f'W/"{digest}"', max(updates, default=None))
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite returns the stored UTC times without their time zone
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+# Rendered rows of fragment_cache are dropped once the records they show are committed.
+# A changed record also moves its `updated`, which the rows are keyed by, so this
+# mostly frees their memory early.
+_FRAGMENT_MODELS = (Group, Role, Upload, User, UserProfile)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_fragments(session: Session, flush_context):
+    changed = session.info.setdefault("changed_fragments", set())
+    for instance in itertools.chain(session.dirty, session.deleted):
+        if isinstance(instance, _FRAGMENT_MODELS):
+            changed.add(entity_key(instance))
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _collect_bulk_changed_fragments(orm_execute_state: ORMExecuteState):
+    mapper = orm_execute_state.bind_mapper
+    if not (
+        (orm_execute_state.is_update or orm_execute_state.is_delete)
+        and mapper is not None
+        and issubclass(mapper.class_, _FRAGMENT_MODELS)
+    ):
+        return
+    session = orm_execute_state.session
+    ids = changed_keys(orm_execute_state)
+    if ids is None:
+        # Any row may have changed
+        session.info["changed_all_fragments"] = True
+        return
+    changed = session.info.setdefault("changed_fragments", set())
+    changed.update((mapper.class_.__name__, record_id) for record_id in ids)
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_committed_fragments(session: Session):
+    if session.info.pop("changed_all_fragments", False):
+        fragment_cache.clear()
+    for key in session.info.pop("changed_fragments", ()):
+        fragment_cache.forget(key)
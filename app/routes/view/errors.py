@@ -1,4 +1,4 @@
-from typing import Dict, Union
+from typing import Dict, Optional, Union
 
 from fastapi import HTTPException
 from loguru import logger
@@ -11,6 +11,7 @@ def handle_error(
     template: str,
     context: Dict,
     error: Union[ValidationError, HTTPException, Exception],
+    block: Optional[str] = None,
 ) -> templates.TemplateResponse:
     """
     Handles errors that occur during the processing of a request, and returns a template
@@ -22,6 +23,8 @@ def handle_error(
         It should include the request object and any database objects that need to be rendered in the template.
         For example, you might pass {"request": request, "group": await group_crud.read_by_primary_key(db, group_id)} as the context.
         error (Exception): This is the exception that was raised during the execution of your code.
+        block (str, optional): The block of the template rendered alone for the htmx requests, as in the
+        response of the view without errors.
 
     Returns:
         A FastAPI response containing the rendered template with the error messages.
@@ -43,4 +46,4 @@ def handle_error(
 
     context["error_messages"] = error_messages
     logger.info(error_messages)
-    return templates.TemplateResponse(template, context)
+    return templates.TemplateResponse(template, context, block=block)
@@ -1,21 +1,25 @@
 import json
 import uuid
+from typing import List, Optional
 from urllib.parse import parse_qs, unquote_plus
 
 import nh3
-from fastapi import Depends, HTTPException, Request, Response
+from fastapi import Depends, Form, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
-from fastapi_csrf_protect import CsrfProtect
-from sqlalchemy import select
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import joinedload, selectinload
 
-from app.database.db import CurrentAsyncSession
+from app.core.csrf import SessionCsrfProtect
+from app.database.db import CurrentAsyncSession, CurrentReadAsyncSession
+from app.database.pagination import COUNT_CACHED
 from app.database.security import current_active_user
 from app.models.groups import Group as GroupModelDB
 from app.models.groups import UserGroupLink as UserGroupLinkModelDB
 from app.models.users import Role as UserRoleModelDB
 from app.models.users import User as UserModelDB
 from app.models.users import UserProfile as UserProfileModelDB
+from app.routes.view.caching import changes, page_validator
 from app.routes.view.errors import handle_error
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.schema.group import GroupCreate
@@ -24,13 +28,22 @@ from app.templates import templates
 
 group_view_route = APIRouter()
 
+# Most users whose profiles get_user_profiles reads at once, the templates request the
+# members of all the groups of a page in batches of this size
+USER_PROFILE_BATCH = 500
+
 
 group_crud = SQLAlchemyCRUD[GroupModelDB](
-    GroupModelDB, related_models={UserModelDB: "users"}
+    GroupModelDB,
+    related_models={UserModelDB: ("users", selectinload)},
+    total_count=COUNT_CACHED,
 )
 user_crud = SQLAlchemyCRUD[UserModelDB](
     UserModelDB,
-    related_models={UserProfileModelDB: "profile", UserRoleModelDB: "role"},
+    related_models={
+        UserProfileModelDB: ("profile", joinedload),
+        UserRoleModelDB: ("role", joinedload),
+    },
 )
 
 
@@ -38,37 +51,60 @@ user_crud = SQLAlchemyCRUD[UserModelDB](
 @group_view_route.get("/groups", response_class=HTMLResponse)
 async def get_groups(
     request: Request,
-    db: CurrentAsyncSession,
+    db: CurrentReadAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100,
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         if not current_user.is_superuser:
             raise HTTPException(
                 status_code=403, detail="Вы не авторизованы для этой страницы"
             )
+        csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
+        validator = await page_validator(
+            db,
+            request,
+            current_user,
+            csrf_token,
+            changes(GroupModelDB),
+            changes(UserGroupLinkModelDB),
+        )
+        if validator.matches(request):
+            return validator.not_modified()
+
         # Access the cookies using the Request object
-        groups = await group_crud.read_all(db, skip, limit, join_relationships=True)
+        # The fields rendered by pages/groups.html, and the versions of its rows
+        columns = ["group_name", "group_desc", "updated", "users.id", "users.updated"]
+        # Read at once, never streamed: the page lists the groups twice, a streamed
+        # page would read them twice, maybe not the same between the two
+        page = await group_crud.read_page(
+            db, cursor, limit, join_relationships=True, columns=columns
+        )
         # users = await user_crud.read_all(db, skip, limit, join_relationships=True) ###
 
-        csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
-
         response = templates.TemplateResponse(
             "pages/groups.html",
             {
                 "request": request,
-                "groups": groups,
+                "groups": page.items,
+                "user_ids": [
+                    member.id for group in page.items for member in group.users
+                ],
+                "user_profile_batch": USER_PROFILE_BATCH,
+                "page": page,
+                "limit": limit,
                 # "users": users, ###
                 "user_type": current_user.is_superuser,
                 "csrf_token": csrf_token,
             },
+            block="dashboard_body",
         )
 
         csrf_protect.set_csrf_cookie(signed_token, response)
 
-        return response
+        return validator.apply(response)
     except Exception as e:
         csrf_token = request.headers.get("X-CSRF-Token")
         return handle_error(
@@ -78,6 +114,7 @@ async def get_groups(
                 "csrf_token": csrf_token,
             },
             e,
+            block="dashboard_body",
         )
 
 
@@ -101,6 +138,30 @@ async def get_user_profile(
             "user_profile": user_profile,
             "user_type": current_user.is_superuser,
         },
+        block="user_profile",
+    )
+
+
+# Defining a route to get the profiles of the members of the groups of a page in one
+# request, swapped out of band into their elements. A POST, as the ids of a page would
+# make a long URL
+@group_view_route.post("/get_user_profiles", response_class=HTMLResponse)
+async def get_user_profiles(
+    request: Request,
+    db: CurrentReadAsyncSession,
+    user_id: List[uuid.UUID] = Form(max_length=USER_PROFILE_BATCH),
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    user_profiles = await user_crud.read_many_by_primary_key(
+        db, user_id, join_relationships=True
+    )
+    return templates.TemplateResponse(
+        "partials/group/group_user_profiles.html",
+        {
+            "request": request,
+            "user_profiles": user_profiles,
+            "user_type": current_user.is_superuser,
+        },
     )
 
 
@@ -123,6 +184,7 @@ async def get_create_group(
             "user_type": current_user.is_superuser,
             "csrf_token": csrf_token,
         },
+        block="group_page",
     )
 
     return response
@@ -151,6 +213,7 @@ async def get_group_by_id(
             "user_type": current_user.is_superuser,
             "csrf_token": csrf_token,
         },
+        block="group_page",
     )
 
 
@@ -160,7 +223,7 @@ async def post_create_group(
     response: Response,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     await csrf_protect.validate_csrf(request)
 
@@ -233,7 +296,7 @@ async def post_update_group(
     group_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
 
     try:
@@ -297,7 +360,7 @@ async def delete_group(
     group_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
 
     try:
@@ -366,7 +429,11 @@ async def get_group_users(
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Отсутствует авторизация для добавления группы!")
     group = await group_crud.read_by_primary_key(db, group_id)
-    users = await user_crud.read_all(db, join_relationships=True)
+    users = await user_crud.read_all(
+        db,
+        join_relationships=True,
+        columns=["profile.first_name", "profile.last_name", "role.role_name"],
+    )
     group_users = await db.execute(
         select(UserGroupLinkModelDB).where(UserGroupLinkModelDB.group_id == group_id)
     )
@@ -385,6 +452,7 @@ async def get_group_users(
             "csrf_token": csrf_token,
             "user_type": current_user.is_superuser,
         },
+        block="group_page",
     )
 
 
@@ -396,7 +464,7 @@ async def post_group_user_link(
     group_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
 
     try:
@@ -406,50 +474,47 @@ async def post_group_user_link(
             raise HTTPException(status_code=403, detail="Отсутствует авторизация для добавления группы!")
         form = await request.form()
 
-        all_users = set(form.getlist("all_users"))
-        selected_users = set(form.getlist("users_selected"))
+        group_id = uuid.UUID(nh3.clean(str(group_id)))
+        selected_users = {
+            uuid.UUID(nh3.clean(str(user_id)))
+            for user_id in form.getlist("users_selected")
+        }
+        all_users = {
+            uuid.UUID(nh3.clean(str(user_id))) for user_id in form.getlist("all_users")
+        }
         # all_status = set(form.getlist("status")) #
 
         # Removing the users already selected from the list of all users
         non_selected_users = all_users - selected_users
-        db_data = []
-        for user_id in form.getlist("users_selected"):
-            group_user_link = GroupUserLinkCreate(
-                group_id=uuid.UUID(nh3.clean(str(group_id))),
-                user_id=uuid.UUID(nh3.clean(str(user_id))),
-            )
-            group_id = group_user_link.group_id
-            user_id = group_user_link.user_id
-            #
-            existing_record = await db.scalar(
-                select(UserGroupLinkModelDB).filter_by(
-                    group_id=group_id, user_id=user_id
+
+        # Loading the current links once and reconciling them in memory
+        current_users = set(
+            await db.scalars(
+                select(UserGroupLinkModelDB.user_id).where(
+                    UserGroupLinkModelDB.group_id == group_id
                 )
             )
-            if existing_record:
-                print(f"Record with {user_id} already exists")
-            else:
-                db_data.append(
-                    group_user_link.model_dump(exclude={"id"}, exclude_unset=True)
+        )
+        users_to_add = selected_users - current_users
+        users_to_remove = non_selected_users & current_users
+
+        # One INSERT and one DELETE, committed as a single transaction
+        if users_to_add:
+            db_data = [
+                GroupUserLinkCreate(group_id=group_id, user_id=user_id).model_dump(
+                    exclude={"id"}, exclude_unset=True
                 )
-        for user_id in non_selected_users:
-            group_user_link = GroupUserLinkCreate(
-                group_id=uuid.UUID(nh3.clean(str(group_id))),
-                user_id=uuid.UUID(nh3.clean(str(user_id))),
-            )
-            group_id = group_user_link.group_id
-            user_id = group_user_link.user_id
-            existing_record = await db.scalar(
-                select(UserGroupLinkModelDB).filter_by(
-                    group_id=group_id, user_id=user_id
+                for user_id in users_to_add
+            ]
+            await db.execute(insert(UserGroupLinkModelDB).values(db_data))
+        if users_to_remove:
+            await db.execute(
+                delete(UserGroupLinkModelDB).where(
+                    UserGroupLinkModelDB.group_id == group_id,
+                    UserGroupLinkModelDB.user_id.in_(users_to_remove),
                 )
             )
-            if existing_record:
-                await db.delete(existing_record)
-                await db.commit()
-
-        if len(db_data) > 0:
-            db.add_all([UserGroupLinkModelDB(**link) for link in db_data])
+        if users_to_add or users_to_remove:
             await db.commit()
 
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
@@ -476,6 +541,8 @@ async def post_group_user_link(
 
         return response
     except Exception as e:
+        # Discarding the partially applied reconciliation
+        await db.rollback()
         group = await group_crud.read_by_primary_key(db, group_id)
         csrf_token = request.headers.get("X-CSRF-Token")
         return handle_error(
@@ -497,7 +564,7 @@ async def post_user_status(
     # group_id: uuid.UUID,
     db: CurrentAsyncSession, #
     current_user: UserModelDB = Depends(current_active_user), #
-    csrf_protect: CsrfProtect = Depends(), #
+    csrf_protect: SessionCsrfProtect = Depends(), #
     ):
     form = await request.form()
 
@@ -1,8 +1,9 @@
 from fastapi import Depends, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.routing import APIRouter
-from fastapi_csrf_protect import CsrfProtect
+from sqlalchemy.orm import joinedload, selectinload
 
+from app.core.csrf import SessionCsrfProtect
 from app.database.security import current_active_user, verify_jwt
 from app.models.users import User as UserModelDB
 from app.templates import templates
@@ -10,7 +11,10 @@ from app.templates import templates
 #
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.models.groups import Group as GroupModelDB
-from app.database.db import CurrentAsyncSession
+from app.models.groups import UserGroupLink as UserGroupLinkModelDB
+from app.routes.view.caching import changes, page_validator
+from app.routes.view.group import USER_PROFILE_BATCH
+from app.database.db import CurrentReadAsyncSession
 from app.models.users import Role as UserRoleModelDB
 from app.models.users import UserProfile as UserProfileModelDB
 
@@ -20,11 +24,14 @@ login_view_route = APIRouter()
 #
 # group_view_route = APIRouter()
 group_crud = SQLAlchemyCRUD[GroupModelDB](
-    GroupModelDB, related_models={UserModelDB: "users"}
+    GroupModelDB, related_models={UserModelDB: ("users", selectinload)}
 )
 user_crud = SQLAlchemyCRUD[UserModelDB](
     UserModelDB,
-    related_models={UserProfileModelDB: "profile", UserRoleModelDB: "role"},
+    related_models={
+        UserProfileModelDB: ("profile", joinedload),
+        UserRoleModelDB: ("role", joinedload),
+    },
 )
 
 
@@ -32,13 +39,28 @@ user_crud = SQLAlchemyCRUD[UserModelDB](
 @login_view_route.get("/dashboard", response_class=HTMLResponse)
 async def get_dashboard(
     request: Request,
-    db: CurrentAsyncSession, #
+    db: CurrentReadAsyncSession,
     user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
-
-    groups = await group_crud.read_all(db, join_relationships=True)
+    validator = await page_validator(
+        db,
+        request,
+        user,
+        csrf_token,
+        changes(GroupModelDB),
+        changes(UserGroupLinkModelDB),
+    )
+    if validator.matches(request):
+        return validator.not_modified()
+
+    groups = await group_crud.read_all(
+        db,
+        join_relationships=True,
+        # The fields rendered by pages/dashboard.html
+        columns=["group_name", "group_desc", "users.id"],
+    )
 
     # Access the cookies using the Request object
     cookies = request.cookies
@@ -53,18 +75,21 @@ async def get_dashboard(
             "csrf_token": csrf_token,
             "user_type": user.is_superuser,
             "groups": groups, #
+            "user_ids": [member.id for group in groups for member in group.users],
+            "user_profile_batch": USER_PROFILE_BATCH,
         },
+        block="dashboard_body",
     )
     csrf_protect.set_csrf_cookie(signed_token, response)
-    return response
+    return validator.apply(response)
 
 
 @login_view_route.get("/")
-async def get_index(request: Request, csrf_protect: CsrfProtect = Depends()):
+async def get_index(request: Request, csrf_protect: SessionCsrfProtect = Depends()):
     cookies = request.cookies
     cookie_value = cookies.get("fastapiusersauth")
     if cookie_value is not None:
-        if await verify_jwt(cookie_value):
+        if verify_jwt(cookie_value):
             return RedirectResponse("/dashboard", status_code=302)
         else:
             return RedirectResponse("/login", status_code=302)
@@ -80,7 +105,7 @@ async def get_index(request: Request, csrf_protect: CsrfProtect = Depends()):
 )
 async def get_login(
     request: Request,
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     current_page = request.url.path.split("/")[-1]
     csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
@@ -6,12 +6,13 @@ import nh3
 from fastapi import Depends, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
-from fastapi_csrf_protect import CsrfProtect
 
+from app.core.csrf import SessionCsrfProtect
 from app.database.db import CurrentAsyncSession
 from app.database.security import current_active_user
 from app.models.users import Role as RoleModelDB
 from app.models.users import User as UserModelDB
+from app.routes.view.caching import changes, page_validator
 from app.routes.view.errors import handle_error
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.schema.users import RoleCreate
@@ -31,16 +32,24 @@ async def get_role(
     current_user: UserModelDB = Depends(current_active_user),
     skip: int = 0,
     limit: int = 100,
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         if not current_user.is_superuser:
             raise HTTPException(
                 status_code=403, detail="Not authorized to view this page"
             )
-        # Access the cookies using the Request object
-        roles = await role_crud.read_all(db, skip, limit)
         csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
+        validator = await page_validator(
+            db, request, current_user, csrf_token, changes(RoleModelDB)
+        )
+        if validator.matches(request):
+            return validator.not_modified()
+
+        # Access the cookies using the Request object
+        roles = await role_crud.read_all(
+            db, skip, limit, columns=["role_name", "role_desc"]
+        )
         response = templates.TemplateResponse(
             "pages/role.html",
             {
@@ -49,13 +58,17 @@ async def get_role(
                 "user_type": current_user.is_superuser,
                 "csrf_token": csrf_token,
             },
+            block="dashboard_body",
         )
         csrf_protect.set_csrf_cookie(signed_token, response)
-        return response
+        return validator.apply(response)
     except Exception as e:
         csrf_token = request.headers.get("X-CSRF-Token")
         return handle_error(
-            "pages/role.html", {"request": request, "csrf_token": csrf_token}, e
+            "pages/role.html",
+            {"request": request, "csrf_token": csrf_token},
+            e,
+            block="dashboard_body",
         )
 
 
@@ -64,7 +77,7 @@ async def get_role(
 async def get_create_roles(
     request: Request,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     # checking the current user as super user
     try:
@@ -80,6 +93,7 @@ async def get_create_roles(
                 "csrf_token": csrf_token,
                 "user_type": current_user.is_superuser,
             },
+            block="role_page",
         )
 
         return response
@@ -93,6 +107,7 @@ async def get_create_roles(
                 "user_type": current_user.is_superuser,
             },
             e,
+            block="role_page",
         )
 
 
@@ -103,7 +118,7 @@ async def post_create_roles(
     response: Response,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
 
@@ -173,7 +188,7 @@ async def get_role_by_id(
     role_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    # csrf_protect: CsrfProtect = Depends(),
+    # csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         # checking the current user as super user
@@ -191,6 +206,7 @@ async def get_role_by_id(
                 "csrf_token": csrf_token,
                 "user_type": current_user.is_superuser,
             },
+            block="role_page",
         )
 
         return response
@@ -204,6 +220,7 @@ async def get_role_by_id(
                 "user_type": current_user.is_superuser,
             },
             e,
+            block="role_page",
         )
 
 
@@ -215,7 +232,7 @@ async def post_update_role(
     role_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         await csrf_protect.validate_csrf(request)
@@ -273,7 +290,7 @@ async def delete_role(
     role_id: uuid.UUID,
     db: CurrentAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         await csrf_protect.validate_csrf(request)
@@ -0,0 +1,45 @@
+# importing the required modules
+import os
+
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import HTMLResponse
+from fastapi.routing import APIRouter
+
+from app.database.db import CurrentReadAsyncSession
+from app.database.search import search
+from app.database.security import current_active_user
+from app.models.users import User as UserModelDB
+from app.routes.view.errors import handle_error
+from app.templates import templates
+
+# Create an APIRouter
+search_view_route = APIRouter()
+
+# Seconds a search may take before the database ends it, as the box searches while
+# the user types
+SEARCH_TIMEOUT_SECONDS = float(os.environ.get("SEARCH_TIMEOUT_SECONDS", "0.5"))
+SEARCH_RESULTS_LIMIT = 20
+
+
+# Defining a route returning the ranked results of the search box
+@search_view_route.get("/search", response_class=HTMLResponse)
+async def get_search(
+    request: Request,
+    db: CurrentReadAsyncSession,
+    q: str = "",
+    current_user: UserModelDB = Depends(current_active_user),
+):
+    try:
+        if not current_user.is_superuser:
+            raise HTTPException(
+                status_code=403, detail="Вы не авторизованы для этой страницы"
+            )
+        hits = await search(db, q, SEARCH_RESULTS_LIMIT, SEARCH_TIMEOUT_SECONDS)
+        return templates.TemplateResponse(
+            "partials/search/results.html",
+            {"request": request, "hits": hits, "query": q},
+        )
+    except Exception as e:
+        return handle_error(
+            "partials/search/results.html", {"request": request, "query": q}, e
+        )
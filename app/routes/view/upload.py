@@ -1,5 +1,6 @@
 import json
 import uuid
+from typing import Optional
 from urllib.parse import parse_qs, unquote_plus
 
 import nh3
@@ -8,14 +9,19 @@ from fastapi.responses import HTMLResponse, StreamingResponse
 from fastapi.routing import APIRouter
 
 from app.core.minio_core import minio
-from app.database.db import CurrentAsyncSession
+from app.database.db import (
+    CurrentAsyncSession,
+    CurrentReadAsyncSession,
+    read_session_maker,
+)
 from app.database.security import current_active_user
 from app.models.upload import Upload as UploadsModelDB
 from app.models.users import User as UserModelDB
+from app.routes.view.caching import changes, page_validator
 from app.routes.view.errors import handle_error
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.schema.uploads import FileCreate
-from app.templates import templates
+from app.templates import TEMPLATE_STREAM_ROWS, templates
 
 upload_crud = SQLAlchemyCRUD[UploadsModelDB](UploadsModelDB)
 upload_view_route = APIRouter()
@@ -37,6 +43,7 @@ async def get_upload_file(
                 "current_user": current_user,
                 "user_type": current_user.is_superuser,
             },
+            block="dashboard_body",
         )
     except Exception as e:
         return await handle_error(
@@ -47,6 +54,7 @@ async def get_upload_file(
                 "current_user": current_user,
             },
             e,
+            block="dashboard_body",
         )
 
 
@@ -106,29 +114,55 @@ async def post_upload_file(
 @upload_view_route.get("/get_uploaded_files", response_class=HTMLResponse)
 async def get_uploaded_files(
     request: Request,
-    db: CurrentAsyncSession,
+    db: CurrentReadAsyncSession,
     current_user: UserModelDB = Depends(current_active_user),
-    skip: int = 0,
+    cursor: Optional[str] = None,
     limit: int = 100,
 ):
     if not current_user.is_superuser:
         raise HTTPException(status_code=403, detail="Not authorized to view files")
     try:
-        files = await upload_crud.read_by_column(
-            db, "user_id", current_user.id, skip, limit
+        # Refreshed by refreshUploadTable after every upload and deletion, the table
+        # is only sent again when it changed
+        validator = await page_validator(
+            db,
+            request,
+            current_user,
+            None,
+            changes(UploadsModelDB, UploadsModelDB.user_id == current_user.id),
         )
-        # Check if files is iterable
-        if not hasattr(files, "__iter__"):
-            files = [files]
-        return templates.TemplateResponse(
+        if validator.matches(request):
+            return validator.not_modified()
+
+        columns = ["name", "unique_name", "updated"]
+        if limit >= TEMPLATE_STREAM_ROWS:
+            # Rendered as the rows are read from a cursor, none is kept in memory
+            page = upload_crud.stream_page_by_column(
+                read_session_maker(request),
+                "user_id",
+                current_user.id,
+                cursor,
+                limit,
+                columns=columns,
+            )
+            template_response = templates.TemplateStreamResponse
+        else:
+            page = await upload_crud.read_page_by_column(
+                db, "user_id", current_user.id, cursor, limit, columns=columns
+            )
+            template_response = templates.TemplateResponse
+        response = template_response(
             "partials/upload/files_table.html",
             {
                 "request": request,
-                "files": files,
+                "files": page.items,
+                "page": page,
+                "limit": limit,
                 "current_user": current_user,
                 "user_type": current_user.is_superuser,
             },
         )
+        return validator.apply(response)
     except Exception as e:
         return handle_error(
             "partials/upload/files_table.html",
@@ -2,31 +2,46 @@
 import json
 import uuid
 from datetime import datetime
+from typing import Optional
 
 import nh3
 from fastapi import Depends, HTTPException, Request, Response
 from fastapi.responses import HTMLResponse
 from fastapi.routing import APIRouter
-from fastapi_csrf_protect import CsrfProtect
-
-from app.database.db import CurrentAsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.core.csrf import SessionCsrfProtect
+from app.database.db import (
+    CurrentAsyncSession,
+    CurrentReadAsyncSession,
+    CurrentUnitOfWork,
+    read_session_maker,
+)
+from app.database.pagination import COUNT_ESTIMATED
 from app.database.security import current_active_user
 from app.models.users import Role as RoleModelDB
 from app.models.users import User as UserModelDB
 from app.models.users import UserProfile as UserProfileModelDB
+from app.routes.view.caching import changes, page_validator
 from app.routes.view.errors import handle_error
 from app.routes.view.view_crud import SQLAlchemyCRUD
 from app.schema.users import ProfileUpdate
 
 # from app.schema.users import RoleCreate
-from app.templates import templates
+from app.templates import TEMPLATE_STREAM_ROWS, templates
 
 # Create an APIRouter
 user_view_route = APIRouter()
 
 
 user_crud = SQLAlchemyCRUD[UserModelDB](
-    UserModelDB, related_models={RoleModelDB: "role", UserProfileModelDB: "profile"}
+    UserModelDB,
+    related_models={
+        RoleModelDB: ("role", joinedload),
+        UserProfileModelDB: ("profile", joinedload),
+    },
+    # The pager of the largest table shows the planner estimate on PostgreSQL
+    total_count=COUNT_ESTIMATED,
 )
 user_profile_crud = SQLAlchemyCRUD[UserProfileModelDB](UserProfileModelDB)
 
@@ -36,11 +51,11 @@ role_crud = SQLAlchemyCRUD[RoleModelDB](RoleModelDB)
 @user_view_route.get("/user", response_class=HTMLResponse)
 async def get_users(
     request: Request,
-    db: CurrentAsyncSession,
-    skip: int = 0,
+    db: CurrentReadAsyncSession,
+    cursor: Optional[str] = None,
     limit: int = 100,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
     try:
         if not current_user.is_superuser:
@@ -48,26 +63,70 @@ async def get_users(
                 status_code=403, detail="Вы не авторизованы для этой страницы"
             )
 
+        csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
+        validator = await page_validator(
+            db,
+            request,
+            current_user,
+            csrf_token,
+            changes(UserModelDB),
+            changes(RoleModelDB),
+            changes(UserProfileModelDB),
+        )
+        if validator.matches(request):
+            return validator.not_modified()
+
         # Access the cookies using the Request object
         token = request.cookies.get("fastapiusersauth")
-        users = await user_crud.read_all(db, skip, limit, join_relationships=True)
-
-        csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
+        # The fields rendered by pages/user.html
+        columns = [
+            "email",
+            "is_active",
+            "is_superuser",
+            "role.role_name",
+            "profile.first_name",
+            "profile.last_name",
+            "profile.phone",
+            "profile.date_of_birth",
+            "profile.company",
+            # The versions of the cached rows
+            "updated",
+            "role.updated",
+            "profile.updated",
+        ]
+        if limit >= TEMPLATE_STREAM_ROWS:
+            # Rendered as the rows are read from a cursor, none is kept in memory
+            page = user_crud.stream_page(
+                read_session_maker(request),
+                cursor,
+                limit,
+                join_relationships=True,
+                columns=columns,
+            )
+            template_response = templates.TemplateStreamResponse
+        else:
+            page = await user_crud.read_page(
+                db, cursor, limit, join_relationships=True, columns=columns
+            )
+            template_response = templates.TemplateResponse
 
-        response = templates.TemplateResponse(
+        response = template_response(
             "pages/user.html",
             {
                 "request": request,
-                "users": users,
+                "users": page.items,
+                "page": page,
+                "limit": limit,
                 "token": token,
                 "csrf_token": csrf_token,
                 "user_type": current_user.is_superuser,
             },
+            block="dashboard_body",
         )
 
         csrf_protect.set_csrf_cookie(signed_token, response)
 
-        return response
+        return validator.apply(response)
     except Exception as e:
         token = request.cookies.get("fastapiusersauth")
         csrf_token = request.headers.get("X-CSRF-Token")
@@ -80,6 +139,7 @@ async def get_users(
                 "user_type": current_user.is_superuser,
             },
             e,
+            block="dashboard_body",
         )
 
 
@@ -96,9 +156,12 @@ async def get_create_users(
         return templates.TemplateResponse(
             "partials/user/add_user.html",
             {"request": request},
+            block="user_page",
         )
     except Exception as e:
-        return handle_error("partials/user/add_user.html", {"request": request}, e)
+        return handle_error(
+            "partials/user/add_user.html", {"request": request}, e, block="user_page"
+        )
 
 
 # Defining end point to get the record based on the id
@@ -112,7 +175,7 @@ async def get_user_by_id(
     limit: int = 100,
 ):
     try:
-        roles = await role_crud.read_all(db, skip, limit)
+        roles = await role_crud.read_all(db, skip, limit, columns=["role_name"])
         # checking the current user as super user
         if not current_user.is_superuser:
             raise HTTPException(
@@ -131,6 +194,7 @@ async def get_user_by_id(
                 "user_type": current_user.is_superuser,
                 "csrf_token": csrf_token,
             },
+            block="user_page",
         )
     except Exception as e:
         csrf_token = request.headers.get("X-CSRF-Token")
@@ -144,6 +208,7 @@ async def get_user_by_id(
                 "csrf_token": csrf_token,
             },
             e,
+            block="user_page",
         )
 
 
@@ -153,9 +218,10 @@ async def post_update_user(
     request: Request,
     # response: Response,
     user_id: uuid.UUID,
-    db: CurrentAsyncSession,
+    # The profile and the user are saved in a single commit
+    db: CurrentUnitOfWork,
     current_user: UserModelDB = Depends(current_active_user),
-    csrf_protect: CsrfProtect = Depends(),
+    csrf_protect: SessionCsrfProtect = Depends(),
 ):
 
     try:
@@ -197,12 +263,10 @@ async def post_update_user(
             # Create UserProfile
             new_profile = await user_profile_crud.create(dict(profile_data), db)
 
-            # Update user profile id
-            await user_crud.update(db, user_id, {"profile_id": new_profile.id})
-
-            # Update user role
-            if role_id:
-                await user_crud.update(db, user_id, {"role_id": role_id})
+            # Update user profile id and role
+            await user_crud.update(
+                db, user_id, {"profile_id": new_profile.id, "role_id": role_id}
+            )
 
             csrf_token, signed_token = csrf_protect.generate_csrf_tokens()
             headers = {
@@ -258,6 +322,8 @@ async def post_update_user(
 
             return response
     except Exception as e:
+        # Discarding the flushed part of the update before rendering the form again
+        await db.rollback()
         user = await user_crud.read_by_primary_key(db, user_id, join_relationships=True)
         roles = await role_crud.read_all(db)
         csrf_token = request.headers.get("X-CSRF-Token")
@@ -1,30 +1,137 @@
 import uuid
-from typing import Any, Dict, Generic, List, Optional, Type, TypeVar, Union
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generic,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
 
 from fastapi import HTTPException
-from sqlalchemy import func, inspect, select
-from sqlalchemy.orm import joinedload
+from sqlalchemy import (
+    Select,
+    delete,
+    event,
+    func,
+    insert,
+    inspect,
+    select,
+    text,
+    tuple_,
+    update,
+)
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from sqlalchemy.orm import (
+    MANYTOONE,
+    InstrumentedAttribute,
+    ORMExecuteState,
+    Session,
+    aliased,
+    joinedload,
+    load_only,
+    selectinload,
+)
+from sqlalchemy.orm.interfaces import LoaderOption
 
-from app.database.base import Base
-from app.database.db import CurrentAsyncSession
+from app.core.cache import TTLCache
+from app.database.base import Base, has_no_dependents
+from app.database.db import CurrentAsyncSession, in_unit_of_work
+from app.database.pagination import (
+    COUNT_CACHED,
+    COUNT_ESTIMATED,
+    COUNT_WINDOW,
+    KEYSET_COLUMNS,
+    Page,
+    StreamedPage,
+    apply_keyset,
+    build_page,
+)
+from app.models.base import utcnow
 
 ModelType = TypeVar("ModelType", bound=Base)
 
+# Cached totals of the paginated reads, shared by all the CRUD instances of a table
+_total_counts: Dict[str, TTLCache[int]] = {}
+
+
+# The totals of a table are dropped when rows are inserted into it or deleted from it,
+# by the session or by any ORM statement, including the ones run outside of the CRUD,
+# and again once the change is committed, as a request counting in between may have
+# cached the old total.
+def _forget_counts(session: Session, tables: Iterable[str]):
+    changed = session.info.setdefault("changed_counts", set())
+    for table_name in tables:
+        counts = _total_counts.get(table_name)
+        if counts is not None:
+            counts.clear()
+        changed.add(table_name)
+
+
+@event.listens_for(Session, "after_flush")
+def _forget_flushed_counts(session: Session, flush_context):
+    _forget_counts(
+        session,
+        {instance.__table__.name for instance in (*session.new, *session.deleted)},
+    )
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _forget_bulk_counts(orm_execute_state: ORMExecuteState):
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and (
+        orm_execute_state.is_insert or orm_execute_state.is_delete
+    ):
+        _forget_counts(orm_execute_state.session, [mapper.local_table.name])
+
+
+@event.listens_for(Session, "after_commit")
+def _forget_committed_counts(session: Session):
+    for table_name in session.info.pop("changed_counts", ()):
+        counts = _total_counts.get(table_name)
+        if counts is not None:
+            counts.clear()
+
+
+# A loader option factory such as selectinload, joinedload or raiseload
+LoaderStrategy = Callable[..., LoaderOption]
+RelatedModel = Union[str, Tuple[str, LoaderStrategy]]
+
 
 class SQLAlchemyCRUD(Generic[ModelType]):
     def __init__(
         self,
         db_model: Type[ModelType],
-        related_models: Optional[Dict[Type[Base], str]] = None,
+        related_models: Optional[Dict[Type[Base], RelatedModel]] = None,
+        keyset_columns: Sequence[str] = KEYSET_COLUMNS,
+        total_count: Optional[str] = None,
+        count_ttl: float = 30.0,
     ):
         self.db_model = db_model
         self.related_models = related_models if related_models is not None else {}
+        # Ordered, indexed columns used to seek pages in the cursor based read methods
+        self.keyset_columns = tuple(keyset_columns)
+        # How the cursor based read methods count the total, see `_read_keyset_page`
+        if total_count not in (None, COUNT_WINDOW, COUNT_CACHED, COUNT_ESTIMATED):
+            raise ValueError(f"Unknown total count strategy {total_count}")
+        self.total_count = total_count
+        self._counts = _total_counts.setdefault(
+            db_model.__tablename__, TTLCache[int](maxsize=256, ttl=count_ttl)
+        )
 
     async def create(self, data: dict[str, Any], db: CurrentAsyncSession) -> ModelType:
         new_record = self.db_model(**data)
         db.add(new_record)
-        await db.commit()
-        await db.refresh(new_record)
+        await self._commit(db)
+        if not in_unit_of_work(db):
+            await db.refresh(new_record)
         return new_record
 
     async def read_all(
@@ -33,19 +140,19 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         skip: int = 0,
         limit: int = 0,
         join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
     ) -> List[ModelType]:
+        """
+        Reads the records, with their related models when `join_relationships` is set.
 
-        stmt = select(self.db_model)
-        if join_relationships:
-            for related_model, join_column in self.related_models.items():
-                relationship = getattr(self.db_model, join_column, None)
-
-                if relationship is not None:
-                    stmt = stmt.options(joinedload(relationship))
-
-                else:
-                    # Handle error or invalid relationship specification
-                    raise ValueError(f"No relationship found for {join_column}")
+        `columns` restricts the loaded attributes to the given ones, e.g.
+        `["group_name", "users.email"]`, dotted names applying to the related models.
+        The primary, keyset and foreign key columns needed by the loaders are always
+        loaded; accessing any other attribute raises instead of lazy loading it.
+        """
+        stmt = select(self.db_model).options(
+            *self._loader_options(self.db_model, join_relationships, columns)
+        )
         stmt = stmt.offset(skip)
         if limit:
             stmt = stmt.limit(limit)
@@ -61,14 +168,7 @@ class SQLAlchemyCRUD(Generic[ModelType]):
 
         stmt = select(self.db_model)
         if join_relationships:
-            for related_model, join_column in self.related_models.items():
-                relationship = getattr(self.db_model, join_column, None)
-                # print(relationship)
-                if relationship is not None:
-                    stmt = stmt.options(joinedload(relationship))
-                else:
-                    # Handle error or invalid relationship specification
-                    raise ValueError(f"No relationship found for {join_column}")
+            stmt = stmt.options(*self._relationship_loaders())
         stmt = stmt.where(self.db_model.id == id)
         query = await db.execute(stmt)
         record = query.scalar()
@@ -76,6 +176,93 @@ class SQLAlchemyCRUD(Generic[ModelType]):
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
         return record
 
+    async def read_many_by_primary_key(
+        self,
+        db: CurrentAsyncSession,
+        ids: Sequence[uuid.UUID],
+        join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> List[ModelType]:
+        """
+        Reads the records with the given ids in one SELECT ... WHERE id IN, skipping the
+        missing ones. See `read_all` for `columns`.
+        """
+        if not ids:
+            return []
+        stmt = (
+            select(self.db_model)
+            .where(self.db_model.id.in_(ids))
+            .options(*self._loader_options(self.db_model, join_relationships, columns))
+        )
+        query = await db.execute(stmt)
+        return list(query.unique().scalars().all())
+
+    async def read_page(
+        self,
+        db: CurrentAsyncSession,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Page[ModelType]:
+        """
+        Reads one page of records ordered by `keyset_columns`, seeking past the cursor
+        instead of using OFFSET, so every page costs the same regardless of its depth.
+        See `read_all` for `columns`.
+        """
+        return await self._read_keyset_page(
+            db, [], cursor, limit, join_relationships, columns
+        )
+
+    async def read_page_by_column(
+        self,
+        db: CurrentAsyncSession,
+        column_name: str,
+        column_value: Any,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Page[ModelType]:
+        """Cursor based counterpart of `read_by_column`, see `read_page`."""
+        criteria = [self._column_filter(column_name, column_value)]
+        return await self._read_keyset_page(
+            db, criteria, cursor, limit, columns=columns
+        )
+
+    def stream_page(
+        self,
+        session_maker: async_sessionmaker,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> StreamedPage[ModelType]:
+        """
+        The page `read_page` reads, read from a server side cursor with a session of
+        `session_maker` as it is iterated. See `StreamedPage`.
+        """
+        return self._stream_keyset_page(
+            session_maker, [], cursor, limit, join_relationships, columns
+        )
+
+    def stream_page_by_column(
+        self,
+        session_maker: async_sessionmaker,
+        column_name: str,
+        column_value: Any,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        columns: Optional[Sequence[str]] = None,
+    ) -> StreamedPage[ModelType]:
+        """The page `read_page_by_column` reads, streamed as in `stream_page`."""
+        return self._stream_keyset_page(
+            session_maker,
+            [self._column_filter(column_name, column_value)],
+            cursor,
+            limit,
+            columns=columns,
+        )
+
     async def read_by_column(
         self,
         db: CurrentAsyncSession,
@@ -83,16 +270,14 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         column_value: Any,
         skip: int = 0,
         limit: int = 0,
+        columns: Optional[Sequence[str]] = None,
     ) -> Union[Optional[ModelType], List[ModelType]]:
 
-        column = getattr(self.db_model, column_name)
-
-        if isinstance(column_value, str):
-            stmt = select(self.db_model).where(
-                func.lower(column) == column_value.lower()
-            )
-        else:
-            stmt = select(self.db_model).where(column == column_value)
+        stmt = (
+            select(self.db_model)
+            .where(self._column_filter(column_name, column_value))
+            .options(*self._loader_options(self.db_model, False, columns))
+        )
         if skip > 0:
             stmt = stmt.offset(skip)
         if limit > 0:
@@ -107,21 +292,260 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         else:
             return records
 
+    def _relationship_loaders(
+        self, entity: Any = None, columns: Optional[Sequence[str]] = None
+    ) -> List[LoaderOption]:
+        """
+        Builds the loader options of the related models.
+
+        Each related model maps to a relationship name, optionally paired with the
+        loader strategy to use, e.g. `("users", selectinload)`. Without one, collections
+        are loaded with selectinload, so LIMIT applies to the parent rows and no join
+        multiplies them, and many-to-one relationships with a single joinedload.
+        The options apply to `entity` when given, e.g. an alias of the model, and load
+        only the dotted `columns` of each related model when given.
+        """
+        entity = self.db_model if entity is None else entity
+        loaders = []
+        for related_model, related in self.related_models.items():
+            join_column, strategy = (
+                related if isinstance(related, tuple) else (related, None)
+            )
+            relationship = getattr(entity, join_column, None)
+            if relationship is None:
+                # Handle error or invalid relationship specification
+                raise ValueError(f"No relationship found for {join_column}")
+            if strategy is None:
+                strategy = selectinload if relationship.property.uselist else joinedload
+            loader = strategy(relationship)
+            related_columns = [
+                name.split(".", 1)[1]
+                for name in columns or ()
+                if name.split(".", 1)[0] == join_column
+            ]
+            if related_columns:
+                related_class = relationship.property.mapper.class_
+                loader = loader.load_only(
+                    *[getattr(related_class, name) for name in related_columns],
+                    raiseload=True,
+                )
+            loaders.append(loader)
+        return loaders
+
+    def _loader_options(
+        self,
+        entity: Any,
+        join_relationships: bool,
+        columns: Optional[Sequence[str]],
+    ) -> List[LoaderOption]:
+        """Builds the relationship loaders and the `columns` projection of a read."""
+        options = []
+        if join_relationships:
+            options.extend(self._relationship_loaders(entity, columns))
+        if columns is None:
+            return options
+
+        mapper = inspect(self.db_model)
+        joined = {
+            related[0] if isinstance(related, tuple) else related
+            for related in self.related_models.values()
+        }
+        own_columns = list(self.keyset_columns)
+        for name in columns:
+            join_column = name.rpartition(".")[0]
+            if not join_column:
+                own_columns.append(name)
+            elif join_column not in joined:
+                raise ValueError(f"No related model declared for {name}")
+        if join_relationships:
+            # The foreign keys many-to-one relationships are loaded by
+            for join_column in joined:
+                relationship = mapper.relationships[join_column]
+                if relationship.direction is MANYTOONE:
+                    own_columns.extend(
+                        mapper.get_property_by_column(column).key
+                        for column in relationship.local_columns
+                    )
+        options.append(
+            load_only(
+                *[getattr(entity, name) for name in dict.fromkeys(own_columns)],
+                raiseload=True,
+            )
+        )
+        return options
+
+    async def _commit(self, db: CurrentAsyncSession):
+        # In a unit of work the changes are only flushed, its owner commits them once
+        if in_unit_of_work(db):
+            await db.flush()
+        else:
+            await db.commit()
+
+    def _column_filter(self, column_name: str, column_value: Any):
+        column = getattr(self.db_model, column_name)
+        if isinstance(column_value, str):
+            return func.lower(column) == column_value.lower()
+        return column == column_value
+
+    async def _read_keyset_page(
+        self,
+        db: CurrentAsyncSession,
+        criteria: List[Any],
+        cursor: Optional[str],
+        limit: int,
+        join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> Page[ModelType]:
+        """
+        Reads a keyset page of the records matching `criteria`, counting their total
+        according to `total_count`:
+
+        - "window": exact, COUNT(*) OVER () evaluated before the seek predicate, in the
+          same round trip. The database still visits every matching row.
+        - "cached": exact COUNT(*) cached per criteria for `count_ttl` seconds, cleared
+          when rows are inserted into or deleted from the table.
+        - "estimated": the planner statistics of the table on PostgreSQL when reading
+          all records, "cached" otherwise.
+        - None: no total.
+        """
+        stmt, direction, _ = self._keyset_statement(
+            criteria, cursor, limit, join_relationships, columns
+        )
+        query = await db.execute(stmt)
+        # unique(): to avoid duplicate rows in case of join operations.
+        rows = query.unique().all()
+        page = build_page(
+            [row[0] for row in rows],
+            self.keyset_columns,
+            limit,
+            direction,
+            has_cursor=bool(cursor),
+        )
+        if self.total_count == COUNT_WINDOW and rows:
+            page.total = rows[0].total
+        elif self.total_count is not None:
+            page.total = await self._count(db, criteria)
+        return page
+
+    def _stream_keyset_page(
+        self,
+        session_maker: async_sessionmaker,
+        criteria: List[Any],
+        cursor: Optional[str],
+        limit: int,
+        join_relationships: bool = False,
+        columns: Optional[Sequence[str]] = None,
+    ) -> StreamedPage[ModelType]:
+        """The streamed counterpart of `_read_keyset_page`."""
+        stmt, direction, key_columns = self._keyset_statement(
+            criteria, cursor, limit, join_relationships, columns
+        )
+
+        async def count(session: AsyncSession) -> int:
+            return await self._count(session, criteria)
+
+        return StreamedPage(
+            session_maker,
+            stmt,
+            key_columns,
+            self.keyset_columns,
+            limit,
+            direction,
+            has_cursor=bool(cursor),
+            window_total=self.total_count == COUNT_WINDOW,
+            count=count if self.total_count is not None else None,
+        )
+
+    def _keyset_statement(
+        self,
+        criteria: List[Any],
+        cursor: Optional[str],
+        limit: int,
+        join_relationships: bool,
+        columns: Optional[Sequence[str]],
+    ) -> Tuple[Select, str, List[InstrumentedAttribute]]:
+        """
+        The statement of a keyset page of the records matching `criteria`, its
+        direction and its key columns. With the "window" total count the rows carry
+        the total.
+        """
+        if self.total_count == COUNT_WINDOW:
+            counted = (
+                select(self.db_model, func.count().over().label("total"))
+                .where(*criteria)
+                .subquery()
+            )
+            entity = aliased(self.db_model, counted)
+            stmt = select(entity, counted.c.total)
+        else:
+            entity = self.db_model
+            stmt = select(entity).where(*criteria)
+        stmt = stmt.options(*self._loader_options(entity, join_relationships, columns))
+
+        key_columns = [getattr(entity, name) for name in self.keyset_columns]
+        stmt, direction = apply_keyset(stmt, key_columns, cursor, limit)
+        return stmt, direction, key_columns
+
+    async def _count(self, db: CurrentAsyncSession, criteria: List[Any]) -> int:
+        if self.total_count == COUNT_ESTIMATED and not criteria:
+            estimate = await self._estimated_count(db)
+            if estimate is not None:
+                return estimate
+
+        key = tuple(
+            (str(compiled), tuple(sorted(compiled.params.items())))
+            for compiled in (criterion.compile() for criterion in criteria)
+        )
+        total = self._counts.get(key)
+        if total is None:
+            total = await db.scalar(
+                select(func.count()).select_from(self.db_model).where(*criteria)
+            )
+            self._counts.set(key, total)
+        return total
+
+    async def _estimated_count(self, db: CurrentAsyncSession) -> Optional[int]:
+        if db.get_bind().dialect.name != "postgresql":
+            return None
+        estimate = await db.scalar(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"),
+            {"t": self.db_model.__table__.fullname},
+        )
+        # reltuples is -1 until the table is first vacuumed or analyzed
+        return estimate if estimate is not None and estimate >= 0 else None
+
     async def update(
         self, db: CurrentAsyncSession, id: uuid.UUID, data: dict[str, Any]
     ) -> ModelType | None:
 
+        # Fast path: a single UPDATE ... RETURNING instead of SELECT, UPDATE and refresh
+        if db.get_bind().dialect.update_returning:
+            stmt = (
+                update(self.db_model)
+                .where(self.db_model.id == id)
+                .values(**data)
+                .returning(self.db_model)
+                .execution_options(populate_existing=True)
+            )
+            db_item = (await db.scalars(stmt)).one_or_none()
+            if db_item is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await self._commit(db)
+            return db_item
+
         stmt = select(self.db_model).where(self.db_model.id == id)
         query = await db.execute(stmt)
-        if not query:
+        db_item = query.scalar_one_or_none()
+        if db_item is None:
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            for key, value in data.items():
-                setattr(db_item, key, value)
-            await db.commit()
+        for key, value in data.items():
+            setattr(db_item, key, value)
+        await self._commit(db)
+        if not in_unit_of_work(db):
             await db.refresh(db_item)
-            return db_item
+        return db_item
 
     async def delete(
         self,
@@ -129,16 +553,143 @@ class SQLAlchemyCRUD(Generic[ModelType]):
         id: uuid.UUID,
     ) -> bool:
 
+        # Fast path: a single DELETE ... RETURNING, only taken when the ORM has nothing
+        # to cascade, i.e. no collections or association rows to clean up
+        if db.get_bind().dialect.delete_returning and has_no_dependents(self.db_model):
+            stmt = (
+                delete(self.db_model)
+                .where(self.db_model.id == id)
+                .returning(self.db_model.id)
+            )
+            if (await db.execute(stmt)).scalar_one_or_none() is None:
+                raise HTTPException(
+                    status_code=404, detail=f"Record with {id} not found"
+                )
+            await self._commit(db)
+            return True
+
         stmt = select(self.db_model).where(self.db_model.id == id)
         query = await db.execute(stmt)
-        if not query:
+        db_item = query.scalar_one_or_none()
+        if db_item is None:
             raise HTTPException(status_code=404, detail=f"Record with {id} not found")
-        db_item = query.scalar_one()
-        if db_item:
-            await db.delete(db_item)
-            await db.commit()
-            return True
-        return False
+        await db.delete(db_item)
+        await self._commit(db)
+        return True
+
+    async def create_many(
+        self, data: List[dict[str, Any]], db: CurrentAsyncSession
+    ) -> List[ModelType]:
+        """Inserts all the records with a single INSERT ... VALUES and one commit."""
+        if not data:
+            return []
+        stmt = insert(self.db_model).values(data).returning(self.db_model)
+        query = await db.scalars(stmt)
+        records = list(query.all())
+        await self._commit(db)
+        return records
+
+    async def update_many(
+        self, db: CurrentAsyncSession, ids: Sequence[uuid.UUID], data: dict[str, Any]
+    ) -> int:
+        """Applies the same values to all the records with the given ids in one UPDATE."""
+        if not ids:
+            return 0
+        stmt = update(self.db_model).where(self.db_model.id.in_(ids)).values(**data)
+        result = await db.execute(stmt)
+        await self._commit(db)
+        return result.rowcount
+
+    async def delete_many(
+        self, db: CurrentAsyncSession, ids: Sequence[uuid.UUID]
+    ) -> int:
+        """
+        Deletes all the records with the given ids in one DELETE. Being a bulk statement,
+        ORM level cascades are not applied, only the ones declared on the foreign keys.
+        """
+        if not ids:
+            return 0
+        stmt = delete(self.db_model).where(self.db_model.id.in_(ids))
+        result = await db.execute(stmt)
+        await self._commit(db)
+        return result.rowcount
+
+    async def upsert_many(
+        self,
+        db: CurrentAsyncSession,
+        data: List[dict[str, Any]],
+        index_elements: Sequence[str] = ("id",),
+    ) -> List[ModelType]:
+        """
+        Inserts the records, updating the existing ones that conflict on `index_elements`,
+        with a single INSERT ... ON CONFLICT DO UPDATE on PostgreSQL and SQLite. The
+        other databases read the existing records first, see `_upsert_by_select`.
+        """
+        if not data:
+            return []
+        dialect = db.get_bind().dialect.name
+        if dialect == "postgresql":
+            stmt = postgresql.insert(self.db_model).values(data)
+        elif dialect == "sqlite":
+            stmt = sqlite.insert(self.db_model).values(data)
+        else:
+            return await self._upsert_by_select(db, data, index_elements)
+
+        update_columns = {
+            column: stmt.excluded[column]
+            for column in data[0]
+            if column not in index_elements
+        }
+        # onupdate defaults are not applied by ON CONFLICT DO UPDATE
+        if "updated" in inspect(self.db_model).columns:
+            update_columns["updated"] = utcnow()
+        stmt = (
+            stmt.on_conflict_do_update(
+                index_elements=index_elements, set_=update_columns
+            )
+            .returning(self.db_model)
+            .execution_options(populate_existing=True)
+        )
+        query = await db.scalars(stmt)
+        records = list(query.all())
+        await self._commit(db)
+        return records
+
+    async def _upsert_by_select(
+        self,
+        db: CurrentAsyncSession,
+        data: List[dict[str, Any]],
+        index_elements: Sequence[str],
+    ) -> List[ModelType]:
+        """
+        The upsert of the databases without ON CONFLICT: one SELECT of the records
+        matching `index_elements`, which are updated, the others are inserted, all in
+        the transaction of `db`. A record inserted concurrently still fails the commit
+        on the unique constraint.
+        """
+        columns = [getattr(self.db_model, name) for name in index_elements]
+        keys = [tuple(record[name] for name in index_elements) for record in data]
+        matching = (
+            columns[0].in_([key[0] for key in keys])
+            if len(columns) == 1
+            else tuple_(*columns).in_(keys)
+        )
+        existing = {
+            tuple(getattr(record, name) for name in index_elements): record
+            for record in await db.scalars(select(self.db_model).where(matching))
+        }
+        records = []
+        for key, values in zip(keys, data):
+            record = existing.get(key)
+            if record is None:
+                record = existing[key] = self.db_model(**values)
+                db.add(record)
+            else:
+                for name, value in values.items():
+                    setattr(record, name, value)
+            records.append(record)
+        await self._commit(db)
+        return records
 
     async def check_associated_records(
         self,
@@ -1,8 +1,302 @@
+import os
+import typing
+
 from fastapi.templating import Jinja2Templates
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import (
+    Environment,
+    FileSystemBytecodeCache,
+    FileSystemLoader,
+    Template,
+    pass_context,
+)
+from jinja2.runtime import Context
+from starlette.background import BackgroundTask
+from starlette.datastructures import URL
+from starlette.requests import Request
+from starlette.responses import HTMLResponse, Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.assets import AssetFiles
+from app.core.fragments import cached_fragment
+from app.core.streaming import StreamingTemplateResponse
+
+# "development" reloads the templates changed on disk, "production" never checks them
+# again and keeps their compiled code in a bytecode cache
+TEMPLATE_MODE = os.getenv("TEMPLATE_MODE", "development")
+# Directory of the bytecode cache of production mode, the temporary directory when
+# empty. It is filled at startup, see warm_templates.
+TEMPLATE_BYTECODE_CACHE_DIR = os.getenv("TEMPLATE_BYTECODE_CACHE_DIR", "")
+# Renders with render_async. Jinja then awaits every call and loop of the templates,
+# which makes the pages about 2-3 times slower to render (benchmarks/templates.py),
+# so it is only worth it for templates calling coroutines.
+TEMPLATE_ENABLE_ASYNC = os.getenv("TEMPLATE_ENABLE_ASYNC", "false").lower() == "true"
+
+# Pages of at least this many rows are streamed as they render, see
+# Templates.TemplateStreamResponse, smaller ones are rendered at once
+TEMPLATE_STREAM_ROWS = int(os.getenv("TEMPLATE_STREAM_ROWS", "500"))
+
+TEMPLATE_DIRECTORY = "app/templates"
+
+
+def create_environment(
+    mode: str = TEMPLATE_MODE, enable_async: bool = TEMPLATE_ENABLE_ASYNC
+) -> Environment:
+    if mode == "development":
+        # Create a Jinja2 environment with auto-reload enabled
+        return Environment(
+            loader=FileSystemLoader(TEMPLATE_DIRECTORY),
+            auto_reload=True,
+            enable_async=enable_async,
+        )
+    if mode != "production":
+        raise ValueError(f"Unknown template mode {mode!r}")
+    if TEMPLATE_BYTECODE_CACHE_DIR:
+        os.makedirs(TEMPLATE_BYTECODE_CACHE_DIR, exist_ok=True)
+    # Synchronous and asynchronous code do not share the cache, its entries are only
+    # keyed by the name and source of the templates
+    bytecode_cache = FileSystemBytecodeCache(
+        TEMPLATE_BYTECODE_CACHE_DIR or None,
+        "__jinja2_async_%s.cache" if enable_async else "__jinja2_%s.cache",
+    )
+    return Environment(
+        loader=FileSystemLoader(TEMPLATE_DIRECTORY),
+        auto_reload=False,
+        bytecode_cache=bytecode_cache,
+        enable_async=enable_async,
+        # Every template stays loaded once warmed
+        cache_size=-1,
+    )
+
+
+class AsyncTemplateResponse(HTMLResponse):
+    """
+    Template response of an async environment, rendered with render_async when it
+    is sent instead of when it is created. Headers and cookies can still be set on it
+    in between, as on the responses rendered right away.
+    """
+
+    def __init__(
+        self,
+        template: typing.Any,
+        context: typing.Dict[str, typing.Any],
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+    ):
+        self.template = template
+        self.context = context
+        super().__init__(b"", status_code, headers, media_type, background)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.body = self.render(await self.template.render_async(self.context))
+        self.headers["content-length"] = str(len(self.body))
+        await super().__call__(scope, receive, send)
+
+
+class TemplateFragment:
+    """
+    A block of a template rendered on its own, preceded by the title block of the
+    template, which htmx copies to the document title.
+    """
+
+    def __init__(self, template: Template, block: str):
+        self.template = template
+        self.block = block
+        self.name = template.name
+
+    def _blocks(self) -> typing.List[typing.Tuple[str, str, str]]:
+        """The blocks to render, with the markup around them."""
+        blocks = [("", self.block, "")]
+        if "title" in self.template.blocks:
+            blocks.insert(0, ("<title>", "title", "</title>"))
+        return blocks
+
+    def generate(self, context: typing.Dict[str, typing.Any]) -> typing.Iterator[str]:
+        template_context = self.template.new_context(context)
+        try:
+            for before, block, after in self._blocks():
+                yield before
+                yield from self.template.blocks[block](template_context)
+                yield after
+        except Exception:
+            yield self.template.environment.handle_exception()
+
+    async def generate_async(
+        self, context: typing.Dict[str, typing.Any]
+    ) -> typing.AsyncIterator[str]:
+        template_context = self.template.new_context(context)
+        try:
+            for before, block, after in self._blocks():
+                yield before
+                async for part in self.template.blocks[block](template_context):
+                    yield part
+                yield after
+        except Exception:
+            yield self.template.environment.handle_exception()
+
+    def render(self, context: typing.Dict[str, typing.Any]) -> str:
+        return "".join(self.generate(context))
+
+    async def render_async(self, context: typing.Dict[str, typing.Any]) -> str:
+        return "".join([part async for part in self.generate_async(context)])
+
+
+# The files of /static, mounted by main.py, whose fingerprinted URLs the templates get
+# from asset_url. The changed files get new ones in development mode.
+static_files = AssetFiles(reload=TEMPLATE_MODE != "production")
+
+
+@pass_context
+def url_for(context: Context, name: str, /, **path_params: typing.Any) -> URL:
+    """url_for of the environments Jinja2Templates was not created with."""
+    return context["request"].url_for(name, **path_params)
+
+
+# Request headers deciding whether a page is rendered whole or as the block its view
+# names, see fragment_requested
+FRAGMENT_HEADERS = ("HX-Request", "HX-Boosted", "HX-History-Restore-Request")
+
+
+def fragment_requested(request: Request) -> bool:
+    """
+    Whether `request` is an htmx request swapping a part of the page, which gets the
+    block named by the view alone. The boosted and the history restoration requests
+    of htmx replace the whole page, so they get it whole.
+    """
+    headers = request.headers
+    return (
+        headers.get("HX-Request") == "true"
+        and headers.get("HX-Boosted") != "true"
+        and headers.get("HX-History-Restore-Request") != "true"
+    )
+
+
+class Templates(Jinja2Templates):
+    """
+    Jinja2Templates rendering asynchronously when the environment has enable_async.
+    The routes call `templates.TemplateResponse(name, context, block=...)`, `block`
+    being the block of the template swapped by the htmx requests of the view: only
+    it is rendered for them, see fragment_requested.
+
+    TemplateStreamResponse streams the templates instead, rendered by `stream_env`,
+    an environment with enable_async.
+    """
+
+    def __init__(
+        self,
+        *,
+        env: Environment,
+        stream_env: typing.Optional[Environment] = None,
+        **kwargs,
+    ):
+        super().__init__(env=env, **kwargs)
+        if stream_env is None:
+            # Compiled apart from the templates of `env`, which are not async
+            stream_env = (
+                env
+                if env.is_async
+                else env.overlay(enable_async=True, cache_size=400, bytecode_cache=None)
+            )
+        if not stream_env.is_async:
+            raise ValueError("The templates are streamed by an async environment")
+        self.stream_env = stream_env
+        stream_env.globals.setdefault("url_for", url_for)
+        for environment in (env, stream_env):
+            environment.globals.setdefault("cached_fragment", cached_fragment)
+            environment.globals.setdefault("asset_url", static_files.asset_url)
+
+    def TemplateResponse(
+        self,
+        name: str,
+        context: typing.Dict[str, typing.Any],
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+        block: typing.Optional[str] = None,
+    ) -> Response:
+        request = self._request(context)
+        fragment = block if block and fragment_requested(request) else None
+        if fragment is None and not self.env.is_async:
+            response = super().TemplateResponse(
+                request, name, context, status_code, headers, media_type, background
+            )
+            return _vary(block, response)
+
+        self._process_context(request, context)
+        template = self.get_template(name)
+        renderer = TemplateFragment(template, fragment) if fragment else template
+        if self.env.is_async:
+            response = AsyncTemplateResponse(
+                renderer, context, status_code, headers, media_type, background
+            )
+        else:
+            response = HTMLResponse(
+                renderer.render(context), status_code, headers, media_type, background
+            )
+        return _vary(block, response)
+
+    def TemplateStreamResponse(
+        self,
+        name: str,
+        context: typing.Dict[str, typing.Any],
+        status_code: int = 200,
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+        media_type: typing.Optional[str] = None,
+        background: typing.Optional[BackgroundTask] = None,
+        block: typing.Optional[str] = None,
+    ) -> StreamingTemplateResponse:
+        """Takes the arguments of TemplateResponse."""
+        request = self._request(context)
+        self._process_context(request, context)
+        template = self.stream_env.get_template(name)
+        fragment = block if block and fragment_requested(request) else None
+        response = StreamingTemplateResponse(
+            TemplateFragment(template, fragment) if fragment else template,
+            context,
+            status_code,
+            headers,
+            media_type,
+            background,
+        )
+        return _vary(block, response)
+
+    @staticmethod
+    def _request(context: typing.Dict[str, typing.Any]) -> Request:
+        request = context.get("request")
+        if request is None:
+            raise ValueError('context must include a "request" key')
+        return request
+
+    def _process_context(
+        self, request: Request, context: typing.Dict[str, typing.Any]
+    ) -> None:
+        for context_processor in self.context_processors:
+            context.update(context_processor(request))
+
+
+def _vary(block: typing.Optional[str], response: Response) -> Response:
+    if block:
+        # Pages are rendered whole or in part depending on these headers
+        response.headers["Vary"] = ", ".join(FRAGMENT_HEADERS)
+    return response
+
+
+def warm_templates(environment: Environment) -> int:
+    """Loads every template, compiling the ones missing from the bytecode cache."""
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
 
-# Create a Jinja2 environment with auto-reload enabled
-jinja_env = Environment(loader=FileSystemLoader("app/templates"), auto_reload=True)
+jinja_env = create_environment()
 
 # Use the custom environment in Jinja2Templates
-templates = Jinja2Templates(env=jinja_env)
+templates = Templates(
+    env=jinja_env,
+    stream_env=(
+        jinja_env if jinja_env.is_async else create_environment(enable_async=True)
+    ),
+)
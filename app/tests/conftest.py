@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import pytest
+
+# The database module reads DATABASE_URL at import time
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+
+from sqlalchemy import event  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.database.base import Base, init_models  # noqa: E402
+
+init_models()
+
+
+class StatementRecorder:
+    """Records the SQL statements run on the engine of `db`, with their parameters."""
+
+    def __init__(self, db):
+        self.engine = db.bind.sync_engine
+        self.executed = []
+
+    @property
+    def statements(self):
+        return [statement for statement, _ in self.executed]
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self.record)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, "before_cursor_execute", self.record)
+
+    def record(self, conn, cursor, statement, parameters, context, executemany):
+        self.executed.append((statement, parameters))
+
+
+@pytest.fixture
+def run_db():
+    """Runs an async scenario against a fresh in-memory database with all the tables."""
+
+    def run(scenario):
+        async def main():
+            engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            try:
+                session_maker = async_sessionmaker(engine, expire_on_commit=False)
+                async with session_maker() as session:
+                    return await scenario(session)
+            finally:
+                await engine.dispose()
+
+        return asyncio.run(main())
+
+    return run
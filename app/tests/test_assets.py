@@ -0,0 +1,101 @@
+import gzip
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.assets import IMMUTABLE, AssetFiles, accepted_encodings, brotli
+
+SCRIPT = b"function hello() { return 'hello'; }\n" * 50
+
+
+@pytest.fixture
+def assets(tmp_path):
+    (tmp_path / "js").mkdir()
+    (tmp_path / "js" / "app.js").write_bytes(SCRIPT)
+    (tmp_path / "logo.gif").write_bytes(b"GIF89a")
+    return AssetFiles(directory=str(tmp_path), reload=True)
+
+
+def make_client(assets: AssetFiles) -> TestClient:
+    app = FastAPI()
+    app.mount(assets.url, assets)
+    return TestClient(app)
+
+
+class TestAssetFiles:
+    def test_fingerprinted_url_is_cached_for_good(self, assets):
+        client = make_client(assets)
+        url = assets.asset_url("js/app.js")
+        assert url.startswith("/static/js/app.") and url.endswith(".js")
+
+        fingerprinted = client.get(url, headers={"Accept-Encoding": "identity"})
+        plain = client.get("/static/js/app.js", headers={"Accept-Encoding": "identity"})
+        assert fingerprinted.content == plain.content == SCRIPT
+        assert fingerprinted.headers["cache-control"] == IMMUTABLE
+        assert plain.headers["cache-control"] == "no-cache"
+        assert client.get("/static/js/app.000000000000.js").status_code == 404
+
+    def test_changed_file_gets_a_new_url(self, assets, tmp_path):
+        first = assets.asset_url("js/app.js")
+        path = tmp_path / "js" / "app.js"
+        path.write_bytes(b"changed")
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+        second = assets.asset_url("js/app.js")
+        assert second != first
+        assert make_client(assets).get(second).content == b"changed"
+        assert assets.asset_url("missing.js") == "/static/missing.js"
+
+    @pytest.mark.parametrize(
+        "accept_encoding, content_encoding",
+        [
+            ("gzip, deflate, br", "br" if brotli is not None else "gzip"),
+            ("gzip", "gzip"),
+            ("br;q=0, gzip;q=0.5", "gzip"),
+            ("identity", None),
+        ],
+    )
+    def test_precompressed_file_is_sent(
+        self, assets, accept_encoding, content_encoding
+    ):
+        assert assets.compress() == (2 if brotli is not None else 1)
+        assert assets.compress() == 0
+        response = make_client(assets).get(
+            assets.asset_url("js/app.js"), headers={"Accept-Encoding": accept_encoding}
+        )
+        assert response.headers.get("content-encoding") == content_encoding
+        assert response.headers["content-type"].startswith("text/javascript")
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert response.content == SCRIPT
+
+    def test_stale_compressed_file_is_ignored(self, assets, tmp_path):
+        path = tmp_path / "js" / "app.js"
+        assets.compress()
+        os.utime(path, ns=(0, path.stat().st_mtime_ns + 10**9))
+        response = make_client(assets).get(
+            "/static/js/app.js", headers={"Accept-Encoding": "gzip"}
+        )
+        assert "content-encoding" not in response.headers
+        assert assets.compress() >= 1
+        assert gzip.decompress((tmp_path / "js" / "app.js.gz").read_bytes()) == SCRIPT
+
+    def test_images_are_not_compressed(self, assets, tmp_path):
+        assets.compress()
+        assert not (tmp_path / "logo.gif.gz").exists()
+        response = make_client(assets).get(
+            "/static/logo.gif", headers={"Accept-Encoding": "gzip"}
+        )
+        assert "vary" not in response.headers
+
+
+@pytest.mark.parametrize(
+    "header, accepted",
+    [
+        ("gzip, br", {"gzip", "br"}),
+        ("br;q=0, gzip; q=0.8", {"gzip"}),
+        ("", set()),
+    ],
+)
+def test_accepted_encodings(header, accepted):
+    assert accepted_encodings(header) == accepted
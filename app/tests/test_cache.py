@@ -0,0 +1,53 @@
+import sys
+from unittest import mock
+
+from app.core.cache import FragmentCache, TTLCache
+
+
+class TestTTLCache:
+    def test_entries_expire_after_their_ttl(self):
+        cache = TTLCache[int](ttl=10)
+        with mock.patch("app.core.cache.time.monotonic", return_value=100.0):
+            cache.set("short", 1, ttl=1)
+            cache.set("long", 2)
+        with mock.patch("app.core.cache.time.monotonic", return_value=105.0):
+            assert cache.get("short") is None
+            assert cache.get("long") == 2
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = TTLCache[int](maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        assert cache.get("b") is None
+        assert (cache.get("a"), cache.get("c")) == (1, 3)
+        assert len(cache) == 2
+
+
+class TestFragmentCache:
+    def test_least_recently_used_fragments_are_evicted_past_the_size(self):
+        cache = FragmentCache(max_bytes=3 * sys.getsizeof(b"<tr>a</tr>"))
+        for key in "abc":
+            cache.set(key, f"<tr>{key}</tr>".encode())
+        cache.get("a")
+        cache.set("d", b"<tr>d</tr>")
+        assert cache.get("b") is None
+        assert [cache.get(key) for key in "acd"] == [
+            b"<tr>a</tr>",
+            b"<tr>c</tr>",
+            b"<tr>d</tr>",
+        ]
+        assert cache.size <= cache.max_bytes
+
+    def test_fragments_of_an_entity_are_forgotten(self):
+        cache = FragmentCache()
+        cache.set("group-row", b"<tr>1</tr>", [("Group", 1)])
+        cache.set("board-row", b"<tr>1, 2</tr>", [("Group", 1), ("User", 2)])
+        cache.set("other-row", b"<tr>3</tr>", [("Group", 3)])
+        cache.forget(("User", 2))
+        assert cache.get("board-row") is None
+        cache.forget(("Group", 1))
+        assert len(cache) == 1
+        assert cache.get("other-row") == b"<tr>3</tr>"
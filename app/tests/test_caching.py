@@ -0,0 +1,146 @@
+import pytest
+from sqlalchemy import delete, update
+from starlette.requests import Request
+
+from app.core.fragments import entity_key, fragment_cache
+from app.models.users import Role, User
+from app.routes.view import caching
+from app.routes.view.caching import PageValidator, changes, page_validator
+from app.routes.view.view_crud import SQLAlchemyCRUD
+
+role_crud = SQLAlchemyCRUD[Role](Role)
+
+
+def make_request(**headers) -> Request:
+    return Request(
+        {
+            "type": "http",
+            "method": "GET",
+            "scheme": "https",
+            "server": ("testserver", 443),
+            "path": "/role",
+            "query_string": b"",
+            "headers": [
+                (name.replace("_", "-").lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+        }
+    )
+
+
+class TestPageValidator:
+    @pytest.mark.parametrize(
+        "if_none_match, matches",
+        [
+            (None, False),
+            ('W/"abc"', True),
+            ('"abc"', True),
+            ('W/"other", W/"abc"', True),
+            ("*", True),
+            ('W/"other"', False),
+        ],
+    )
+    def test_etags_are_compared_weakly(self, if_none_match, matches):
+        headers = {} if if_none_match is None else {"If_None_Match": if_none_match}
+        assert PageValidator('W/"abc"').matches(make_request(**headers)) is matches
+
+    def test_not_modified_has_the_validators_and_no_body(self):
+        response = PageValidator('W/"abc"').not_modified()
+        assert response.status_code == 304
+        assert response.body == b""
+        assert response.headers["etag"] == 'W/"abc"'
+        assert response.headers["cache-control"] == "private, no-cache"
+
+
+class TestPageValidatorOfTables:
+    def test_etag_changes_with_the_rows_and_the_request(self, run_db):
+        async def scenario(db):
+            user = User(email="admin@example.com", hashed_password="x")
+            role = Role(role_name="reader")
+            db.add_all([user, role])
+            await db.commit()
+
+            async def etag(csrf_token="token", **headers):
+                validator = await page_validator(
+                    db, make_request(**headers), user, csrf_token, changes(Role)
+                )
+                return validator.etag
+
+            etags = {"first": await etag(), "again": await etag()}
+            etags["csrf"] = await etag("rotated")
+            etags["fragment"] = await etag(HX_Request="true", HX_Target="body")
+            role.role_desc = "Reads"
+            await db.commit()
+            etags["updated"] = await etag()
+            await db.execute(delete(Role))
+            await db.commit()
+            etags["deleted"] = await etag()
+            return etags
+
+        etags = run_db(scenario)
+        assert etags["first"] == etags.pop("again")
+        assert len(set(etags.values())) == len(etags)
+
+
+class TestNewestSource:
+    def test_sources_are_listed_once_per_interval(self, monkeypatch):
+        listed = []
+        files = caching.static_files.files
+        monkeypatch.setattr(
+            caching.static_files, "files", lambda: listed.append(1) or files()
+        )
+        caching._newest_sources.clear()
+        first, again = caching._newest_source(), caching._newest_source()
+        # The interval has passed
+        caching._newest_sources.clear()
+        caching._newest_source()
+
+        assert first == again
+        assert len(listed) == 2
+
+
+class TestFragmentInvalidation:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        fragment_cache.clear()
+        yield
+        fragment_cache.clear()
+
+    def test_rows_of_committed_records_are_forgotten(self, run_db):
+        async def scenario(db):
+            reader, writer = Role(role_name="reader"), Role(role_name="writer")
+            db.add_all([reader, writer])
+            await db.commit()
+            for role in (reader, writer):
+                fragment_cache.set(role.id, b"<tr></tr>", [entity_key(role)])
+
+            reader.role_desc = "Reads"
+            await db.flush()
+            flushed = len(fragment_cache)
+            await db.commit()
+            committed = fragment_cache.get(reader.id), fragment_cache.get(writer.id)
+
+            await db.execute(update(Role).values(role_desc="Any"))
+            await db.commit()
+            return flushed, committed, len(fragment_cache)
+
+        flushed, committed, bulk_updated = run_db(scenario)
+        assert flushed == 2
+        assert committed == (None, b"<tr></tr>")
+        assert bulk_updated == 0
+
+    def test_crud_update_forgets_only_its_row(self, run_db):
+        async def scenario(db):
+            reader = await role_crud.create({"role_name": "reader"}, db)
+            writer = await role_crud.create({"role_name": "writer"}, db)
+            for role in (reader, writer):
+                fragment_cache.set(role.id, b"<tr></tr>", [entity_key(role)])
+
+            await role_crud.update(db, reader.id, {"role_desc": "Reads"})
+            updated = fragment_cache.get(reader.id), fragment_cache.get(writer.id)
+            await role_crud.delete(db, writer.id)
+            return updated, fragment_cache.get(writer.id)
+
+        updated, deleted = run_db(scenario)
+        assert updated == (None, b"<tr></tr>")
+        assert deleted is None
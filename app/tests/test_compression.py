@@ -0,0 +1,113 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.core.compression import CompressionMiddleware, brotli
+
+PAGE = "<tr><td>Группа</td><td>Описание задания</td></tr>\n" * 200
+
+
+def make_client(**options) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, **options)
+
+    @app.get("/page")
+    async def page():
+        return HTMLResponse(PAGE, headers={"Vary": "HX-Request", "ETag": '"page"'})
+
+    @app.get("/small")
+    async def small():
+        return HTMLResponse("<p>ok</p>")
+
+    @app.get("/download")
+    async def download():
+        return Response(PAGE.encode(), media_type="application/octet-stream")
+
+    @app.get("/precompressed")
+    async def precompressed():
+        return Response(
+            gzip.compress(PAGE.encode()),
+            media_type="text/javascript",
+            headers={"Content-Encoding": "gzip"},
+        )
+
+    return TestClient(app)
+
+
+class TestCompressionMiddleware:
+    @pytest.mark.parametrize(
+        "accept_encoding, content_encoding",
+        [
+            ("gzip, deflate, br", "br" if brotli is not None else "gzip"),
+            ("gzip", "gzip"),
+        ],
+    )
+    def test_pages_are_compressed(self, accept_encoding, content_encoding):
+        response = make_client().get(
+            "/page", headers={"Accept-Encoding": accept_encoding}
+        )
+        assert response.headers["content-encoding"] == content_encoding
+        assert int(response.headers["content-length"]) < len(PAGE.encode()) / 5
+        assert response.headers["vary"] == "HX-Request, Accept-Encoding"
+        assert response.headers["etag"] == 'W/"page"'
+        assert response.text == PAGE
+
+    @pytest.mark.parametrize(
+        "path, accept_encoding, text",
+        [
+            ("/page", "identity", PAGE),
+            ("/small", "gzip", "<p>ok</p>"),
+            ("/download", "gzip", PAGE),
+        ],
+        ids=["not-accepted", "small", "octet-stream"],
+    )
+    def test_other_responses_are_not_compressed(self, path, accept_encoding, text):
+        response = make_client().get(path, headers={"Accept-Encoding": accept_encoding})
+        assert "content-encoding" not in response.headers
+        assert response.text == text
+
+    def test_encoded_responses_are_not_compressed_again(self):
+        response = make_client().get(
+            "/precompressed", headers={"Accept-Encoding": "br"}
+        )
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.text == PAGE
+
+    def test_streamed_chunks_are_flushed_as_they_are_sent(self):
+        async def rows():
+            for _ in range(3):
+                yield PAGE
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            # The client stays connected
+            await asyncio.Event().wait()
+
+        middleware = CompressionMiddleware(
+            StreamingResponse(rows(), media_type="text/html"), gzip_level=1
+        )
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "headers": [(b"accept-encoding", b"gzip")],
+        }
+        asyncio.run(middleware(scope, receive, send))
+
+        start, *bodies = sent
+        assert (b"content-encoding", b"gzip") in start["headers"]
+        assert b"content-length" not in dict(start["headers"])
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        # Every chunk decompresses to the rows sent so far, without waiting for more
+        received = [decompressor.decompress(body["body"]) for body in bodies]
+        assert received[:3] == [PAGE.encode()] * 3
+        assert [body["more_body"] for body in bodies][-1] is False
+        assert decompressor.eof
@@ -0,0 +1,87 @@
+import asyncio
+
+import pytest
+from fastapi import Request, Response
+from fastapi_csrf_protect.exceptions import TokenValidationError
+
+from app.core import csrf
+from app.core.csrf import SessionCsrfProtect, _unsigned_tokens
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(SessionCsrfProtect, "_secret_key", "csrf-test-secret")
+    _unsigned_tokens.clear()
+    yield
+    _unsigned_tokens.clear()
+
+
+def make_request(cookie: str = None, header: str = None) -> Request:
+    headers = []
+    if cookie is not None:
+        headers.append((b"cookie", f"fastapi-csrf-token={cookie}".encode()))
+    if header is not None:
+        headers.append((b"x-csrf-token", header.encode()))
+    return Request({"type": "http", "method": "POST", "headers": headers})
+
+
+def issue(cookie: str = None):
+    """The tokens handed out to a page and the Set-Cookie of its response."""
+    csrf_protect = SessionCsrfProtect(make_request(cookie))
+    token, signed_token = csrf_protect.generate_csrf_tokens()
+    response = Response()
+    csrf_protect.unset_csrf_cookie(response)
+    csrf_protect.set_csrf_cookie(signed_token, response)
+    return token, signed_token, response.headers.getlist("set-cookie")
+
+
+class TestSessionCsrfProtect:
+    def test_token_is_reused_without_setting_the_cookie_again(self):
+        token, signed_token, set_cookies = issue()
+        assert set_cookies
+
+        assert issue(signed_token) == (token, signed_token, [])
+
+    def test_token_is_rotated_after_the_interval(self, monkeypatch):
+        token, signed_token, _ = issue()
+        monkeypatch.setattr(csrf, "CSRF_TOKEN_ROTATION_SECONDS", 0)
+
+        new_token, new_signed_token, set_cookies = issue(signed_token)
+        assert new_token != token
+        assert any(new_signed_token in cookie for cookie in set_cookies)
+
+    def test_invalid_cookie_gets_a_new_token(self):
+        _, signed_token, set_cookies = issue("forged")
+        assert signed_token != "forged"
+        assert set_cookies
+
+    def test_cookie_signature_is_checked_once(self, monkeypatch):
+        token, signed_token, _ = issue()
+        issue(signed_token)
+        assert _unsigned_tokens.get(signed_token) is not None
+
+        def fail(*args, **kwargs):
+            raise AssertionError("The signature is checked again")
+
+        monkeypatch.setattr(csrf.URLSafeTimedSerializer, "loads", fail)
+        assert issue(signed_token) == (token, signed_token, [])
+
+    def test_reused_token_is_validated(self):
+        token, signed_token, _ = issue()
+        _, reused_signed_token, _ = issue(signed_token)
+        request = make_request(reused_signed_token, token)
+        asyncio.run(SessionCsrfProtect(request).validate_csrf(request))
+
+    def test_mismatched_token_is_rejected(self):
+        _, signed_token, _ = issue()
+        request = make_request(signed_token, "not-the-token")
+        with pytest.raises(TokenValidationError):
+            asyncio.run(SessionCsrfProtect(request).validate_csrf(request))
+
+    def test_expired_token_is_rejected(self, monkeypatch):
+        token, signed_token, _ = issue()
+        request = make_request(signed_token, token)
+        monkeypatch.setattr(SessionCsrfProtect, "_max_age", -1)
+        with pytest.raises(TokenValidationError):
+            asyncio.run(SessionCsrfProtect(request).validate_csrf(request))
+        assert _unsigned_tokens.get(signed_token) is None
@@ -0,0 +1,148 @@
+import uuid
+from urllib.parse import urlencode
+
+import httpx
+import pytest
+from fastapi import FastAPI, Request, Response
+from sqlalchemy import select
+
+from app.core.csrf import SessionCsrfProtect, _unsigned_tokens
+from app.database.db import get_read_session
+from app.database.security import current_active_user
+from app.models.groups import Group, UserGroupLink
+from app.models.users import Role, User, UserProfile
+from app.routes.view.group import (
+    USER_PROFILE_BATCH,
+    group_view_route,
+    post_group_user_link,
+)
+from app.templates import templates
+from app.tests.conftest import StatementRecorder
+
+
+@pytest.fixture(autouse=True)
+def csrf_secret(monkeypatch):
+    monkeypatch.setattr(SessionCsrfProtect, "_secret_key", "csrf-test-secret")
+    _unsigned_tokens.clear()
+    yield
+    _unsigned_tokens.clear()
+
+
+def make_form_request(form: list) -> Request:
+    """A POST of `form` carrying a valid CSRF token, as the htmx forms send it."""
+    empty = Request({"type": "http", "method": "GET", "headers": []})
+    token, signed_token = SessionCsrfProtect(empty).generate_csrf_tokens()
+    body = urlencode(form).encode()
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    headers = [
+        (b"content-type", b"application/x-www-form-urlencoded"),
+        (b"cookie", f"fastapi-csrf-token={signed_token}".encode()),
+        (b"x-csrf-token", token.encode()),
+    ]
+    return Request(
+        {"type": "http", "method": "POST", "headers": headers, "query_string": b""},
+        receive,
+    )
+
+
+def test_members_are_reconciled_with_one_insert_and_one_delete(run_db):
+    async def scenario(db):
+        users = [
+            User(email=f"user-{index}@example.com", hashed_password="x")
+            for index in range(4)
+        ]
+        group = Group(group_name="Ops")
+        db.add_all([*users, group])
+        await db.flush()
+        db.add_all(
+            UserGroupLink(group_id=group.id, user_id=user.id) for user in users[:2]
+        )
+        await db.commit()
+
+        # User 1 stays, user 0 leaves, user 2 joins and user 3 stays out
+        form = [("all_users", str(user.id)) for user in users]
+        form += [("users_selected", str(user.id)) for user in users[1:3]]
+        request = make_form_request(form)
+        with StatementRecorder(db) as recorder:
+            response = await post_group_user_link(
+                request,
+                Response(),
+                group.id,
+                db,
+                User(email="root@example.com", is_superuser=True),
+                SessionCsrfProtect(request),
+            )
+        members = set(
+            await db.scalars(
+                select(UserGroupLink.user_id).where(UserGroupLink.group_id == group.id)
+            )
+        )
+        writes = [
+            statement.split()[0]
+            for statement in recorder.statements
+            if "group_users" in statement.split("WHERE")[0]
+        ]
+        return response, members, {users[1].id, users[2].id}, writes
+
+    response, members, expected, writes = run_db(scenario)
+    assert response.headers["HX-Location"] == "/groups"
+    assert members == expected
+    assert writes == ["SELECT", "INSERT", "DELETE"]
+
+
+def test_profiles_of_a_page_are_read_in_one_request(run_db):
+    async def scenario(db):
+        role = Role(role_name="Editors")
+        profile = UserProfile(first_name="Иван", last_name="Петров")
+        db.add_all([role, profile])
+        await db.flush()
+        users = [
+            User(
+                email="ivan@example.com",
+                hashed_password="x",
+                role_id=role.id,
+                profile_id=profile.id,
+            ),
+            User(email="anna@example.com", hashed_password="x"),
+        ]
+        db.add_all(users)
+        await db.commit()
+
+        app = FastAPI()
+        app.include_router(group_view_route)
+        app.dependency_overrides[get_read_session] = lambda: db
+        app.dependency_overrides[current_active_user] = lambda: users[1]
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://test"
+        ) as client:
+            with StatementRecorder(db) as recorder:
+                response = await client.post(
+                    "/get_user_profiles",
+                    data={"user_id": [str(user.id) for user in users]},
+                )
+        return response, users, recorder.statements
+
+    response, users, statements = run_db(scenario)
+    assert response.status_code == 200
+    # Each profile fills the elements of its user in all the groups of the page
+    for user in users:
+        assert f'hx-swap-oob="innerHTML:.user-profile-{user.id}"' in response.text
+    assert "Editors: Иван Петров" in response.text
+    assert len(statements) == 1
+
+
+def test_profiles_are_requested_in_batches_of_the_route_limit():
+    request = Request({"type": "http", "headers": [], "router": group_view_route})
+    loader = templates.get_template("partials/group/user_profiles_loader.html")
+    user_ids = [uuid.uuid4() for _ in range(USER_PROFILE_BATCH + 1)]
+    rendered = loader.render(
+        request=request,
+        user_ids=user_ids + user_ids[:1],
+        user_profile_batch=USER_PROFILE_BATCH,
+    )
+    assert rendered.count("<form") == 2
+    assert rendered.count('name="user_id"') == len(user_ids)
@@ -0,0 +1,117 @@
+import importlib.util
+import uuid
+from pathlib import Path
+
+from alembic.operations import Operations
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import delete, select, text
+
+from app.database.search import rebuild_search_index
+from app.models.groups import Group, UserGroupLink
+from app.models.search import SearchDocument
+from app.models.users import Role, User, UserProfile
+from app.routes.view.view_crud import SQLAlchemyCRUD
+
+VERSIONS = Path(__file__).parents[1] / "migrations" / "versions"
+
+role_crud = SQLAlchemyCRUD[Role](Role)
+
+
+def load_revision(name: str):
+    spec = importlib.util.spec_from_file_location(name, VERSIONS / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run_revision(db, name: str, step: str = "upgrade", *args):
+    """Runs a step of a revision on the connection of `db`, as alembic would."""
+
+    def run(connection):
+        with Operations.context(MigrationContext.configure(connection)):
+            getattr(load_revision(name), step)(*args)
+
+    await (await db.connection()).run_sync(run)
+
+
+async def all_pages(db):
+    names, cursor = [], None
+    while True:
+        page = await role_crud.read_page(db, cursor, limit=1)
+        names += [role.role_name for role in page.items]
+        cursor = page.next_cursor
+        if cursor is None:
+            return names
+
+
+def test_timestamps_without_microseconds_are_normalized(run_db):
+    async def scenario(db):
+        # Two roles created in the same second by CURRENT_TIMESTAMP
+        for name in ("first", "second"):
+            await db.execute(
+                text(
+                    "INSERT INTO roles (id, role_name, created, updated) "
+                    "VALUES (:id, :name, '2026-10-18 09:12:31', '2026-10-18 09:12:31')"
+                ),
+                {"id": uuid.UUID(int=len(name)).hex, "name": name},
+            )
+        await db.commit()
+        before = await all_pages(db)
+        await run_revision(db, "0004_normalize_timestamps")
+        await db.commit()
+        db.expunge_all()
+        return before, await all_pages(db)
+
+    before, after = run_db(scenario)
+    assert before == ["first"]
+    assert after == ["first", "second"]
+
+
+def test_search_index_is_rebuilt_as_the_application_builds_it(run_db):
+    async def scenario(db):
+        profile = UserProfile(first_name="Иван", last_name="", company="ACME")
+        db.add(profile)
+        await db.flush()
+        db.add(User(email="ivan@example.com", hashed_password="x", profile=profile))
+        db.add_all([Group(group_name="Ops", group_desc=""), Role(role_name="Admin")])
+        await db.commit()
+        columns = (
+            SearchDocument.entity,
+            SearchDocument.entity_id,
+            SearchDocument.title,
+            SearchDocument.body,
+        )
+        connection = await db.connection()
+        await connection.run_sync(rebuild_search_index)
+        built = set(await db.execute(select(*columns)))
+        await db.execute(delete(SearchDocument))
+        await run_revision(db, "0002_search_index", "_rebuild_documents", "sqlite")
+        return built, set(await db.execute(select(*columns)))
+
+    built, rebuilt = run_db(scenario)
+    assert len(built) == 3
+    assert rebuilt == built
+
+
+def test_user_ids_are_dashed_like_the_users(run_db):
+    async def scenario(db):
+        user = User(email="member@example.com", hashed_password="x")
+        group = Group(group_name="Ops")
+        db.add_all([user, group])
+        await db.commit()
+        # As the Uuid type wrote it
+        await db.execute(
+            text(
+                "INSERT INTO group_users (id, group_id, user_id) VALUES (:id, :g, :u)"
+            ),
+            {"id": uuid.uuid4().hex, "g": group.id.hex, "u": user.id.hex},
+        )
+        await db.commit()
+        members = select(User.email).join(
+            UserGroupLink, UserGroupLink.user_id == User.id
+        )
+        before = list(await db.scalars(members))
+        await run_revision(db, "0005_dashed_user_ids")
+        return before, list(await db.scalars(members))
+
+    assert run_db(scenario) == ([], ["member@example.com"])
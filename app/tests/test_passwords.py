@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+from fastapi.security import OAuth2PasswordRequestForm
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+
+from app.core.passwords import AsyncPasswordHelper
+from app.database.security import UserManager
+from app.models.users import User
+from app.schema.users import UserCreate, UserUpdate
+
+
+class TestAsyncPasswordHelper:
+    def test_hashes_in_the_pool_and_counts_the_queue(self):
+        helper = AsyncPasswordHelper(max_workers=1)
+
+        async def scenario():
+            hashes = asyncio.gather(*(helper.hash_async("secret") for _ in range(3)))
+            await asyncio.sleep(0)
+            depth = helper.queue_depth
+            hashed = (await hashes)[0]
+            return depth, await helper.verify_and_update_async("secret", hashed)
+
+        try:
+            depth, (verified, updated_hash) = asyncio.run(scenario())
+        finally:
+            helper.shutdown()
+        assert depth == 2
+        assert (verified, updated_hash) == (True, None)
+        assert (helper.in_flight, helper.peak_in_flight, helper.completed) == (0, 3, 4)
+
+    def test_unknown_executors_are_rejected(self):
+        with pytest.raises(ValueError):
+            AsyncPasswordHelper(executor="fiber")
+
+
+class PoolOnlyPasswordHelper(AsyncPasswordHelper):
+    """Fails the hashes and verifications computed outside of the pool."""
+
+    def hash(self, password):
+        raise AssertionError("hashed on the event loop")
+
+    def verify_and_update(self, plain_password, hashed_password):
+        raise AssertionError("verified on the event loop")
+
+
+def test_user_manager_hashes_through_the_pool(run_db):
+    helper = PoolOnlyPasswordHelper(max_workers=2)
+
+    async def scenario(db):
+        manager = UserManager(SQLAlchemyUserDatabase(db, User), helper)
+        await manager.create(
+            UserCreate(email="pool@example.com", password="password123")
+        )
+
+        async def login(password):
+            return await manager.authenticate(
+                OAuth2PasswordRequestForm(
+                    username="pool@example.com", password=password
+                )
+            )
+
+        user, rejected = await login("password123"), await login("wrong")
+        unknown = await manager.authenticate(
+            OAuth2PasswordRequestForm(username="nobody@example.com", password="x")
+        )
+        await manager.update(UserUpdate(password="password456"), user)
+        return user, rejected, unknown, await login("password456")
+
+    try:
+        user, rejected, unknown, updated = run_db(scenario)
+    finally:
+        helper.shutdown()
+    assert user.email == "pool@example.com"
+    assert (rejected, unknown) == (None, None)
+    assert updated is user
+    # hash on create, verify on each login, the hash of the unknown user against
+    # timing attacks, hash on update and verify again
+    assert helper.completed == 6
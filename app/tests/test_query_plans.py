@@ -0,0 +1,116 @@
+import re
+import uuid
+
+import pytest
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+
+from app.models.groups import UserGroupLink
+from app.models.upload import Upload
+from app.models.users import Role, User, UserActivity
+from app.routes.view.group import group_crud
+from app.routes.view.user import user_crud
+from app.routes.view.view_crud import SQLAlchemyCRUD
+from app.tests.conftest import StatementRecorder
+
+# The pages are read with the CRUD of their routes, total counts included
+role_crud = SQLAlchemyCRUD[Role](Role)
+upload_crud = SQLAlchemyCRUD[Upload](Upload)
+link_crud = SQLAlchemyCRUD[UserGroupLink](UserGroupLink)
+activity_crud = SQLAlchemyCRUD[UserActivity](UserActivity)
+
+# "SCAN group" is a full table scan, "SCAN group USING INDEX ..." walks an index in order
+FULL_SCAN = re.compile(r"^SCAN (\S+)$")
+
+
+async def full_scans(db, statements):
+    scans = []
+    for statement, parameters in statements:
+        result = await db.connection()
+        plan = await result.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        )
+        for row in plan:
+            match = FULL_SCAN.match(row.detail)
+            if match:
+                scans.append((match.group(1), statement))
+    return scans
+
+
+async def seed(db):
+    user = await user_crud.create(
+        {"email": "Member@Example.com", "hashed_password": "x"}, db
+    )
+    role = await role_crud.create({"role_name": "Editors"}, db)
+    group = await group_crud.create({"group_name": "Team"}, db)
+    db.add(UserGroupLink(group_id=group.id, user_id=user.id))
+    db.add(UserActivity(user_id=user.id, activity_type="sign-in"))
+    db.add(
+        Upload(
+            name="file.txt",
+            unique_name="unique-file",
+            file_type="text/plain",
+            source="http://minio/file.txt",
+            user_id=user.id,
+        )
+    )
+    await db.commit()
+    return user, role, group
+
+
+async def read_pages(db, crud, **kwargs):
+    page = await crud.read_page(db, limit=1, **kwargs)
+    await crud.read_page(db, page.next_cursor or page.prev_cursor, limit=1, **kwargs)
+
+
+QUERY_SHAPES = {
+    "read_by_primary_key": lambda db, user, role, group: group_crud.read_by_primary_key(
+        db, group.id, join_relationships=True
+    ),
+    "group_page": lambda db, user, role, group: read_pages(
+        db, group_crud, join_relationships=True
+    ),
+    "user_page": lambda db, user, role, group: read_pages(
+        db, user_crud, join_relationships=True
+    ),
+    "uploads_by_user_page": lambda db, user, role, group: upload_crud.read_page_by_column(
+        db, "user_id", user.id, limit=1
+    ),
+    "group_by_name": lambda db, user, role, group: group_crud.read_by_column(
+        db, "group_name", "team"
+    ),
+    "role_by_name": lambda db, user, role, group: role_crud.read_by_column(
+        db, "role_name", "editors"
+    ),
+    "group_links": lambda db, user, role, group: link_crud.read_by_column(
+        db, "group_id", group.id
+    ),
+    "group_link": lambda db, user, role, group: link_crud.check_associated_records(
+        db, UserGroupLink, group.id, user.id
+    ),
+    "user_activity": lambda db, user, role, group: activity_crud.read_by_column(
+        db, "user_id", user.id
+    ),
+    "user_by_email": lambda db, user, role, group: SQLAlchemyUserDatabase(
+        db, User
+    ).get_by_email("member@example.com"),
+    "update": lambda db, user, role, group: role_crud.update(
+        db, role.id, {"role_desc": "x"}
+    ),
+    "delete": lambda db, user, role, group: upload_crud.delete(db, uuid.uuid4()),
+}
+
+
+@pytest.mark.parametrize("shape", QUERY_SHAPES)
+def test_query_shape_does_not_scan_tables(run_db, shape):
+    async def scenario(db):
+        records = await seed(db)
+        with StatementRecorder(db) as recorder:
+            try:
+                await QUERY_SHAPES[shape](db, *records)
+            except Exception:
+                # e.g. the 404 of the delete, only the statements matter here
+                await db.rollback()
+        assert recorder.statements
+        return await full_scans(db, recorder.executed)
+
+    assert run_db(scenario) == []
@@ -0,0 +1,57 @@
+import asyncio
+from unittest import mock
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.base import Base
+from app.database.db import ReplicaRouter
+from app.models.users import Role
+
+
+class TestReplicaRouter:
+    def test_primary_is_used_without_replicas(self):
+        router = ReplicaRouter("primary", [])
+        assert router.session_maker("client") == "primary"
+
+    def test_replicas_are_used_in_turn(self):
+        router = ReplicaRouter("primary", ["replica-1", "replica-2"])
+        picked = [router.session_maker("client") for _ in range(4)]
+        assert picked == ["replica-1", "replica-2", "replica-1", "replica-2"]
+
+    def test_client_reads_from_primary_after_writing(self):
+        router = ReplicaRouter("primary", ["replica"], sticky_seconds=5)
+        with mock.patch("app.core.cache.time.monotonic", return_value=100.0):
+            router.pin("writer")
+            router.pin(None)
+            assert router.session_maker("writer") == "primary"
+            assert router.session_maker("reader") == "replica"
+            assert router.session_maker(None) == "replica"
+        with mock.patch("app.core.cache.time.monotonic", return_value=106.0):
+            assert router.session_maker("writer") == "replica"
+
+
+def test_commit_pins_the_writing_client(tmp_path):
+    async def scenario():
+        makers = []
+        for name in ("primary", "replica"):
+            engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+            makers.append(async_sessionmaker(engine, expire_on_commit=False))
+        primary, replica = makers
+        router = ReplicaRouter(primary, [replica])
+
+        async def read_roles(client):
+            async with router.session_maker(client)() as session:
+                return list(await session.scalars(select(Role.role_name)))
+
+        with mock.patch("app.database.db.replica_router", router):
+            async with primary() as session:
+                session.info["client"] = "writer"
+                session.add(Role(role_name="admin"))
+                await session.commit()
+            return await read_roles("writer"), await read_roles("reader")
+
+    # the replica file never receives the row, as if replication lagged behind
+    assert asyncio.run(scenario()) == (["admin"], [])
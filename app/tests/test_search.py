@@ -0,0 +1,151 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.database.base import Base
+from app.database.search import rebuild_search_index, search
+from app.models.groups import Group
+from app.models.search import SearchDocument
+from app.models.users import User, UserProfile
+from app.tests.conftest import StatementRecorder
+
+
+def hits_of(hits):
+    return [(hit.entity, hit.title) for hit in hits]
+
+
+class TestSearch:
+    def test_title_matches_rank_first_and_last_term_is_a_prefix(self, run_db):
+        async def scenario(db):
+            db.add(Group(group_name="Platform", group_desc="Backend services"))
+            db.add(Group(group_name="Backend", group_desc="API"))
+            await db.commit()
+            return await search(db, "backe"), await search(db, "backend servi")
+
+        ranked, every_term = run_db(scenario)
+        assert hits_of(ranked) == [("group", "Backend"), ("group", "Platform")]
+        assert hits_of(every_term) == [("group", "Platform")]
+
+    def test_query_syntax_is_not_interpreted(self, run_db):
+        async def scenario(db):
+            db.add(Group(group_name="Ops"))
+            await db.commit()
+            return await search(db, '"ops* -('), await search(db, " * ")
+
+        words, nothing = run_db(scenario)
+        assert hits_of(words) == [("group", "Ops")]
+        assert nothing == []
+
+    def test_user_documents_follow_their_profile(self, run_db):
+        async def scenario(db):
+            profile = UserProfile(first_name="Иван", last_name="Петров")
+            db.add(profile)
+            await db.flush()
+            db.add(
+                User(
+                    email="ivan@example.com", hashed_password="x", profile_id=profile.id
+                )
+            )
+            await db.commit()
+            before = await search(db, "петров")
+            profile.last_name = "Сидоров"
+            await db.commit()
+            return before, await search(db, "петров"), await search(db, "сидоров")
+
+        before, stale, after = run_db(scenario)
+        assert hits_of(before) == [("user", "ivan@example.com")]
+        assert stale == []
+        assert after[0].body == "Иван Сидоров"
+
+    def test_bulk_statements_are_indexed_on_commit(self, run_db):
+        async def scenario(db):
+            group = (
+                await db.execute(
+                    insert(Group).values([{"group_name": "Ops"}]).returning(Group)
+                )
+            ).scalar_one()
+            uncommitted = await search(db, "ops")
+            await db.commit()
+            inserted = await search(db, "ops")
+            await db.execute(
+                update(Group).where(Group.id == group.id).values(group_name="Design")
+            )
+            await db.commit()
+            updated = await search(db, "design")
+            await db.execute(update(Group).values(group_desc="Mockups"))
+            await db.commit()
+            unkeyed = await search(db, "mockups")
+            await db.execute(delete(Group).where(Group.id.in_([group.id])))
+            await db.commit()
+            return uncommitted, inserted, updated, unkeyed, await search(db, "design")
+
+        uncommitted, inserted, updated, unkeyed, deleted = run_db(scenario)
+        assert uncommitted == []
+        assert hits_of(inserted) == [("group", "Ops")]
+        assert hits_of(updated) == hits_of(unkeyed) == [("group", "Design")]
+        assert deleted == []
+
+    def test_transaction_is_indexed_once(self, run_db):
+        async def scenario(db):
+            group = Group(group_name="Ops")
+            db.add(group)
+            await db.commit()
+            with StatementRecorder(db) as recorder:
+                for name in ("Design", "Sales"):
+                    await db.execute(
+                        update(Group)
+                        .where(Group.id == group.id)
+                        .values(group_name=name)
+                    )
+                await db.commit()
+            return recorder.statements, await search(db, "sales")
+
+        statements, hits = run_db(scenario)
+        # The two updates, then the document read and written once
+        assert [statement.split()[0] for statement in statements] == [
+            "UPDATE",
+            "UPDATE",
+            "SELECT",
+            "INSERT",
+        ]
+        assert hits_of(hits) == [("group", "Sales")]
+
+    def test_rebuild_recreates_the_index(self, run_db):
+        async def scenario(db):
+            db.add(Group(group_name="Ops"))
+            await db.commit()
+            await db.execute(delete(SearchDocument))
+            await db.commit()
+            missing = await search(db, "ops")
+            await (await db.connection()).run_sync(rebuild_search_index)
+            return missing, await search(db, "ops")
+
+        missing, rebuilt = run_db(scenario)
+        assert missing == []
+        assert hits_of(rebuilt) == [("group", "Ops")]
+
+
+def test_search_waiting_on_a_writer_is_ended_by_the_database(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'app.db'}")
+        async with engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+        try:
+            async with engine.connect() as writer, AsyncSession(engine) as db:
+                # Held until the end of the block, as a writer committing would
+                await writer.exec_driver_sql("BEGIN EXCLUSIVE")
+                with pytest.raises(HTTPException) as error:
+                    await search(db, "ops", timeout_seconds=0.05)
+                connection = await db.connection()
+                busy_timeout = await connection.exec_driver_sql("PRAGMA busy_timeout")
+                return error.value.status_code, busy_timeout.scalar()
+        finally:
+            await engine.dispose()
+
+    status_code, busy_timeout = asyncio.run(scenario())
+    assert status_code == 504
+    # The connection gets back the busy_timeout of the settings
+    assert busy_timeout == 5000
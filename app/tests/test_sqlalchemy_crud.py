@@ -0,0 +1,602 @@
+import uuid
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import delete, event, insert
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import raiseload
+
+from app.models.groups import Group, UserGroupLink
+from app.models.upload import Upload
+from app.models.users import Role, User
+from app.routes.api.crud import BaseCRUD
+from app.routes.view.view_crud import SQLAlchemyCRUD
+from app.schema.users import RoleCreate, RoleUpdate
+from app.tests.conftest import StatementRecorder
+
+role_crud = SQLAlchemyCRUD[Role](Role)
+user_crud = SQLAlchemyCRUD[User](User)
+group_crud = SQLAlchemyCRUD[Group](Group, related_models={User: "users"})
+upload_crud = SQLAlchemyCRUD[Upload](Upload)
+
+
+async def create_roles(db, count):
+    return [
+        await role_crud.create({"role_name": f"role-{index:03d}"}, db)
+        for index in range(count)
+    ]
+
+
+class TestKeysetPagination:
+    def test_pages_walk_forward_and_back(self, run_db):
+        async def scenario(db):
+            await create_roles(db, 7)
+            first = await role_crud.read_page(db, limit=3)
+            second = await role_crud.read_page(db, first.next_cursor, limit=3)
+            last = await role_crud.read_page(db, second.next_cursor, limit=3)
+            back = await role_crud.read_page(db, second.prev_cursor, limit=3)
+            return first, second, last, back
+
+        first, second, last, back = run_db(scenario)
+        assert [r.role_name for r in first.items] == [
+            "role-000",
+            "role-001",
+            "role-002",
+        ]
+        assert first.prev_cursor is None
+        assert [r.role_name for r in second.items] == [
+            "role-003",
+            "role-004",
+            "role-005",
+        ]
+        assert [r.role_name for r in last.items] == ["role-006"]
+        assert last.next_cursor is None
+        assert last.prev_cursor is not None
+        assert [r.id for r in back.items] == [r.id for r in first.items]
+        assert back.prev_cursor is None
+
+    def test_records_sharing_a_timestamp_are_not_skipped(self, run_db):
+        async def scenario(db):
+            roles = await create_roles(db, 5)
+            created = roles[0].created
+            for role in roles:
+                await role_crud.update(db, role.id, {"created": created})
+            seen = []
+            cursor = None
+            while True:
+                page = await role_crud.read_page(db, cursor, limit=2)
+                seen.extend(role.id for role in page.items)
+                if page.next_cursor is None:
+                    return roles, seen
+                cursor = page.next_cursor
+
+        roles, seen = run_db(scenario)
+        assert sorted(seen) == sorted(role.id for role in roles)
+        assert len(seen) == len(set(seen))
+
+    def test_api_crud_pages_the_same_way(self, run_db):
+        api_crud = BaseCRUD[Role, RoleCreate, RoleUpdate](Role, RoleCreate, RoleUpdate)
+
+        async def scenario(db):
+            await create_roles(db, 3)
+            first = await api_crud.read_page(db, limit=2)
+            second = await api_crud.read_page(db, first.next_cursor, limit=2)
+            return first, second
+
+        first, second = run_db(scenario)
+        assert [r.role_name for r in first.items + second.items] == [
+            "role-000",
+            "role-001",
+            "role-002",
+        ]
+        assert second.next_cursor is None
+
+    def test_pages_seek_on_guid_keys(self, run_db):
+        async def scenario(db):
+            for index in range(3):
+                await user_crud.create(
+                    {"email": f"user{index}@example.com", "hashed_password": "x"}, db
+                )
+            first = await user_crud.read_page(db, limit=2)
+            second = await user_crud.read_page(db, first.next_cursor, limit=2)
+            return first, second
+
+        first, second = run_db(scenario)
+        assert len(first.items) == 2
+        assert len(second.items) == 1
+        assert second.items[0].id not in {user.id for user in first.items}
+
+    def test_page_by_column_filters_records(self, run_db):
+        async def scenario(db):
+            owner, other = uuid.uuid4(), uuid.uuid4()
+            for index, user_id in enumerate([owner, other, owner, owner]):
+                await upload_crud.create(
+                    {
+                        "name": f"file-{index}",
+                        "unique_name": f"unique-{index}",
+                        "file_type": "text/plain",
+                        "source": "test",
+                        "user_id": user_id,
+                    },
+                    db,
+                )
+            first = await upload_crud.read_page_by_column(db, "user_id", owner, limit=2)
+            second = await upload_crud.read_page_by_column(
+                db, "user_id", owner, first.next_cursor, limit=2
+            )
+            return first, second
+
+        first, second = run_db(scenario)
+        assert [f.name for f in first.items] == ["file-0", "file-2"]
+        assert [f.name for f in second.items] == ["file-3"]
+        assert second.next_cursor is None
+
+    def test_invalid_cursor_is_rejected(self, run_db):
+        async def scenario(db):
+            return await role_crud.read_page(db, "not-a-cursor")
+
+        with pytest.raises(HTTPException) as error:
+            run_db(scenario)
+        assert error.value.status_code == 400
+
+
+class TestStreamedPages:
+    def test_streamed_pages_walk_as_read_pages(self, run_db):
+        async def scenario(db):
+            await create_roles(db, 7)
+            session_maker = async_sessionmaker(db.bind)
+            pages = []
+            cursor = None
+            for _ in range(3):
+                page = role_crud.stream_page(session_maker, cursor, limit=3)
+                pages.append(([role.role_name async for role in page.items], page))
+                cursor = page.next_cursor
+            back = role_crud.stream_page(session_maker, pages[1][1].prev_cursor, 3)
+            pages.append(([role.role_name async for role in back], back))
+            return pages
+
+        first, second, last, back = run_db(scenario)
+        assert first[0] == ["role-000", "role-001", "role-002"]
+        assert first[1].prev_cursor is None
+        assert second[0] == ["role-003", "role-004", "role-005"]
+        assert last[0] == ["role-006"]
+        assert last[1].next_cursor is None
+        assert back[0] == first[0]
+        assert back[1].prev_cursor is None
+
+    def test_page_walked_backwards_is_streamed_with_its_collections(self, run_db):
+        async def scenario(db):
+            await TestRelationshipLoading().create_groups(db)
+            first = await group_crud.read_page(db, limit=2)
+            last = await group_crud.read_page(db, first.next_cursor, limit=2)
+            back = group_crud.stream_page(
+                async_sessionmaker(db.bind),
+                last.prev_cursor,
+                limit=2,
+                join_relationships=True,
+            )
+            groups = [(group.id, len(group.users)) async for group in back]
+            return [group.id for group in first.items], groups, back
+
+        first, groups, back = run_db(scenario)
+        assert groups == [(first[0], 3), (first[1], 3)]
+        assert back.prev_cursor is None
+        assert back.next_cursor is not None
+
+    def test_streamed_page_is_iterated_once(self, run_db):
+        async def scenario(db):
+            await create_roles(db, 2)
+            page = role_crud.stream_page(async_sessionmaker(db.bind), limit=3)
+            [role async for role in page]
+            with pytest.raises(RuntimeError):
+                [role async for role in page]
+
+        run_db(scenario)
+
+    def test_collections_are_loaded_while_streaming(self, run_db):
+        async def scenario(db):
+            await TestRelationshipLoading().create_groups(db)
+            page = group_crud.stream_page(
+                async_sessionmaker(db.bind), limit=3, join_relationships=True
+            )
+            return [len(group.users) async for group in page]
+
+        assert run_db(scenario) == [3, 3, 3]
+
+
+class TestRelationshipLoading:
+    async def create_groups(self, db):
+        users = [
+            User(email=f"member{index}@example.com", hashed_password="x")
+            for index in range(3)
+        ]
+        groups = [Group(group_name=f"group-{index}") for index in range(4)]
+        db.add_all(users + groups)
+        await db.flush()
+        db.add_all(
+            UserGroupLink(group_id=group.id, user_id=user.id)
+            for group in groups
+            for user in users
+        )
+        await db.commit()
+        db.expunge_all()
+
+    def test_collections_are_selectin_loaded_per_page(self, run_db):
+        async def scenario(db):
+            await self.create_groups(db)
+            with StatementRecorder(db) as counter:
+                page = await group_crud.read_page(db, limit=2, join_relationships=True)
+                members = [len(group.users) for group in page.items]
+            return page, members, counter.statements
+
+        page, members, statements = run_db(scenario)
+        assert len(page.items) == 2
+        assert members == [3, 3]
+        assert len(statements) == 2
+        assert "JOIN" not in statements[0]
+
+    def test_records_are_read_by_ids_in_one_statement(self, run_db):
+        async def scenario(db):
+            roles = await create_roles(db, 3)
+            db.expunge_all()
+            ids = [roles[0].id, roles[2].id, uuid.uuid4()]
+            with StatementRecorder(db) as counter:
+                read = await role_crud.read_many_by_primary_key(db, ids)
+            empty = await role_crud.read_many_by_primary_key(db, [])
+            return read, empty, counter.statements
+
+        read, empty, statements = run_db(scenario)
+        assert sorted(role.role_name for role in read) == ["role-000", "role-002"]
+        assert empty == []
+        assert len(statements) == 1
+
+    def test_declared_strategy_is_used(self, run_db):
+        async def scenario(db):
+            await self.create_groups(db)
+            crud = SQLAlchemyCRUD[Group](
+                Group, related_models={User: ("users", raiseload)}
+            )
+            groups = await crud.read_all(db, join_relationships=True)
+            return groups[0].users
+
+        with pytest.raises(InvalidRequestError):
+            run_db(scenario)
+
+
+class TestBulkOperations:
+    def test_create_many_uses_one_statement(self, run_db):
+        async def scenario(db):
+            with StatementRecorder(db) as counter:
+                roles = await role_crud.create_many(
+                    [{"role_name": f"bulk-{index}"} for index in range(5)], db
+                )
+            return roles, counter.statements
+
+        roles, statements = run_db(scenario)
+        assert sorted(role.role_name for role in roles) == [
+            f"bulk-{index}" for index in range(5)
+        ]
+        assert len({role.id for role in roles}) == 5
+        # The rows, then their search documents in one statement
+        assert [s.split()[0] for s in statements] == ["INSERT", "SELECT", "INSERT"]
+
+    def test_update_many_and_delete_many(self, run_db):
+        async def scenario(db):
+            roles = await create_roles(db, 4)
+            ids = [role.id for role in roles[:3]]
+            updated = await role_crud.update_many(db, ids, {"role_desc": "bulk desc"})
+            deleted = await role_crud.delete_many(db, ids[:2])
+            db.expunge_all()
+            remaining = await role_crud.read_all(db)
+            return updated, deleted, remaining
+
+        updated, deleted, remaining = run_db(scenario)
+        assert (updated, deleted) == (3, 2)
+        assert [(role.role_name, role.role_desc) for role in remaining] == [
+            ("role-002", "bulk desc"),
+            ("role-003", None),
+        ]
+
+    def test_upsert_many_inserts_and_updates(self, run_db):
+        async def scenario(db):
+            existing = (await create_roles(db, 1))[0]
+            records = await role_crud.upsert_many(
+                db,
+                [
+                    {"id": existing.id, "role_name": "renamed"},
+                    {"id": uuid.uuid4(), "role_name": "inserted"},
+                ],
+            )
+            return existing.id, records, await role_crud.read_all(db)
+
+        existing_id, records, roles = run_db(scenario)
+        assert len(records) == 2
+        assert {role.role_name for role in roles} == {"renamed", "inserted"}
+        assert [r.id for r in roles if r.role_name == "renamed"] == [existing_id]
+
+    def test_upsert_without_on_conflict_reads_then_writes(self, run_db):
+        async def scenario(db):
+            existing = (await create_roles(db, 1))[0]
+            with StatementRecorder(db) as counter:
+                records = await role_crud._upsert_by_select(
+                    db,
+                    [
+                        {"id": existing.id, "role_name": "renamed"},
+                        {"id": uuid.uuid4(), "role_name": "inserted"},
+                    ],
+                    ("id",),
+                )
+            return existing.id, records, counter.statements
+
+        existing_id, records, statements = run_db(scenario)
+        assert [(r.id == existing_id, r.role_name) for r in records] == [
+            (True, "renamed"),
+            (False, "inserted"),
+        ]
+        # One read, then the writes of the flush
+        assert sorted(s.split()[0] for s in statements[:3]) == [
+            "INSERT",
+            "SELECT",
+            "UPDATE",
+        ]
+        assert statements[0].startswith("SELECT")
+
+    def test_bulk_operations_accept_empty_input(self, run_db):
+        async def scenario(db):
+            return (
+                await role_crud.create_many([], db),
+                await role_crud.update_many(db, [], {"role_desc": "x"}),
+                await role_crud.delete_many(db, []),
+                await role_crud.upsert_many(db, []),
+            )
+
+        assert run_db(scenario) == ([], 0, 0, [])
+
+
+class TestReturningWrites:
+    def test_update_is_a_single_statement_and_its_reindex(self, run_db):
+        async def scenario(db):
+            role = (await create_roles(db, 1))[0]
+            with StatementRecorder(db) as counter:
+                updated = await role_crud.update(db, role.id, {"role_desc": "new"})
+            return updated, counter.statements
+
+        updated, statements = run_db(scenario)
+        assert updated.role_desc == "new"
+        assert [s.split()[0] for s in statements] == ["UPDATE", "SELECT", "INSERT"]
+        assert "RETURNING" in statements[0]
+        # The search document of the role is rewritten in place
+        assert "ON CONFLICT" in statements[2]
+
+    def test_delete_without_dependents_is_a_single_statement_and_its_reindex(
+        self, run_db
+    ):
+        async def scenario(db):
+            user = await user_crud.create(
+                {"email": "owner@example.com", "hashed_password": "x"}, db
+            )
+            upload = await upload_crud.create(
+                {
+                    "name": "file.txt",
+                    "unique_name": "unique-file",
+                    "file_type": "text/plain",
+                    "source": "http://minio/file.txt",
+                    "user_id": user.id,
+                },
+                db,
+            )
+            with StatementRecorder(db) as counter:
+                deleted = await upload_crud.delete(db, upload.id)
+            return deleted, counter.statements, await upload_crud.read_all(db)
+
+        deleted, statements, remaining = run_db(scenario)
+        assert deleted is True
+        assert [s.split()[0] for s in statements] == ["DELETE", "SELECT", "DELETE"]
+        assert "RETURNING" in statements[0]
+        assert "search_documents" in statements[2]
+        assert remaining == []
+
+    def test_delete_with_dependents_removes_association_rows(self, run_db):
+        async def scenario(db):
+            user = await user_crud.create(
+                {"email": "member@example.com", "hashed_password": "x"}, db
+            )
+            group = await group_crud.create({"group_name": "team"}, db)
+            db.add(UserGroupLink(group_id=group.id, user_id=user.id))
+            await db.commit()
+            await group_crud.delete(db, group.id)
+            return await SQLAlchemyCRUD(UserGroupLink).read_all(db)
+
+        assert run_db(scenario) == []
+
+    @pytest.mark.parametrize("layer", ["view", "api"])
+    def test_both_crud_layers_choose_the_same_delete(self, run_db, layer):
+        async def scenario(db):
+            user = await user_crud.create(
+                {"email": "owner@example.com", "hashed_password": "x"}, db
+            )
+            group = await group_crud.create({"group_name": "team"}, db)
+            upload = await upload_crud.create(
+                {
+                    "name": "file.txt",
+                    "unique_name": "unique-file",
+                    "file_type": "text/plain",
+                    "source": "http://minio/file.txt",
+                    "user_id": user.id,
+                },
+                db,
+            )
+            first_statements = []
+            for model, record in ((Group, group), (Upload, upload)):
+                if layer == "view":
+                    crud = SQLAlchemyCRUD(model)
+                else:
+                    crud = BaseCRUD(model, RoleCreate, RoleUpdate)
+                with StatementRecorder(db) as recorder:
+                    await crud.delete(db, record.id)
+                first_statements.append(recorder.statements[0].split()[0])
+            return first_statements
+
+        # The group has members to clean up first, the upload goes in one DELETE
+        assert run_db(scenario) == ["SELECT", "DELETE"]
+
+    @pytest.mark.parametrize("operation", ["update", "delete"])
+    def test_missing_record_raises_not_found(self, run_db, operation):
+        async def scenario(db):
+            if operation == "update":
+                await role_crud.update(db, uuid.uuid4(), {"role_desc": "x"})
+            else:
+                await role_crud.delete(db, uuid.uuid4())
+
+        with pytest.raises(HTTPException) as error:
+            run_db(scenario)
+        assert error.value.status_code == 404
+
+
+class TestTotalCount:
+    def test_window_count_is_read_with_the_page(self, run_db):
+        crud = SQLAlchemyCRUD[Group](
+            Group, related_models={User: "users"}, total_count="window"
+        )
+
+        async def scenario(db):
+            for index in range(5):
+                await group_crud.create({"group_name": f"group-{index}"}, db)
+            with StatementRecorder(db) as counter:
+                first = await crud.read_page(db, limit=2, join_relationships=True)
+            second = await crud.read_page(db, first.next_cursor, limit=2)
+            return first, second, counter.statements
+
+        first, second, statements = run_db(scenario)
+        assert (first.total, second.total) == (5, 5)
+        assert [g.group_name for g in second.items] == ["group-2", "group-3"]
+        # the page with its count, then the selectin load of the users
+        assert len(statements) == 2
+
+    def test_cached_count_is_reused_until_a_write(self, run_db):
+        crud = SQLAlchemyCRUD[Role](Role, total_count="cached")
+
+        async def scenario(db):
+            await create_roles(db, 3)
+            first = await crud.read_page(db, limit=2)
+            with StatementRecorder(db) as counter:
+                second = await crud.read_page(db, first.next_cursor, limit=2)
+            await crud.create({"role_name": "role-new"}, db)
+            third = await crud.read_page(db, limit=2)
+            return first, second, third, counter.statements
+
+        first, second, third, statements = run_db(scenario)
+        assert (first.total, second.total, third.total) == (3, 3, 4)
+        assert len(statements) == 1
+
+    def test_cached_count_follows_writes_outside_the_crud(self, run_db):
+        crud = SQLAlchemyCRUD[Role](Role, total_count="cached")
+
+        async def scenario(db):
+            await create_roles(db, 1)
+            totals = [(await crud.read_page(db)).total]
+            db.add(Role(role_name="added"))
+            await db.commit()
+            totals.append((await crud.read_page(db)).total)
+            await db.execute(insert(Role).values(role_name="inserted"))
+            await db.commit()
+            totals.append((await crud.read_page(db)).total)
+            await db.execute(delete(Role).where(Role.role_name == "added"))
+            await db.commit()
+            totals.append((await crud.read_page(db)).total)
+            return totals
+
+        assert run_db(scenario) == [1, 2, 3, 2]
+
+    def test_estimated_count_falls_back_to_an_exact_count(self, run_db):
+        crud = SQLAlchemyCRUD[Role](Role, total_count="estimated")
+
+        async def scenario(db):
+            await create_roles(db, 3)
+            return await crud.read_page(db, limit=2)
+
+        assert run_db(scenario).total == 3
+
+    def test_pages_are_not_counted_by_default(self, run_db):
+        async def scenario(db):
+            await create_roles(db, 1)
+            return await role_crud.read_page(db)
+
+        assert run_db(scenario).total is None
+
+    def test_unknown_strategy_is_rejected(self):
+        with pytest.raises(ValueError):
+            SQLAlchemyCRUD[Role](Role, total_count="exact")
+
+
+class TestColumnProjection:
+    def test_only_the_requested_columns_are_selected(self, run_db):
+        async def scenario(db):
+            await role_crud.create({"role_name": "admin", "role_desc": "long"}, db)
+            db.expunge_all()
+            with StatementRecorder(db) as counter:
+                roles = await role_crud.read_all(db, columns=["role_name"])
+            # raised instead of lazy loading
+            with pytest.raises(InvalidRequestError):
+                roles[0].role_desc
+            return roles[0], counter.statements
+
+        role, statements = run_db(scenario)
+        assert role.role_name == "admin"
+        assert "role_desc" not in statements[0]
+
+    def test_dotted_columns_apply_to_related_models(self, run_db):
+        crud = SQLAlchemyCRUD[User](User, related_models={Role: "role"})
+
+        async def scenario(db):
+            role = await role_crud.create({"role_name": "editor"}, db)
+            await user_crud.create(
+                {"email": "a@example.com", "hashed_password": "x", "role_id": role.id},
+                db,
+            )
+            db.expunge_all()
+            page = await crud.read_page(
+                db, join_relationships=True, columns=["email", "role.role_name"]
+            )
+            user = page.items[0]
+            with pytest.raises(InvalidRequestError):
+                user.hashed_password
+            with pytest.raises(InvalidRequestError):
+                user.role.role_desc
+            return user
+
+        user = run_db(scenario)
+        # role_id is loaded for the joined role although it was not requested
+        assert (user.email, user.role.role_name) == ("a@example.com", "editor")
+
+    def test_undeclared_related_model_is_rejected(self, run_db):
+        async def scenario(db):
+            await role_crud.read_all(db, columns=["user.email"])
+
+        with pytest.raises(ValueError):
+            run_db(scenario)
+
+
+class TestUnitOfWork:
+    def test_writes_are_flushed_but_left_to_commit(self, run_db):
+        async def scenario(db):
+            db.info["unit_of_work"] = True
+            commits = []
+            event.listen(db.sync_session, "after_commit", commits.append)
+            with StatementRecorder(db) as counter:
+                role = await role_crud.create({"role_name": "admin"}, db)
+                await role_crud.update(db, role.id, {"role_desc": "desc"})
+            # server defaults come back with the INSERT, no refresh is needed
+            updated = role.updated
+            await db.rollback()
+            return updated, commits, counter.statements, await role_crud.read_all(db)
+
+        updated, commits, statements, roles = run_db(scenario)
+        assert updated is not None
+        assert commits == []
+        assert [statement.split()[0] for statement in statements] == [
+            "INSERT",
+            "UPDATE",
+        ]
+        assert roles == []
@@ -0,0 +1,241 @@
+import asyncio
+from types import SimpleNamespace
+from typing import Optional
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from jinja2 import DictLoader, Environment
+
+from app.core.fragments import fragment_cache
+from app.core.streaming import _flush_when_waiting
+from app.templates import (
+    AsyncTemplateResponse,
+    Templates,
+    create_environment,
+    warm_templates,
+)
+
+
+def make_client(templates: Templates, block: Optional[str] = None) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/")
+    async def page(request: Request):
+        response = templates.TemplateResponse(
+            "page.html", {"request": request, "name": "Иван"}, block=block
+        )
+        response.set_cookie("set-after", "1")
+        return response
+
+    return TestClient(app)
+
+
+class TestTemplates:
+    @pytest.mark.parametrize("enable_async", [False, True])
+    def test_pages_render_the_same_in_both_modes(self, enable_async):
+        templates = Templates(
+            env=Environment(
+                loader=DictLoader({"page.html": "<p>{{ name }}</p>"}),
+                enable_async=enable_async,
+            )
+        )
+        response = make_client(templates).get("/")
+        assert response.text == "<p>Иван</p>"
+        assert response.headers["content-length"] == str(len(response.content))
+        assert response.cookies["set-after"] == "1"
+
+    def test_async_environment_renders_when_the_response_is_sent(self):
+        templates = Templates(
+            env=Environment(
+                loader=DictLoader({"page.html": "{{ name }}"}), enable_async=True
+            )
+        )
+        response = templates.TemplateResponse(
+            "page.html",
+            {"request": Request({"type": "http", "headers": []}), "name": "x"},
+        )
+        assert isinstance(response, AsyncTemplateResponse)
+        assert response.body == b""
+
+
+PAGES = {
+    "base.html": "<html><title>{% block title %}{% endblock %}</title>"
+    "<nav></nav>{% block content %}{% endblock %}</html>",
+    "page.html": '{% extends "base.html" %}{% block title %}Page{% endblock %}'
+    '{% block content %}{% block dashboard_body %}<div id="dashboard-body">'
+    "{{ name }}</div>{% endblock %}{% endblock %}",
+}
+
+
+STREAMED_PAGES = {
+    **PAGES,
+    "page.html": '{% extends "base.html" %}{% block title %}Page{% endblock %}'
+    '{% block content %}{% block dashboard_body %}<div id="dashboard-body">'
+    "{% for name in names %}<p>{{ name }}</p>{% endfor %}</div>"
+    "{% endblock %}{% endblock %}",
+}
+
+
+class TestFragments:
+    @pytest.fixture(params=[False, True], ids=["sync", "async"])
+    def templates(self, request):
+        return Templates(
+            env=Environment(loader=DictLoader(PAGES), enable_async=request.param)
+        )
+
+    def test_block_of_the_view_is_rendered_alone(self, templates):
+        response = make_client(templates, "dashboard_body").get(
+            "/", headers={"HX-Request": "true"}
+        )
+        assert response.text == '<title>Page</title><div id="dashboard-body">Иван</div>'
+        assert (
+            response.headers["vary"]
+            == "HX-Request, HX-Boosted, HX-History-Restore-Request"
+        )
+
+    @pytest.mark.parametrize(
+        "headers",
+        [
+            {},
+            {"HX-Request": "true", "HX-Boosted": "true"},
+            {"HX-Request": "true", "HX-History-Restore-Request": "true"},
+        ],
+        ids=["page", "boosted", "history-restore"],
+    )
+    def test_whole_page_is_rendered_otherwise(self, templates, headers):
+        response = make_client(templates, "dashboard_body").get("/", headers=headers)
+        assert response.text.startswith("<html><title>Page</title><nav></nav>")
+
+    def test_view_without_block_renders_the_whole_page(self, templates):
+        response = make_client(templates).get("/", headers={"HX-Request": "true"})
+        assert response.text.startswith("<html><title>Page</title><nav></nav>")
+        assert "vary" not in response.headers
+
+
+class TestStreaming:
+    @pytest.mark.parametrize(
+        "headers",
+        [{}, {"HX-Request": "true"}],
+        ids=["page", "fragment"],
+    )
+    def test_streamed_page_is_the_rendered_page(self, headers):
+        async def names():
+            for name in ("Иван", "Пётр"):
+                await asyncio.sleep(0)
+                yield name
+
+        templates = Templates(env=Environment(loader=DictLoader(STREAMED_PAGES)))
+        app = FastAPI()
+
+        @app.get("/")
+        async def page(request: Request):
+            if request.query_params.get("stream"):
+                return templates.TemplateStreamResponse(
+                    "page.html",
+                    {"request": request, "names": names()},
+                    block="dashboard_body",
+                )
+            return templates.TemplateResponse(
+                "page.html",
+                {"request": request, "names": ["Иван", "Пётр"]},
+                block="dashboard_body",
+            )
+
+        client = TestClient(app)
+        rendered = client.get("/", headers=headers)
+        streamed = client.get("/?stream=1", headers=headers)
+        assert streamed.text == rendered.text
+        assert "content-length" not in streamed.headers
+        assert streamed.headers["vary"] == rendered.headers["vary"]
+
+    def test_chunks_are_joined_until_the_template_waits(self):
+        async def chunks():
+            yield "<html>"
+            yield "<body>"
+            await asyncio.sleep(0.01)
+            yield "<p>"
+            yield "</p>"
+
+        async def sent():
+            return [chunk async for chunk in _flush_when_waiting(chunks())]
+
+        assert asyncio.run(sent()) == ["<html><body>", "<p></p>"]
+
+    def test_error_is_raised_once_the_sent_chunks_are_flushed(self):
+        async def chunks():
+            yield "<html>"
+            raise RuntimeError("Lost the database")
+
+        async def sent(received):
+            async for chunk in _flush_when_waiting(chunks()):
+                received.append(chunk)
+
+        received = []
+        with pytest.raises(RuntimeError):
+            asyncio.run(sent(received))
+        assert received == ["<html>"]
+
+
+ROWS = {
+    "table.html": "<table hx-headers='{{ csrf_token }}'>{% for group in groups %}"
+    '{{ cached_fragment("row.html", [group], group=group) }}{% endfor %}</table>',
+    "row.html": "<tr>{{ count(group) }}{{ group.group_name }}</tr>",
+}
+
+
+class TestCachedFragment:
+    @pytest.fixture(autouse=True)
+    def empty_cache(self):
+        fragment_cache.clear()
+        yield
+        fragment_cache.clear()
+
+    @pytest.mark.parametrize("enable_async", [False, True], ids=["sync", "async"])
+    def test_only_the_changed_row_is_rendered_again(self, enable_async):
+        environment = Environment(loader=DictLoader(ROWS), enable_async=enable_async)
+        templates = Templates(env=environment)
+        rendered = []
+        environment.globals["count"] = lambda group: rendered.append(group.id) or ""
+        groups = [
+            SimpleNamespace(id=index, group_name=f"g{index}", updated=1)
+            for index in range(3)
+        ]
+        request = Request({"type": "http", "headers": [], "server": ("a", 80)})
+
+        async def render(csrf_token):
+            template = templates.env.get_template("table.html")
+            context = {"request": request, "groups": groups, "csrf_token": csrf_token}
+            if enable_async:
+                return await template.render_async(context)
+            return template.render(context)
+
+        first = asyncio.run(render("one"))
+        groups[1].group_name, groups[1].updated = "changed", 2
+        second = asyncio.run(render("two"))
+
+        assert (
+            first == "<table hx-headers='one'><tr>g0</tr><tr>g1</tr><tr>g2</tr></table>"
+        )
+        assert second == (
+            "<table hx-headers='two'><tr>g0</tr><tr>changed</tr><tr>g2</tr></table>"
+        )
+        assert rendered == [0, 1, 2, 1]
+
+
+class TestCreateEnvironment:
+    def test_production_mode_does_not_reload(self):
+        environment = create_environment("production")
+        assert not environment.auto_reload
+        assert environment.bytecode_cache is not None
+        assert not environment.is_async
+
+    def test_unknown_mode_is_rejected(self):
+        with pytest.raises(ValueError):
+            create_environment("staging")
+
+    def test_warm_templates_loads_every_page(self):
+        environment = create_environment("production")
+        count = warm_templates(environment)
+        assert count == len(environment.list_templates(extensions=["html"]))
+        assert len(environment.cache) == count
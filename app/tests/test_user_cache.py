@@ -0,0 +1,130 @@
+import pytest
+from fastapi_users.jwt import generate_jwt
+from fastapi_users_db_sqlalchemy import SQLAlchemyUserDatabase
+from sqlalchemy import update
+
+from app.database.security import (
+    SECRET,
+    CachedJWTStrategy,
+    UserManager,
+    get_jwt_strategy,
+    user_cache,
+    verified_tokens,
+    verify_jwt,
+)
+from app.models.users import User
+from app.tests.conftest import StatementRecorder
+
+
+@pytest.fixture(autouse=True)
+def empty_caches():
+    user_cache.clear()
+    verified_tokens.clear()
+    yield
+    user_cache.clear()
+    verified_tokens.clear()
+
+
+async def resolve(db, strategy, token):
+    """Reads the user of `token` and the number of statements it took."""
+    with StatementRecorder(db) as recorder:
+        user = await strategy.read_token(
+            token, UserManager(SQLAlchemyUserDatabase(db, User))
+        )
+    return user, len(recorder.statements)
+
+
+async def create_user(db, email="cached@example.com"):
+    user = User(email=email, hashed_password="x")
+    db.add(user)
+    await db.commit()
+    return user
+
+
+class TestCachedJWTStrategy:
+    def test_user_is_read_once_then_served_from_the_cache(self, run_db):
+        async def scenario(db):
+            strategy = get_jwt_strategy()
+            user = await create_user(db)
+            token = await strategy.write_token(user)
+            db.expunge_all()
+            first = await resolve(db, strategy, token)
+            db.expunge_all()
+            second = await resolve(db, strategy, token)
+            return first, second, second[0] in db
+
+        (first, first_queries), (second, second_queries), attached = run_db(scenario)
+        assert isinstance(get_jwt_strategy(), CachedJWTStrategy)
+        assert (first_queries, second_queries) == (1, 0)
+        assert second.email == first.email == "cached@example.com"
+        assert attached
+        assert (user_cache.hits, user_cache.misses) == (1, 1)
+
+    def test_invalid_tokens_are_rejected_before_the_cache(self, run_db):
+        async def scenario(db):
+            strategy = get_jwt_strategy()
+            await create_user(db)
+            return await resolve(db, strategy, "not-a-token"), await resolve(
+                db, strategy, None
+            )
+
+        assert run_db(scenario) == ((None, 0), (None, 0))
+
+    def test_updates_and_bulk_updates_invalidate_the_cache(self, run_db):
+        async def scenario(db):
+            strategy = get_jwt_strategy()
+            user = await create_user(db)
+            token = await strategy.write_token(user)
+            await resolve(db, strategy, token)
+
+            user.is_active = False
+            await db.commit()
+            db.expunge_all()
+            deactivated, queries = await resolve(db, strategy, token)
+            was_active = deactivated.is_active
+
+            await db.execute(update(User).values(is_active=True))
+            await db.commit()
+            db.expunge_all()
+            reactivated, bulk_queries = await resolve(db, strategy, token)
+            return was_active, queries, reactivated.is_active, bulk_queries
+
+        assert run_db(scenario) == (False, 1, True, 1)
+
+    def test_keyed_update_keeps_the_other_users(self, run_db):
+        async def scenario(db):
+            strategy = get_jwt_strategy()
+            updated, other = await create_user(db), await create_user(db, "o@x.org")
+            tokens = [await strategy.write_token(user) for user in (updated, other)]
+            for token in tokens:
+                await resolve(db, strategy, token)
+
+            await db.execute(
+                update(User).where(User.id == updated.id).values(is_active=False)
+            )
+            await db.commit()
+            db.expunge_all()
+            return [(await resolve(db, strategy, token))[1] for token in tokens]
+
+        assert run_db(scenario) == [1, 0]
+
+
+class TestVerifyJwt:
+    def test_auth_tokens_are_verified_then_remembered(self):
+        token = generate_jwt({"sub": "id", "aud": ["fastapi-users:auth"]}, SECRET, 60)
+        assert verify_jwt(token)
+        assert verify_jwt(token)
+        assert (verified_tokens.hits, len(verified_tokens)) == (1, 1)
+
+    @pytest.mark.parametrize(
+        "secret, audience, lifetime",
+        [
+            ("another secret", "fastapi-users:auth", 60),
+            (SECRET, "fastapi-users:verify", 60),
+            (SECRET, "fastapi-users:auth", -1),
+        ],
+    )
+    def test_other_tokens_are_rejected(self, secret, audience, lifetime):
+        token = generate_jwt({"sub": "id", "aud": [audience]}, secret, lifetime)
+        assert not verify_jwt(token)
+        assert len(verified_tokens) == 0
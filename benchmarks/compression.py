@@ -0,0 +1,66 @@
+"""
+Size and compression time of the htmx fragments of the list pages, as sent by
+CompressionMiddleware: the task board of pages/groups.html (its dashboard_body block)
+and the table of pages/user.html.
+
+    python -m benchmarks.compression [rows] [repeat]
+
+"whole" compresses the fragment at once, "streamed" in 4 kB chunks each flushed as
+a streamed page is. The time is the median of `repeat` compressions.
+"""
+
+import statistics
+import sys
+import time
+
+from app.core.compression import BrotliCompressor, GzipCompressor, brotli
+from app.templates import TemplateFragment, Templates, create_environment
+from benchmarks.templates import contexts, make_request, url_for
+
+CHUNK_SIZE = 4096
+
+
+def fragments(rows: int):
+    environment = create_environment("production")
+    Templates(env=environment)
+    environment.globals["url_for"] = url_for
+    for name, context in contexts(rows).items():
+        template = environment.get_template(name)
+        if "dashboard_body" in template.blocks:
+            template = TemplateFragment(template, "dashboard_body")
+        yield name, template.render({**context, "request": make_request()}).encode()
+
+
+def compress(make_compressor, body: bytes, chunk_size: int) -> int:
+    compressor = make_compressor()
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return sum(
+        len(compressor.compress(chunk, finish=i == len(chunks) - 1))
+        for i, chunk in enumerate(chunks)
+    )
+
+
+def main(rows: int = 1000, repeat: int = 5):
+    compressors = [(f"gzip {level}", level, GzipCompressor) for level in (1, 6, 9)]
+    if brotli is not None:
+        compressors += [
+            (f"br {quality}", quality, BrotliCompressor) for quality in (1, 4, 6)
+        ]
+    for name, body in fragments(rows):
+        print(f"{name} ({rows} rows): {len(body) / 1024:.1f} kB")
+        for label, level, compressor_class in compressors:
+            for mode, chunk_size in (("whole", len(body)), ("streamed", CHUNK_SIZE)):
+                times = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    size = compress(lambda: compressor_class(level), body, chunk_size)
+                    times.append(time.perf_counter() - start)
+                print(
+                    f"  {label:8} {mode:9} {size / 1024:8.1f} kB"
+                    f" ({100 * (1 - size / len(body)):4.1f}% saved)"
+                    f" {statistics.median(times) * 1000:8.2f} ms"
+                )
+
+
+if __name__ == "__main__":
+    main(*(int(argument) for argument in sys.argv[1:]))
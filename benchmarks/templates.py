@@ -0,0 +1,136 @@
+"""
+Render time of pages/groups.html and pages/user.html with 1,000 rows, in the
+development and production template modes, rendering synchronously or not.
+
+    python -m benchmarks.templates [rows] [repeat]
+
+"cold" is the first render of a fresh environment, compilation included (read from
+the bytecode cache in production mode once it is filled), "warm" the median of the
+following renders without the cached rows of fragment_cache, "cached" with them and
+one row changed before each render.
+"""
+
+import asyncio
+import datetime
+import statistics
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+from starlette.requests import Request
+
+from app.core.fragments import fragment_cache
+from app.templates import Templates, create_environment
+
+
+def make_request() -> Request:
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": []})
+
+
+def url_for(name: str, **path_params) -> str:
+    # Stands in for the url_for of the routes, which needs the database settings
+    return "/".join(["", name, *map(str, path_params.values())])
+
+
+def make_users(rows: int):
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            updated=datetime.datetime(2024, 1, 1),
+            email=f"user{i}@example.com",
+            is_active=True,
+            is_superuser=i % 10 == 0,
+            created=datetime.datetime(2024, 1, 1),
+            role=SimpleNamespace(id=1, updated=None, role_name="Разработчик"),
+            profile=SimpleNamespace(
+                id=i,
+                updated=None,
+                first_name="Иван",
+                last_name="Петров",
+                phone="+7 900 000 00 00",
+                date_of_birth=datetime.date(1990, 1, 1),
+                company="ACME",
+                profile_picture="",
+            ),
+        )
+        for i in range(rows)
+    ]
+
+
+def make_groups(rows: int, users):
+    return [
+        SimpleNamespace(
+            id=uuid.uuid4(),
+            updated=datetime.datetime(2024, 1, 1),
+            group_name=f"Группа {i}",
+            group_desc="Описание задания",
+            users=users[i % len(users) : i % len(users) + 3],
+        )
+        for i in range(rows)
+    ]
+
+
+def contexts(rows: int):
+    users = make_users(rows)
+    common = {
+        "page": SimpleNamespace(next_cursor="next", prev_cursor=None, total=rows),
+        "limit": rows,
+        "user_type": True,
+        "csrf_token": "token",
+        "token": "token",
+    }
+    return {
+        "pages/groups.html": {**common, "groups": make_groups(rows, users)},
+        "pages/user.html": {**common, "users": users},
+    }
+
+
+async def render(environment, name: str, context, cached: bool = False) -> float:
+    if cached:
+        # One row changed since the previous render
+        row = context.get("groups", context.get("users"))[0]
+        row.updated += datetime.timedelta(seconds=1)
+    else:
+        fragment_cache.clear()
+    start = time.perf_counter()
+    template = environment.get_template(name)
+    context = {**context, "request": make_request()}
+    if environment.is_async:
+        await template.render_async(context)
+    else:
+        template.render(context)
+    return time.perf_counter() - start
+
+
+async def main(rows: int = 1000, repeat: int = 20):
+    for name, context in contexts(rows).items():
+        for mode, enable_async in (
+            ("development", False),
+            ("production", False),
+            ("production", True),
+        ):
+            environment = create_environment(mode, enable_async)
+            # Sets up the globals of the routes, cached_fragment included
+            Templates(env=environment)
+            environment.globals["url_for"] = url_for
+            cold = await render(environment, name, context)
+            warm = statistics.median(
+                [await render(environment, name, context) for _ in range(repeat)]
+            )
+            cached = statistics.median(
+                [
+                    await render(environment, name, context, cached=True)
+                    for _ in range(repeat)
+                ]
+            )
+            print(
+                f"{name:20} {mode:12} {'async' if enable_async else 'sync':6}"
+                f" cold {cold * 1000:8.2f} ms"
+                f"  warm {warm * 1000:8.2f} ms"
+                f"  cached {cached * 1000:8.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(*(int(argument) for argument in sys.argv[1:])))
@@ -1,8 +1,10 @@
 from fastapi import Depends, FastAPI, HTTPException
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from loguru import logger
 
-from app.database.db import User, create_db_and_tables
+from app.core.compression import CompressionMiddleware
+from app.core.passwords import password_helper
+from app.database.db import User, create_db_and_tables, warm_up_pools
 from app.database.security import auth_backend, current_active_user, fastapi_users
 from app.exception import http_exception_handler
 from app.routes.view.group import group_view_route
@@ -10,16 +12,26 @@ from app.routes.view.group import group_view_route
 # importing the route
 from app.routes.view.login import login_view_route
 from app.routes.view.role import role_view_route
+from app.routes.view.search import search_view_route
 from app.routes.view.upload import upload_view_route
 from app.routes.view.user import user_view_route
 from app.schema.users import UserCreate, UserRead, UserUpdate
+from app.templates import (
+    TEMPLATE_MODE,
+    jinja_env,
+    static_files,
+    templates,
+    warm_templates,
+)
 
 from fastapi_csrf_protect import CsrfProtect
 
 from app.core.csrf_settings import CsrfSettings
 
 app = FastAPI(exception_handlers={HTTPException: http_exception_handler})
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+app.mount(static_files.url, static_files, name="static")
+# Compresses the pages and fragments, the static files being compressed at startup
+app.add_middleware(CompressionMiddleware)
 
 
 app.include_router(
@@ -53,6 +65,7 @@ app.include_router(role_view_route, tags=["Pages", "Role"])
 app.include_router(group_view_route, tags=["Pages", "Group"])
 app.include_router(user_view_route, tags=["Pages", "User"])
 app.include_router(upload_view_route, tags=["Pages", "Upload"])
+app.include_router(search_view_route, tags=["Pages", "Search"])
 
 
 @app.get("/authenticated-route")
@@ -65,12 +78,19 @@ async def authenticated_route(user: User = Depends(current_active_user)):
 async def on_startup():
     # Not needed if you setup a migration system like Alembic
     await create_db_and_tables()
+    await warm_up_pools()
+    logger.info(f"{await run_in_threadpool(static_files.compress)} assets compressed")
+    if TEMPLATE_MODE == "production":
+        logger.info(f"{warm_templates(jinja_env)} templates loaded")
+        if templates.stream_env is not jinja_env:
+            warm_templates(templates.stream_env)
     # await create_superuser()
     logger.info("Application started")
 
 
 @app.on_event("shutdown")
 async def on_shutdown():
+    password_helper.shutdown()
     logger.info("Application shutdown")
 
 